@@ -1,16 +1,32 @@
 import sys
 import os
-import html
+import time
+import asyncio
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Callable, Iterable, Iterator
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, Request, HTTPException
 
-import requests as http_requests
 from dotenv import load_dotenv
 from telegram import Bot
 from telegram.constants import ParseMode
 
-from database import init_db, get_all_user_ids, get_all_prayer_requests, get_user_groups
+from database import (
+    init_db,
+    iter_all_user_ids,
+    get_daily_digests,
+    mark_daily_digests_stale,
+    record_delivery_outcomes,
+    get_reminder_checkpoint,
+    get_reminder_retries,
+    save_reminder_checkpoint,
+)
+from async_database import run
+from digest import DigestRenderer, refresh_daily_digests
+from delivery import LatencyHistogram, OutboundSender, is_permanent_error
+from votd import VotdProvider
 
 load_dotenv()
 
@@ -18,114 +34,267 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 CRON_SECRET = os.getenv("CRON_SECRET", "")
 CREATOR_CHAT_ID = os.getenv("CREATOR_CHAT_ID", "")
 
-VOTD_URL = "https://beta.ourmanna.com/api/v1/get?format=json&order=daily"
+# Broadcast pacing: stay under Telegram's ~30 messages/second bot limit.
+BROADCAST_RATE = 25.0
+BROADCAST_CONCURRENCY = 20
+BROADCAST_BACKOFF = 0.5
+# Users delivered between checkpoint writes.
+CHECKPOINT_EVERY = 50
+# Failure messages kept for the run summary.
+FAILURE_SAMPLES = 3
 
 app = FastAPI()
+votd_provider = VotdProvider()
 
 
 # ======================
 # Helpers
 # ======================
 
-def _get_votd() -> str:
-    try:
-        response = http_requests.get(
-            VOTD_URL,
-            headers={"accept": "application/json"},
-            timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
-        details = data.get("verse", {}).get("details", {})
-        verse = str(details.get("text", "")).strip()
-        reference = str(details.get("reference", "")).strip()
-
-        if not verse:
-            raise ValueError("VOTD response did not include verse text")
-
-        # Escape dynamic text because message is sent with ParseMode.HTML.
-        safe_verse = html.escape(verse)
-        safe_reference = html.escape(reference) if reference else "Unknown Reference"
-        return f"{safe_verse} - <i>{safe_reference}</i>"
-    except Exception as exc:
-        print(f"Failed to fetch VOTD: {exc}")
-        return "Stay faithful and trust in the Lord today!"
+async def _broadcast(sender: OutboundSender, bot: Bot, recipients: Iterable[int],
+                     render: Callable[[int], list[str]], latencies: LatencyHistogram) -> dict:
+    """Send each recipient their rendered messages within Telegram's limits.
+
+    A fixed pool of workers pulls recipients from ``recipients``; the shared
+    sender paces them to the broadcast rate and retries flood-control and
+    transient network errors with backoff. Each recipient's send time goes
+    into ``latencies``. Failures are returned as ``(uid, permanent, error)``
+    so unreachable users can be recorded.
+    """
+    pending = iter(recipients)
+    delivered = []
+    failures = []
+
+    async def worker():
+        for uid in pending:
+            started = time.perf_counter()
+            try:
+                for text in render(uid):
+                    await sender.send(
+                        bot.send_message,
+                        uid,
+                        text=text,
+                        parse_mode=ParseMode.HTML
+                    )
+                delivered.append(uid)
+            except Exception as e:
+                failures.append((uid, is_permanent_error(e), str(e)))
+                print(f"Failed to send to {uid}: {e}")
+            finally:
+                latencies.record(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(BROADCAST_CONCURRENCY)))
+    return {"delivered": delivered, "failures": failures}
+
+
+def _delivery_stats(latencies: LatencyHistogram, duration: float) -> dict:
+    return {
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(latencies.count / duration, 2) if duration > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(latencies.percentile(0.50) * 1000, 1),
+            "p95": round(latencies.percentile(0.95) * 1000, 1),
+            "p99": round(latencies.percentile(0.99) * 1000, 1),
+            "max": round(latencies.max * 1000, 1),
+        },
+    }
+
+
+def _load_digests(user_ids: list[int]) -> dict[int, tuple[int, str]]:
+    """Stored digests for ``user_ids``, rendering any that are missing or stale."""
+    digests = get_daily_digests(user_ids)
+    missing = [uid for uid in user_ids if uid not in digests]
+    if missing:
+        mark_daily_digests_stale(missing)
+        refresh_daily_digests(missing)
+        digests.update(get_daily_digests(missing))
+    return digests
+
+
+class _ShardRecipients:
+    """Stream one shard's recipients after the checkpoint, counting as it goes.
+
+    ``user_ids`` must be ascending. Counts cover what has been read so far;
+    ``drain()`` reads the rest without keeping it.
+    """
+
+    def __init__(self, user_ids: Iterable[int], shard: int, shards: int, last_user_id: int | None):
+        self.users = 0
+        self.shard_users = 0
+        self.remaining = 0
+        self._pending = self._filter(user_ids, shard, shards, last_user_id)
+
+    def _filter(self, user_ids, shard, shards, last_user_id) -> Iterator[int]:
+        for uid in user_ids:
+            self.users += 1
+            if uid > 0 and uid % shards == shard:
+                self.shard_users += 1
+                if last_user_id is None or uid > last_user_id:
+                    self.remaining += 1
+                    yield uid
+
+    def take(self, count: int) -> list[int]:
+        return list(islice(self._pending, count))
+
+    def drain(self) -> int:
+        """Read the rest of the stream; returns how many recipients were left."""
+        return sum(1 for _ in self._pending)
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
 
 
-async def _send_daily_reminders() -> dict:
+def _today_run_key() -> str:
+    return _utc_now().date().isoformat()
+
+
+async def _send_daily_reminders(shard: int = 0, shards: int = 1, batch: int = 0,
+                                hourly: bool = False) -> dict:
+    """Send today's reminder to one shard of the recipients.
+
+    Recipients are visited in ascending user id order and only those with
+    ``uid % shards == shard`` belong to this shard. Progress is checkpointed
+    per day and shard, so a repeated or timed-out invocation resumes after
+    the last delivered user. Recipients whose send still failed transiently
+    after the sender's retries are recorded with the checkpoint and sent to
+    first by the next invocation. ``batch`` caps how many users this
+    invocation handles (0 means all remaining).
+
+    With ``hourly`` only users whose preferred reminder hour falls in the
+    current UTC hour are sent to, and progress is checkpointed per hour.
+    """
     if not BOT_TOKEN:
         raise RuntimeError("Missing BOT_TOKEN environment variable")
 
-    init_db()
+    # Database work runs on the database threads so the event loop keeps
+    # feeding the broadcast workers.
+    await run(init_db)
 
     bot = Bot(token=BOT_TOKEN)
-    user_ids = get_all_user_ids()
-    all_requests = get_all_prayer_requests()
-    verse_of_the_day = _get_votd()
-    sent_count = 0
-    failed_count = 0
-    failures = []
+    now = _utc_now()
+    run_key = now.date().isoformat()
+    if hourly:
+        run_key = f"{run_key}T{now.hour:02d}"
+    checkpoint = await run(get_reminder_checkpoint, run_key, shard, shards) or {}
+    last_user_id = checkpoint.get("last_user_id")
+    retries = await run(get_reminder_retries, run_key, shard, shards)
+
+    # Recipients are streamed from the database one chunk at a time, so
+    # memory stays flat however many users there are.
+    recipients = _ShardRecipients(
+        iter_all_user_ids(now.hour if hourly else None), shard, shards, last_user_id
+    )
+
+    def chunk_size(handled: int) -> int:
+        return CHECKPOINT_EVERY if batch <= 0 else min(CHECKPOINT_EVERY, batch - handled)
+
+    async def take(handled: int) -> tuple[list[int], bool]:
+        """The next chunk, and whether it comes from the retry list."""
+        nonlocal retries
+        size = chunk_size(handled)
+        if size <= 0:
+            return [], False
+        if retries:
+            chunk, retries = retries[:size], retries[size:]
+            return chunk, True
+        return await run(recipients.take, size), False
+
+    chunk, retrying = await take(0)
+
+    # Digests are normally rendered by the prefetch run; this only catches
+    # changes made since then.
+    refreshed = await run(refresh_daily_digests) if chunk else 0
+    verse_of_the_day = await votd_provider.get() if chunk else ""
 
     print(
         "Daily reminder run starting:",
-        f"users={len(user_ids)}",
-        f"requests={len(all_requests)}",
+        f"run={run_key}",
+        f"shard={shard}/{shards}",
+        f"digests_refreshed={refreshed}",
     )
 
+    renderer = DigestRenderer(verse_of_the_day)
+
+    sender = OutboundSender(
+        rate=BROADCAST_RATE,
+        max_concurrency=BROADCAST_CONCURRENCY,
+        backoff_base=BROADCAST_BACKOFF,
+    )
+    sent_count = 0
+    failed = 0
+    failure_samples = []
+    unreachable = 0
+    latencies = LatencyHistogram()
+    handled = 0
+    retried_users = 0
+    awaiting_retry = 0
+    left_over = 0
+    run_started = time.perf_counter()
+
     async with bot:
-        for uid in user_ids:
-            if uid <= 0:
-                continue
-
-            viewer_groups = get_user_groups(uid)
-            visible_requests = []
-
-            for req in all_requests:
-                if req.user_id == uid:
-                    continue
-
-                creator_groups = get_user_groups(req.user_id)
-                if viewer_groups & creator_groups:
-                    visible_requests.append(req)
-
-            if visible_requests:
-                request_lines = "\n".join(
-                    f"• {html.escape(req.text)}" for req in visible_requests
-                )
-                requests_section = (
-                    f"📋 <b>Prayer Requests ({len(visible_requests)}):</b>\n"
-                    f"{request_lines}\n\n"
-                    "Use /request_list to view and interact with these requests."
-                )
-            else:
-                requests_section = "There are no prayer requests from others today."
-
-            daily_text = (
-                "<b>-- Daily Prayer Reminder --</b>\n\n"
-                f"{verse_of_the_day}\n\n"
-                f"{requests_section}"
+        # Checkpoint after every chunk so a timeout loses at most one chunk.
+        while chunk:
+            digests = await run(_load_digests, chunk)
+            result = await _broadcast(
+                sender, bot, chunk, lambda uid: renderer.render(*digests[uid]), latencies
+            )
+            sent_count += len(result["delivered"])
+            failed += len(result["failures"])
+            unreachable += sum(1 for _, permanent, _ in result["failures"] if permanent)
+            for uid, _, error in result["failures"][:FAILURE_SAMPLES - len(failure_samples)]:
+                failure_samples.append(f"{uid}: {error}")
+            await run(record_delivery_outcomes, result["delivered"], result["failures"])
+            transient = [uid for uid, permanent, _ in result["failures"] if not permanent]
+            awaiting_retry += len(transient)
+            handled += len(chunk)
+            if retrying:
+                retried_users += len(chunk)
+            next_chunk, next_retrying = await take(handled)
+            if not next_chunk:
+                left_over = await run(recipients.drain)
+            await run(
+                save_reminder_checkpoint,
+                run_key, shard, shards,
+                # Retries come from behind the checkpoint and don't move it.
+                last_user_id=None if retrying else chunk[-1],
+                sent=len(result["delivered"]),
+                failed=len(result["failures"]),
+                completed=not next_chunk and left_over == 0,
+                retry=transient,
+                resolved=[uid for uid in chunk if uid not in transient] if retrying else (),
             )
+            chunk, retrying = next_chunk, next_retrying
 
-            try:
-                await bot.send_message(
-                    chat_id=uid,
-                    text=daily_text,
-                    parse_mode=ParseMode.HTML
-                )
-                sent_count += 1
-            except Exception as e:
-                failed_count += 1
-                failures.append(f"{uid}: {e}")
-                print(f"Failed to send to {uid}: {e}")
+    # Finish the counts when nothing was sent this run.
+    await run(recipients.drain)
+    if not recipients.remaining and not checkpoint.get("completed"):
+        await run(save_reminder_checkpoint, run_key, shard, shards, None, 0, 0, completed=True)
 
+    remaining_after = recipients.remaining - (handled - retried_users)
+    retry_pending = len(retries) + awaiting_retry
     summary = {
-        "users_found": len(user_ids),
-        "requests_found": len(all_requests),
+        "users_found": recipients.users,
+        "digests_refreshed": refreshed,
         "sent": sent_count,
-        "failed": failed_count,
+        "failed": failed,
+        "unreachable": unreachable,
+        "retried": sender.retried,
+        "distinct_digests": renderer.distinct_digests,
+        **_delivery_stats(latencies, time.perf_counter() - run_started),
+        "progress": {
+            "run": run_key,
+            "shard": shard,
+            "shards": shards,
+            "shard_recipients": recipients.shard_users,
+            "processed": recipients.shard_users - remaining_after,
+            "remaining": remaining_after,
+            "retry_pending": retry_pending,
+            "completed": remaining_after == 0 and retry_pending == 0,
+        },
     }
-    if failures:
-        summary["failure_samples"] = failures[:3]
+    if failure_samples:
+        summary["failure_samples"] = failure_samples
 
     print(f"Daily reminder run complete: {summary}")
     return summary
@@ -136,7 +305,8 @@ async def _send_daily_reminders() -> dict:
 # ======================
 
 @app.get("/api/daily_reminder")
-async def daily_reminder(request: Request):
+async def daily_reminder(request: Request, shard: int = 0, shards: int = 1, batch: int = 0,
+                         prefetch: bool = False, mode: str = "daily"):
     print(
         "Daily reminder endpoint invoked:",
         f"ua={request.headers.get('user-agent', '')}",
@@ -149,8 +319,25 @@ async def daily_reminder(request: Request):
         if auth != f"Bearer {CRON_SECRET}":
             raise HTTPException(status_code=401, detail="Unauthorized")
 
+    if prefetch:
+        # Warm today's verse and render stale digests ahead of the reminder
+        # run without sending anything.
+        await run(init_db)
+        return {
+            "status": "ok",
+            "votd_cached": await votd_provider.prefetch(),
+            "digests_refreshed": await run(refresh_daily_digests),
+        }
+
+    if shards < 1 or not 0 <= shard < shards or batch < 0:
+        raise HTTPException(status_code=400, detail="Expected 0 <= shard < shards and batch >= 0")
+    if mode not in ("daily", "hourly"):
+        raise HTTPException(status_code=400, detail="Expected mode=daily or mode=hourly")
+
     try:
-        summary = await _send_daily_reminders()
+        summary = await _send_daily_reminders(
+            shard=shard, shards=shards, batch=batch, hourly=mode == "hourly"
+        )
         return {"status": "ok", **summary}
     except HTTPException:
         raise
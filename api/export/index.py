@@ -0,0 +1,52 @@
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import StreamingResponse
+
+from dotenv import load_dotenv
+
+from database import init_db, iter_all_prayer_requests, iter_all_user_ids
+
+load_dotenv()
+
+CRON_SECRET = os.getenv("CRON_SECRET", "")
+
+app = FastAPI()
+
+
+def _request_lines():
+    for req in iter_all_prayer_requests():
+        yield json.dumps({
+            "id": req.id,
+            "user_id": req.user_id,
+            "username": req.username,
+            "text": req.text,
+            "is_anonymous": req.is_anonymous,
+        }, ensure_ascii=False) + "\n"
+
+
+def _user_lines():
+    for user_id in iter_all_user_ids():
+        yield json.dumps({"user_id": user_id}) + "\n"
+
+
+EXPORTS = {"requests": _request_lines, "users": _user_lines}
+
+
+@app.get("/api/export")
+async def export(request: Request, table: str = "requests"):
+    """Stream a table as newline-delimited JSON without loading it into memory."""
+    if CRON_SECRET:
+        auth = request.headers.get("authorization", "")
+        if auth != f"Bearer {CRON_SECRET}":
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+    lines = EXPORTS.get(table)
+    if lines is None:
+        raise HTTPException(status_code=400, detail=f"Expected table to be one of: {', '.join(EXPORTS)}")
+
+    init_db()
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -2,10 +2,10 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 
 from dotenv import load_dotenv
 from telegram import Update
@@ -14,6 +14,7 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     ConversationHandler,
     filters,
     ContextTypes,
@@ -24,19 +25,28 @@ from handle_request import (
     add_request_text,
     add_request_anon,
     my_requests_list,
+    my_requests_page,
     handle_my_request_action,
 )
 from handle_prayer import (
     request_list_command,
+    request_list_page,
     handle_public_request_view,
     handle_request_actions,
     pray_text_start,
     pray_text_finish,
     pray_audio_start,
     pray_audio_finish,
+    visibility_cache,
 )
+from handle_settings import reminder_time_command
 from state import ADD_TEXT, ADD_ANON, PRAY_TEXT, PRAY_AUDIO
-from database import init_db, save_user_group_membership, save_group_title
+from dispatch import QueueFull, UpdateDeduplicator, UpdateDispatcher, UpdateQueue, update_shard_key
+import database
+from delivery import outbound
+from database import init_db, close_connections
+import async_database
+from group_activity import group_activity
 
 load_dotenv()
 
@@ -53,22 +63,79 @@ def _parse_bot_id() -> int:
         return 0
 
 
+def _parse_int_env(name: str, default: int) -> int:
+    raw_value = os.getenv(name, "")
+    if not raw_value:
+        return default
+    try:
+        return int(raw_value)
+    except ValueError:
+        return default
+
+
 BOT_ID = _parse_bot_id()
-update_lock = asyncio.Lock()
+
+# Updates for different chats run in parallel; each chat keeps its order.
+# Set MAX_CONCURRENT_UPDATES=1 to process one update at a time.
+MAX_CONCURRENT_UPDATES = max(1, _parse_int_env("MAX_CONCURRENT_UPDATES", 8))
+dispatcher = UpdateDispatcher(max_in_flight=MAX_CONCURRENT_UPDATES)
+
+# WEBHOOK_MODE=queue acknowledges updates immediately and processes them on
+# background workers; the default "sync" mode processes before replying.
+WEBHOOK_MODE = os.getenv("WEBHOOK_MODE", "sync").strip().lower()
+UPDATE_QUEUE_SIZE = max(1, _parse_int_env("UPDATE_QUEUE_SIZE", 100))
+UPDATE_WORKERS = max(1, _parse_int_env("UPDATE_WORKERS", MAX_CONCURRENT_UPDATES))
+UPDATE_DRAIN_TIMEOUT = max(0, _parse_int_env("UPDATE_DRAIN_TIMEOUT", 10))
+# In sync mode the instance may be frozen as soon as the webhook answers, so
+# it waits this many seconds at most for the notifications an update sent.
+DELIVERY_WAIT_TIMEOUT = max(0, _parse_int_env("DELIVERY_WAIT_TIMEOUT", 5))
+
+# Per-user reminder times only take effect when /api/daily_reminder?mode=hourly
+# runs every hour. REMINDER_MODE=hourly says that cron is set up and enables
+# /reminder_time; the default "daily" run sends everyone at 09:00 UTC+8.
+REMINDER_MODE = os.getenv("REMINDER_MODE", "daily").strip().lower()
+HOURLY_REMINDERS = REMINDER_MODE == "hourly"
+
+# Drop Telegram redeliveries by update_id; DEDUP_PERSIST=1 keeps the ids in
+# SQLite so they survive a warm restart.
+DEDUP_PERSIST = os.getenv("DEDUP_PERSIST", "").strip().lower() in ("1", "true", "yes")
+deduplicator = UpdateDeduplicator(
+    maxsize=max(1, _parse_int_env("DEDUP_SIZE", 10000)),
+    ttl=max(1, _parse_int_env("DEDUP_TTL", 3600)),
+    store=database if DEDUP_PERSIST else None,
+)
+
+# Group messages only write memberships and titles the process hasn't seen
+# yet, batched into one transaction on the handlers' storage backend.
+group_activity.seen_size = max(1, _parse_int_env("GROUP_SEEN_SIZE", 10000))
+group_activity.flush_size = max(1, _parse_int_env("GROUP_FLUSH_SIZE", 50))
+group_activity.flush_interval = max(1, _parse_int_env("GROUP_FLUSH_INTERVAL", 2))
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
+    # Apply schema migrations once per process rather than on every update.
+    init_db()
+
     if not BOT_TOKEN:
         # Keep the function bootable and fail requests with a useful error.
         yield
         return
 
     await telegram_app.initialize()
+    if WEBHOOK_MODE == "queue":
+        update_queue.start()
+    group_activity.start()
     try:
         yield
     finally:
+        # Let accepted updates finish before the bot shuts down.
+        await update_queue.drain(timeout=UPDATE_DRAIN_TIMEOUT)
+        await outbound.drain(timeout=UPDATE_DRAIN_TIMEOUT)
+        await group_activity.stop()
         await telegram_app.shutdown()
+        async_database.shutdown()
+        close_connections()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -90,7 +157,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/add_request - Add a prayer request\n"
         "/my_requests_list - List and manage own prayer requests\n"
         "/request_list - List and pray for prayer requests\n"
-        "/cancel - Cancel any ongoing conversation\n"
+        + ("/reminder_time - Choose when your daily reminder arrives\n" if HOURLY_REMINDERS else "")
+        + "/cancel - Cancel any ongoing conversation\n"
     )
 
 
@@ -99,6 +167,14 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+async def track_private_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # A private message or button press proves the user can be reached again.
+    chat = update.effective_chat
+    user = update.effective_user
+    if chat and user and chat.type == "private" and await async_database.revive_recipient(user.id):
+        print(f"User {user.id} is reachable again")
+
+
 async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
@@ -106,9 +182,7 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     if chat.type not in ["group", "supergroup"]:
         return
 
-    save_user_group_membership(user.id, chat.id)
-    save_user_group_membership(BOT_ID, chat.id)
-    save_group_title(chat.id, chat.title or f"Group {chat.id}")
+    await group_activity.record(chat.id, chat.title or f"Group {chat.id}", user.id, BOT_ID)
 
 
 # ======================
@@ -145,20 +219,26 @@ def build_application() -> Application:
         allow_reentry=True,
     )
 
+    # Runs before every other handler without consuming the update.
+    application.add_handler(TypeHandler(Update, track_private_activity), group=-1)
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(add_request_conv)
     application.add_handler(pray_text_conv)
     application.add_handler(pray_audio_conv)
     application.add_handler(CommandHandler("my_requests_list", my_requests_list))
+    application.add_handler(CallbackQueryHandler(my_requests_page, pattern="^mylist_"))
     application.add_handler(
         CallbackQueryHandler(handle_my_request_action, pattern="^(view_|remove_|back_to_list|add_new)")
     )
     application.add_handler(CommandHandler("request_list", request_list_command))
+    application.add_handler(CallbackQueryHandler(request_list_page, pattern="^plist_"))
     application.add_handler(CallbackQueryHandler(handle_public_request_view, pattern="^public_view_"))
     application.add_handler(
         CallbackQueryHandler(handle_request_actions, pattern="^(pray_|join_|unjoin_|public_back_to_list)")
     )
+    if HOURLY_REMINDERS:
+        application.add_handler(CommandHandler("reminder_time", reminder_time_command))
     application.add_handler(MessageHandler(filters.ChatType.GROUPS & filters.ALL, handle_group_message))
     application.add_handler(CommandHandler("cancel", cancel))
 
@@ -166,6 +246,12 @@ def build_application() -> Application:
 
 
 telegram_app = build_application()
+update_queue = UpdateQueue(
+    telegram_app.process_update,
+    dispatcher,
+    maxsize=UPDATE_QUEUE_SIZE,
+    workers=UPDATE_WORKERS,
+)
 
 
 # ======================
@@ -178,11 +264,14 @@ async def webhook(request: Request):
         raise HTTPException(status_code=500, detail="Missing BOT_TOKEN environment variable")
 
     try:
-        init_db()
         data = await request.json()
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Invalid request payload: {exc}") from exc
 
+    update_id = data.get("update_id") if isinstance(data, dict) else None
+    if isinstance(update_id, int) and await deduplicator.check_and_add(update_id):
+        return {"ok": True, "duplicate": True}
+
     try:
         update = Update.de_json(data, telegram_app.bot)
         if update is None:
@@ -190,11 +279,46 @@ async def webhook(request: Request):
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Invalid Telegram update: {exc}") from exc
 
-    try:
-        # Prevent concurrent update handling from racing shared app state.
-        async with update_lock:
-            await telegram_app.process_update(update)
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Failed to process update: {exc}") from exc
-
-    return {"ok": True}
\ No newline at end of file
+    if WEBHOOK_MODE == "queue":
+        try:
+            update_queue.submit(update)
+        except QueueFull as exc:
+            await deduplicator.forget(update.update_id)
+            # Telegram retries non-2xx deliveries, so shed load until we catch up.
+            return JSONResponse(
+                status_code=503,
+                content={"ok": False, "detail": str(exc)},
+                headers={"Retry-After": "1"},
+            )
+        return {"ok": True}
+
+    with outbound.collect() as deliveries:
+        try:
+            await dispatcher.run(
+                update_shard_key(update),
+                lambda: telegram_app.process_update(update),
+            )
+        except Exception as exc:
+            # Let Telegram's redelivery of this update be processed again.
+            await deduplicator.forget(update.update_id)
+            raise HTTPException(status_code=500, detail=f"Failed to process update: {exc}") from exc
+        finally:
+            # Handlers reply first; the notifications they queued finish here.
+            if not await outbound.wait(deliveries, timeout=DELIVERY_WAIT_TIMEOUT):
+                print(f"Deliveries for update {update.update_id} still pending after {DELIVERY_WAIT_TIMEOUT}s")
+
+    return {"ok": True}
+
+
+@app.get("/api/webhook/stats")
+async def webhook_stats():
+    return {
+        "ok": True,
+        "mode": WEBHOOK_MODE,
+        "dispatcher": dispatcher.stats(),
+        "queue": update_queue.stats(),
+        "dedup": deduplicator.stats(),
+        "outbound": outbound.stats(),
+        "visibility_cache": visibility_cache.stats(),
+        "group_activity": group_activity.stats(),
+    }
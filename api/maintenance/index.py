@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi import FastAPI, Request, HTTPException
+
+from dotenv import load_dotenv
+
+from database import init_db, run_maintenance
+
+load_dotenv()
+
+CRON_SECRET = os.getenv("CRON_SECRET", "")
+# Free pages released per run; the rest are picked up by later runs.
+VACUUM_PAGES = 1000
+
+app = FastAPI()
+
+
+@app.get("/api/maintenance")
+async def maintenance(request: Request, pages: int = VACUUM_PAGES):
+    print(
+        "Maintenance endpoint invoked:",
+        f"ua={request.headers.get('user-agent', '')}",
+        f"x-vercel-cron={request.headers.get('x-vercel-cron', '')}",
+    )
+
+    if CRON_SECRET:
+        auth = request.headers.get("authorization", "")
+        if auth != f"Bearer {CRON_SECRET}":
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if pages < 0:
+        raise HTTPException(status_code=400, detail="Expected pages >= 0")
+
+    init_db()
+    return {"status": "ok", **run_maintenance(vacuum_pages=pages)}
@@ -0,0 +1,80 @@
+# async_database.py
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+import database
+from storage import get_storage
+
+T = TypeVar("T")
+
+# Threads that run database calls for async code. Each keeps its own reader
+# connection (see database.ConnectionManager); writes still take turns on the
+# single writer connection.
+DB_THREADS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    return _executor
+
+
+async def run(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking ``func`` on the database threads without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    """Wait for in-flight calls and stop the database threads."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _awaitable(name: str, stored: bool = False):
+    # Resolved on each call so the storage backend can be swapped and the
+    # SQLite-only helpers can be patched on the database module. Stored
+    # operations go through SqliteStorage, which binds the database functions
+    # at import: patch the backend (or set_storage) to replace those.
+    def target():
+        return getattr(get_storage() if stored else database, name)
+
+    async def call(*args, **kwargs):
+        return await run(target(), *args, **kwargs)
+
+    call.__name__ = call.__qualname__ = name
+    call.__doc__ = getattr(database, name).__doc__
+    return call
+
+
+# Operations of the storage backend (see storage.Storage)
+resolve_request_ref = _awaitable("resolve_request_ref", stored=True)
+get_request_by_rid = _awaitable("get_request_by_rid", stored=True)
+insert_prayer_request = _awaitable("insert_prayer_request", stored=True)
+delete_request_by_id = _awaitable("delete_request_by_id", stored=True)
+get_my_requests_page = _awaitable("get_my_requests_page", stored=True)
+
+get_user_groups = _awaitable("get_user_groups", stored=True)
+
+mark_prayed = _awaitable("mark_prayed", stored=True)
+mark_joined = _awaitable("mark_joined", stored=True)
+unmark_joined = _awaitable("unmark_joined", stored=True)
+get_joined_users = _awaitable("get_joined_users", stored=True)
+
+
+# Reminder preferences and recipient state, always on SQLite
+get_reminder_preference = _awaitable("get_reminder_preference")
+save_reminder_preference = _awaitable("save_reminder_preference")
+revive_recipient = _awaitable("revive_recipient")
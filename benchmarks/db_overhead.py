@@ -0,0 +1,58 @@
+"""Measure per-update database overhead of the helpers in database.py.
+
+Replays the helper calls a typical "Mark as prayed" tap makes against a
+seeded temporary database and prints the average cost per update.
+
+    python benchmarks/db_overhead.py [updates]
+"""
+import sys
+import os
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from state import PrayerRequest
+
+
+def _seed(requests: int = 200):
+    for gid in range(5):
+        for uid in range(1, 51):
+            database.save_user_group_membership(uid, gid)
+    for i in range(requests):
+        database.insert_prayer_request(PrayerRequest(
+            id=i + 1,
+            user_id=i % 50 + 1,
+            username=f"user_{i % 50 + 1}",
+            text=f"Prayer request {i}",
+            is_anonymous=False,
+        ))
+
+
+def _simulate_update(i: int):
+    req_id = i % 200 + 1
+    user_id = i % 50 + 1
+    req = database.get_request_by_rid(req_id)
+    database.get_joined_users(req.id)
+    database.mark_prayed(user_id, req.id)
+    database.get_user_groups(user_id)
+
+
+def main(updates: int = 2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        database._db_path = lambda: path
+        database.init_db()
+        _seed()
+
+        start = time.perf_counter()
+        for i in range(updates):
+            _simulate_update(i)
+        elapsed = time.perf_counter() - start
+
+        print(f"updates={updates} total={elapsed:.3f}s per_update={elapsed / updates * 1000:.3f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,63 @@
+"""Compare the SQLite cost of tracking group messages with and without buffering.
+
+Replays a stream of group messages (a few busy groups, mostly repeat
+senders) through the old per-message writes and through
+GroupActivityBuffer, and prints the cost per message.
+
+    python benchmarks/group_messages.py [messages]
+"""
+import sys
+import os
+import asyncio
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from group_activity import GroupActivityBuffer
+
+BOT_ID = 1
+
+
+def _messages(count: int):
+    rng = random.Random(17)
+    for _ in range(count):
+        group_id = -rng.randrange(1, 6)
+        yield group_id, rng.randrange(100, 160), f"Group {group_id}"
+
+
+def _direct(messages):
+    for group_id, user_id, title in messages:
+        database.save_user_group_membership(user_id, group_id)
+        database.save_user_group_membership(BOT_ID, group_id)
+        database.save_group_title(group_id, title)
+
+
+def _buffered(messages):
+    async def replay():
+        buffer = GroupActivityBuffer(database)
+        for group_id, user_id, title in messages:
+            await buffer.record(group_id, title, user_id, BOT_ID)
+        await buffer.flush()
+        return buffer
+    return asyncio.run(replay())
+
+
+def main(count: int = 5000):
+    messages = list(_messages(count))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, run in (("direct", _direct), ("buffered", _buffered)):
+            path = os.path.join(tmp, f"{name}.db")
+            database._db_path = lambda: path
+            database.init_db()
+
+            start = time.perf_counter()
+            run(messages)
+            elapsed = time.perf_counter() - start
+            print(f"{name}: messages={count} total={elapsed:.3f}s per_message={elapsed / count * 1000:.4f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,105 @@
+"""Time the request list handlers against a storage backend.
+
+Builds users in overlapping groups with requests, joins and prayed marks
+through the storage interface, then times the work behind a /request_list
+tap (first page, next page, a request view) and a "Mark as prayed" tap for
+random viewers. The in-memory backend runs without disk noise, so it can
+be scaled to millions of rows; sqlite runs the same workload on a
+temporary file.
+
+    python benchmarks/handlers.py [requests] [memory|sqlite]
+"""
+import sys
+import os
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import handle_prayer
+import storage
+from state import PrayerRequest, encode_request_id
+
+USERS_PER_GROUP = 50
+REQUESTS_PER_USER = 4
+TAPS = 500
+
+
+def _populate(store, requests: int, rng: random.Random) -> list[int]:
+    users = max(2, requests // REQUESTS_PER_USER)
+    groups = max(1, users // USERS_PER_GROUP)
+    memberships = []
+    for user_id in range(1, users + 1):
+        for group_id in rng.sample(range(1, groups + 1), min(groups, 2)):
+            memberships.append((user_id, -group_id))
+    store.save_group_activity(memberships, [(-g, f"Group {g}") for g in range(1, groups + 1)])
+
+    for i in range(requests):
+        user_id = rng.randrange(1, users + 1)
+        req_id = store.insert_prayer_request(PrayerRequest(
+            None, user_id, f"user_{user_id}", f"Please pray for request {i}", rng.random() < 0.2,
+        ))
+        if rng.random() < 0.5:
+            store.mark_prayed(rng.randrange(1, users + 1), req_id)
+        if rng.random() < 0.2:
+            store.mark_joined(rng.randrange(1, users + 1), req_id)
+    return list(range(1, users + 1))
+
+
+def _tap_list(user_id: int):
+    rendered = handle_prayer._render_page(user_id, None)
+    if rendered is None:
+        return
+    _, keyboard = rendered
+    nav = keyboard.inline_keyboard[-1][-1].callback_data
+    if nav.startswith("plist_"):
+        handle_prayer._render_page(user_id, nav)
+    view = keyboard.inline_keyboard[0][0].callback_data
+    if view.startswith("public_view_"):
+        handle_prayer._lookup_request(view.split("_", 2)[2])
+
+
+def _tap_pray(store, user_id: int, request_count: int, rng: random.Random):
+    req = handle_prayer._lookup_request(encode_request_id(rng.randrange(1, request_count + 1)))
+    if req is not None:
+        store.mark_prayed(user_id, req.id)
+        store.get_joined_users(req.id)
+
+
+def _time(label: str, func, taps: int):
+    start = time.perf_counter()
+    for _ in range(taps):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label}: taps={taps} total={elapsed:.3f}s per_tap={elapsed / taps * 1000:.3f}ms")
+
+
+def main(requests: int = 100000, backend: str = "memory"):
+    rng = random.Random(23)
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "sqlite":
+            path = os.path.join(tmp, "handlers.db")
+            database._db_path = lambda: path
+            database.init_db()
+            store = storage.SqliteStorage()
+        else:
+            store = storage.MemoryStorage()
+        storage.set_storage(store)
+        handle_prayer.visibility_cache.clear()
+
+        start = time.perf_counter()
+        users = _populate(store, requests, rng)
+        print(f"{backend}: users={len(users)} requests={requests} populate={time.perf_counter() - start:.2f}s")
+
+        _time("request_list", lambda: _tap_list(rng.choice(users)), TAPS)
+        _time("mark_prayed", lambda: _tap_pray(store, rng.choice(users), requests, rng), TAPS)
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        sys.argv[2] if len(sys.argv) > 2 else "memory",
+    )
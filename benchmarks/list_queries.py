@@ -0,0 +1,94 @@
+"""Compare the allocations of full-row and preview list queries.
+
+Lists one user's requests the way the list helpers used to (sqlite3.Row
+lookups into a regular dataclass with the full text) and through
+get_my_requests_page with a page as large as the list (tuple rows into
+slotted RequestPreview objects with a substr() preview), and prints
+tracemalloc peak memory, allocation count and text characters loaded per
+list.
+
+    python benchmarks/list_queries.py [requests] [text_length]
+"""
+import sys
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from state import PrayerRequest
+
+USER_ID = 2
+ROUNDS = 20
+
+
+@dataclass
+class _FullRow:
+    id: int
+    user_id: int
+    username: str
+    text: str
+    is_anonymous: bool
+
+
+def _full_rows(user_id: int) -> list[_FullRow]:
+    with database.connections.reader() as conn:
+        rows = conn.execute(
+            "SELECT id, user_id, username, text, is_anonymous FROM Prayer_Requests WHERE user_id = ?",
+            (user_id,),
+        ).fetchall()
+        return [
+            _FullRow(
+                id=row['id'],
+                user_id=row['user_id'],
+                username=row['username'],
+                text=row['text'],
+                is_anonymous=bool(row['is_anonymous']),
+            ) for row in rows
+        ]
+
+
+def _measure(name: str, list_rows, text_of):
+    list_rows(USER_ID)  # warm the statement cache
+    tracemalloc.start()
+    rows = list_rows(USER_ID)
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    chars = sum(len(text_of(row)) for row in rows)
+    del rows
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        list_rows(USER_ID)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"{name}: peak={peak / 1024:.1f}KiB live_blocks={blocks} text_chars={chars} per_list={elapsed * 1000:.3f}ms")
+
+
+def main(requests: int = 2000, text_length: int = 800):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lists.db")
+        database._db_path = lambda: path
+        database.init_db()
+        for i in range(requests):
+            database.insert_prayer_request(PrayerRequest(
+                None, USER_ID, f"user_{USER_ID}", f"{i}: " + "please pray " * (text_length // 12), False,
+            ))
+
+        _measure("full rows", _full_rows, lambda row: row.text)
+        _measure(
+            "previews",
+            lambda user_id: database.get_my_requests_page(user_id, limit=requests).items,
+            lambda item: item[1].preview,
+        )
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 800,
+    )
@@ -0,0 +1,47 @@
+"""Measure the daily reminder's visibility computation.
+
+Builds a random users × groups membership and one request per user, then
+times the bulk VisibilityIndex pass the reminder uses for every recipient.
+
+    python benchmarks/reminder_visibility.py [users] [requests] [groups]
+"""
+import sys
+import os
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import PrayerRequest
+from visibility import VisibilityIndex
+
+
+def main(users: int = 2000, requests: int = 2000, groups: int = 50):
+    rng = random.Random(0)
+    user_ids = list(range(1, users + 1))
+    memberships = [
+        (uid, gid)
+        for uid in user_ids
+        for gid in rng.sample(range(groups), rng.randint(1, 3))
+    ]
+    all_requests = [
+        PrayerRequest(
+            id=i + 1,
+            user_id=rng.choice(user_ids),
+            username="user",
+            text=f"Prayer request {i}",
+            is_anonymous=False,
+        )
+        for i in range(requests)
+    ]
+
+    start = time.perf_counter()
+    index = VisibilityIndex(all_requests, memberships)
+    visible = sum(index.visible_bits(uid).bit_count() for uid in user_ids)
+    elapsed = time.perf_counter() - start
+
+    print(f"users={users} requests={requests} visible_pairs={visible} compute={elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,105 @@
+"""Compare the peak memory of whole-table reads and digest rebuilds.
+
+Fills a temporary database with requests from distinct users in groups of
+GROUP_SIZE, then in a fresh child process per mode:
+
+- list / stream: reads every request and every user id once through the
+  list functions (get_all_prayer_requests, get_all_user_ids) or through
+  the streaming generators (iter_all_prayer_requests, iter_all_user_ids),
+  consuming rows one at a time;
+- digests_one_pass / digests_batched: renders every recipient's stale
+  digest in a single batch over the whole table, or through
+  refresh_daily_digests, which renders DIGEST_BATCH users at a time.
+
+The printed peak RSS (ru_maxrss) belongs to that mode alone; the streamed
+and batched peaks should stay flat as the row count grows.
+
+    python benchmarks/stream_memory.py [max_rows] [text_length]
+"""
+import sys
+import os
+import resource
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import digest
+
+GROUP_SIZE = 50
+
+
+def _consume(requests, user_ids) -> str:
+    chars = sum(len(req.text) for req in requests)
+    users = sum(1 for _ in user_ids)
+    return f"text_chars={chars} users={users}"
+
+
+READS = {
+    "list": lambda: _consume(database.get_all_prayer_requests(), database.get_all_user_ids()),
+    "stream": lambda: _consume(database.iter_all_prayer_requests(), database.iter_all_user_ids()),
+    "digests_one_pass": lambda: f"rendered={digest._refresh_batch(database.get_stale_daily_digests())}",
+    "digests_batched": lambda: f"rendered={digest.refresh_daily_digests()}",
+}
+
+
+def _populate(path: str, rows: int, text_length: int):
+    database._db_path = lambda: path
+    database.init_db()
+    with database.connections.writer() as conn:
+        conn.executemany(
+            "INSERT INTO Prayer_Requests (user_id, username, text, is_anonymous) VALUES (?, ?, ?, 0)",
+            ((i, f"user_{i}", f"{i}: " + "x" * text_length) for i in range(1, rows + 1)),
+        )
+        conn.executemany(
+            "INSERT INTO Group_Membership (user_id, group_id) VALUES (?, ?)",
+            ((i, -(i // GROUP_SIZE)) for i in range(1, rows + 1)),
+        )
+        # Every recipient starts with a stale digest.
+        conn.executemany(
+            "INSERT OR IGNORE INTO Daily_Digest (user_id) VALUES (?)",
+            ((i,) for i in range(1, rows + 1)),
+        )
+    database.close_connections()
+
+
+def _read(path: str, mode: str):
+    database._db_path = lambda: path
+    database.init_db()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    detail = READS[mode]()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{peak - baseline} {peak} {detail}")
+
+
+def main(max_rows: int = 100000, text_length: int = 200):
+    rows = 25000
+    with tempfile.TemporaryDirectory() as tmp:
+        while rows <= max_rows:
+            for mode in READS:
+                # A fresh database per mode, so rendered digests don't carry over.
+                path = os.path.join(tmp, f"{mode}_{rows}.db")
+                _populate(path, rows, text_length)
+                child = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--read", path, mode],
+                    capture_output=True, text=True,
+                )
+                if child.returncode != 0:
+                    # e.g. killed for running out of memory
+                    print(f"rows={rows} {mode}: exited with {child.returncode}")
+                    continue
+                out = child.stdout.split(maxsplit=2)
+                growth, peak, detail = int(out[0]), int(out[1]), out[2].strip()
+                print(f"rows={rows} {mode}: peak_rss={peak / 1024:.1f}MiB growth={growth / 1024:.1f}MiB {detail}")
+            rows *= 2
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--read":
+        _read(sys.argv[2], sys.argv[3])
+    else:
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+        )
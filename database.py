@@ -1,188 +1,785 @@
 # database.py
 import os
+import json
 import sqlite3
-from collections import defaultdict
-from state import PrayerRequest
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from state import PAGE_SIZE, PREVIEW_LENGTH, Page, PrayerRequest, RequestPreview, VisibleRequest, decode_request_id
+
+# Prepared statements kept per connection by sqlite3's statement cache.
+CACHED_STATEMENTS = 256
+
+# Rows fetched per round trip when streaming a whole table.
+STREAM_BATCH = 500
+
+# Reminders go out at 09:00 UTC+8 (01:00 UTC) unless a user picks a time.
+DEFAULT_REMINDER_HOUR = 9
+DEFAULT_REMINDER_OFFSET = 8
+DEFAULT_REMINDER_UTC_HOUR = (DEFAULT_REMINDER_HOUR - DEFAULT_REMINDER_OFFSET) % 24
 
 def _db_path():
     return "/tmp/prayerbot.db" if os.environ.get("VERCEL") else "prayerbot.db"
 
-def get_connection():
-    conn = sqlite3.connect(_db_path(), timeout=10)
+def _open_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path,
+        timeout=10,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+        isolation_level=None,
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA busy_timeout = 5000")
     conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA synchronous = NORMAL")
     return conn
 
-def init_db():
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Prayer_Requests (
-                id TEXT PRIMARY KEY,
-                user_id INTEGER,
-                username TEXT,
-                text TEXT,
-                is_anonymous BOOLEAN
-            )
-        ''')
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Group_Membership (
-                user_id INTEGER,
-                group_id INTEGER,
-                PRIMARY KEY (user_id, group_id)
-            )
-        ''')
+class _ThreadReader:
+    """A thread's reader connection, held in thread-local storage.
 
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS Group_Metadata (
-                group_id INTEGER PRIMARY KEY,
-                group_title TEXT
-            )
-        ''')
+    When the thread exits its locals are dropped and the finalizer set up by
+    ``ConnectionManager.reader`` closes the connection.
+    """
+
+    __slots__ = ("generation", "conn", "__weakref__")
+
+    def __init__(self, generation: int, conn: sqlite3.Connection):
+        self.generation = generation
+        self.conn = conn
+
+
+class ConnectionManager:
+    """Process-wide SQLite connections.
+
+    Reads go through a long-lived connection per thread, closed when that
+    thread exits; writes go through a single writer connection serialized by
+    a lock. Connections are reopened when the database path changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._path = None
+        self._generation = 0
+        self._writer = None
+        self._write_depth = 0
+        self._readers: set[sqlite3.Connection] = set()
+
+    def _current_generation(self) -> int:
+        path = _db_path()
+        if path != self._path:
+            with self._lock:
+                if path != self._path:
+                    self._close_all()
+                    self._path = path
+                    self._generation += 1
+        return self._generation
+
+    def _close_all(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        for conn in self._readers:
+            conn.close()
+        self._readers.clear()
+
+    def close(self):
+        with self._lock:
+            self._close_all()
+            self._path = None
+
+    def _get_writer(self) -> sqlite3.Connection:
+        # Callers hold the write lock and have already checked the path.
+        if self._writer is None:
+            self._writer = _open_connection(self._path)
+            # Only takes effect on a new database; run_maintenance() converts
+            # older ones.
+            self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self._writer.execute("PRAGMA journal_mode = WAL")
+        return self._writer
+
+    def _release_reader(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._readers.discard(conn)
+        conn.close()
+
+    @contextmanager
+    def reader(self):
+        generation = self._current_generation()
+        cached = getattr(self._local, "reader", None)
+        if cached is None or cached.generation != generation:
+            # Make sure the database is in WAL mode before the first read.
+            with self._write_lock:
+                self._get_writer()
+            conn = _open_connection(self._path)
+            with self._lock:
+                self._readers.add(conn)
+            cached = _ThreadReader(generation, conn)
+            weakref.finalize(cached, self._release_reader, conn)
+            self._local.reader = cached
+        yield cached.conn
+
+    @contextmanager
+    def writer(self):
+        self._current_generation()
+        with self._write_lock:
+            conn = self._get_writer()
+            outermost = self._write_depth == 0
+            if outermost:
+                conn.execute("BEGIN IMMEDIATE")
+            self._write_depth += 1
+            try:
+                yield conn
+            except BaseException:
+                self._write_depth -= 1
+                if outermost:
+                    conn.rollback()
+                raise
+            else:
+                self._write_depth -= 1
+                if outermost:
+                    conn.commit()
+
+    def stream_connection(self) -> sqlite3.Connection:
+        """A private read connection for one long-running stream; the caller closes it."""
+        self._current_generation()
+        with self._write_lock:
+            self._get_writer()
+        conn = _open_connection(self._path)
+        conn.row_factory = None
+        return conn
+
+    @contextmanager
+    def autocommit(self):
+        """The writer connection outside any transaction, e.g. for VACUUM."""
+        self._current_generation()
+        with self._write_lock:
+            if self._write_depth:
+                raise RuntimeError("autocommit() used inside a write transaction")
+            yield self._get_writer()
+
+
+connections = ConnectionManager()
+
+def _tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """A cursor returning plain tuples, for queries that build their own row objects."""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+# Request columns in RequestPreview order, with the text cut to a preview.
+_PREVIEW_COLUMNS = f"r.id, r.user_id, r.username, substr(r.text, 1, {PREVIEW_LENGTH}), r.is_anonymous"
+
+def _preview(row) -> RequestPreview:
+    return RequestPreview(row[0], row[1], row[2], row[3], bool(row[4]))
+
+def close_connections():
+    """Close the process-wide connections, e.g. on application shutdown."""
+    connections.close()
+
+# In-process change counters that tell cached per-viewer views when they are
+# out of date. The data version covers requests, memberships and group
+# titles; a user's version covers their own prayed/joined marks. They are
+# bumped after the write commits.
+_data_version = 0
+_user_versions: dict[int, int] = {}
+
+def _bump_data_version():
+    global _data_version
+    _data_version += 1
+
+def _bump_user_version(user_id: int):
+    _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+def get_visibility_version(user_id: int) -> tuple[int, int]:
+    return _data_version, _user_versions.get(user_id, 0)
+
+# Schema migrations, applied in order. Migration N brings the database to
+# PRAGMA user_version N; append new migrations, never edit applied ones.
+def _migration_base_schema(conn: sqlite3.Connection):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Prayer_Requests (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            username TEXT,
+            text TEXT,
+            is_anonymous BOOLEAN
+        )
+    ''')
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Joined_Users (
-                request_id TEXT,
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Group_Membership (
+            user_id INTEGER,
+            group_id INTEGER,
+            PRIMARY KEY (user_id, group_id)
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS Group_Metadata (
+            group_id INTEGER PRIMARY KEY,
+            group_title TEXT
+        )
+    ''')
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Joined_Users (
+            request_id TEXT,
+            user_id INTEGER,
+            PRIMARY KEY (request_id, user_id),
+            FOREIGN KEY (request_id) REFERENCES Prayer_Requests(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Prayed_Users (
+            request_id TEXT,
+            user_id INTEGER,
+            PRIMARY KEY (request_id, user_id),
+            FOREIGN KEY (request_id) REFERENCES Prayer_Requests(id)
+        )
+    """)
+
+def _migration_secondary_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_group_membership_group ON Group_Membership (group_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_joined_users_user ON Joined_Users (user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prayer_requests_user ON Prayer_Requests (user_id)")
+
+def _migration_processed_updates(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Processed_Updates (
+            update_id INTEGER PRIMARY KEY,
+            seen_at REAL NOT NULL
+        )
+    """)
+
+def _migration_reminder_runs(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Reminder_Runs (
+            run_key TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            shard_count INTEGER NOT NULL,
+            last_user_id INTEGER,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL,
+            PRIMARY KEY (run_key, shard, shard_count)
+        )
+    """)
+
+def _migration_votd_cache(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Votd_Cache (
+            day TEXT PRIMARY KEY,
+            verse TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    """)
+
+def _migration_daily_digest(conn: sqlite3.Connection):
+    # A digest is stale while version != rendered_version.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Daily_Digest (
+            user_id INTEGER PRIMARY KEY,
+            request_count INTEGER NOT NULL DEFAULT 0,
+            body TEXT NOT NULL DEFAULT '[]',
+            version INTEGER NOT NULL DEFAULT 1,
+            rendered_version INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        )
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO Daily_Digest (user_id)
+        SELECT user_id FROM Prayer_Requests
+        UNION
+        SELECT user_id FROM Joined_Users
+    """)
+
+def _migration_reminder_preferences(conn: sqlite3.Connection):
+    # utc_hour is derived from the local hour and offset so the hourly
+    # reminder can select its bucket with an index lookup.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Reminder_Preferences (
+            user_id INTEGER PRIMARY KEY,
+            local_hour INTEGER NOT NULL,
+            utc_offset INTEGER NOT NULL,
+            utc_hour INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminder_preferences_hour ON Reminder_Preferences (utc_hour)")
+
+def _migration_delivery_status(conn: sqlite3.Connection):
+    # dead = 1 once Telegram says the user can never be reached (blocked the
+    # bot, deactivated); transient_failures counts other failed deliveries.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Delivery_Status (
+            user_id INTEGER PRIMARY KEY,
+            dead INTEGER NOT NULL DEFAULT 0,
+            transient_failures INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            updated_at REAL
+        )
+    """)
+
+def _migration_integer_request_ids(conn: sqlite3.Connection):
+    # Rebuild the request tables around an INTEGER PRIMARY KEY. Existing
+    # requests keep their rowid as the new id and their UUID in legacy_id so
+    # buttons in old messages still resolve. AUTOINCREMENT stops a deleted
+    # request's id (and its old buttons) from being reused.
+    conn.execute("""
+        CREATE TABLE Prayer_Requests_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            username TEXT,
+            text TEXT,
+            is_anonymous BOOLEAN,
+            legacy_id TEXT
+        )
+    """)
+    conn.execute("""
+        INSERT INTO Prayer_Requests_new (id, user_id, username, text, is_anonymous, legacy_id)
+        SELECT rowid, user_id, username, text, is_anonymous, id FROM Prayer_Requests
+    """)
+    for table in ("Joined_Users", "Prayed_Users"):
+        conn.execute(f"""
+            CREATE TABLE {table}_new (
+                request_id INTEGER,
                 user_id INTEGER,
                 PRIMARY KEY (request_id, user_id),
-                FOREIGN KEY (request_id) REFERENCES Prayer_Requests(id)
+                FOREIGN KEY (request_id) REFERENCES Prayer_Requests_new(id)
             )
         """)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {table}_new (request_id, user_id)
+            SELECT r.id, t.user_id FROM {table} t
+            JOIN Prayer_Requests_new r ON r.legacy_id = t.request_id
+        """)
+        conn.execute(f"DROP TABLE {table}")
+    conn.execute("DROP TABLE Prayer_Requests")
+    # Renaming also rewrites the child tables' foreign key references.
+    conn.execute("ALTER TABLE Prayer_Requests_new RENAME TO Prayer_Requests")
+    conn.execute("ALTER TABLE Joined_Users_new RENAME TO Joined_Users")
+    conn.execute("ALTER TABLE Prayed_Users_new RENAME TO Prayed_Users")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_prayer_requests_user ON Prayer_Requests (user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_joined_users_user ON Joined_Users (user_id)")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_prayer_requests_legacy
+        ON Prayer_Requests (legacy_id) WHERE legacy_id IS NOT NULL
+    """)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Prayed_Users (
-                request_id TEXT,
+def _migration_cascade_request_children(conn: sqlite3.Connection):
+    # Deleting a request now deletes its joins and prayed marks too. Rows
+    # already orphaned by earlier deletes are left behind by the copy.
+    for table in ("Joined_Users", "Prayed_Users"):
+        conn.execute(f"""
+            CREATE TABLE {table}_new (
+                request_id INTEGER,
                 user_id INTEGER,
                 PRIMARY KEY (request_id, user_id),
-                FOREIGN KEY (request_id) REFERENCES Prayer_Requests(id)
+                FOREIGN KEY (request_id) REFERENCES Prayer_Requests(id) ON DELETE CASCADE
             )
         """)
+        conn.execute(f"""
+            INSERT INTO {table}_new (request_id, user_id)
+            SELECT request_id, user_id FROM {table}
+            WHERE request_id IN (SELECT id FROM Prayer_Requests)
+        """)
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_joined_users_user ON Joined_Users (user_id)")
 
-        conn.commit()
+def _migration_reminder_retries(conn: sqlite3.Connection):
+    # Recipients of a reminder run whose send failed transiently; the next
+    # invocation of the run sends to them again.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Reminder_Retries (
+            run_key TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            shard_count INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (run_key, shard, shard_count, user_id)
+        )
+    """)
 
-def get_all_user_ids() -> list[int]:
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT DISTINCT user_id FROM Prayer_Requests
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_secondary_indexes,
+    _migration_processed_updates,
+    _migration_reminder_runs,
+    _migration_votd_cache,
+    _migration_daily_digest,
+    _migration_reminder_preferences,
+    _migration_delivery_status,
+    _migration_integer_request_ids,
+    _migration_cascade_request_children,
+    _migration_reminder_retries,
+]
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate() -> int:
+    """Apply pending migrations and return the resulting schema version.
+
+    Each migration runs in its own short write transaction, so readers (WAL)
+    are never blocked and concurrent processes skip what is already applied.
+    """
+    while True:
+        with connections.writer() as conn:
+            version = _schema_version(conn)
+            if version >= len(MIGRATIONS):
+                return version
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+def init_db():
+    """Bring the schema up to date once per process and database path."""
+    path = _db_path()
+    if path in _migrated_paths:
+        return
+    with _migrate_lock:
+        if path not in _migrated_paths:
+            migrate()
+            _migrated_paths.add(path)
+
+
+def _stream_rows(sql: str, params=(), batch: int = STREAM_BATCH) -> Iterator[tuple]:
+    """Yield the rows of ``sql`` as tuples, fetching ``batch`` at a time.
+
+    The rows come from a private connection, so only one batch is held in
+    memory and the generator may be advanced from any thread. The connection
+    closes when the rows run out or the generator is discarded.
+    """
+    conn = connections.stream_connection()
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
+def iter_all_user_ids(utc_hour: int | None = None, batch: int = STREAM_BATCH) -> Iterator[int]:
+    """Users who made or joined a request, in ascending order, streamed.
+
+    Users marked unreachable are skipped. With ``utc_hour`` only users whose
+    preferred reminder hour falls in that UTC hour are included; users
+    without a preference belong to ``DEFAULT_REMINDER_UTC_HOUR``.
+    """
+    params = {"default_hour": DEFAULT_REMINDER_UTC_HOUR, "hour": utc_hour}
+    hour_filter = "AND COALESCE(p.utc_hour, :default_hour) = :hour" if utc_hour is not None else ""
+    rows = _stream_rows(f"""
+        SELECT u.user_id
+        FROM (
+            SELECT user_id FROM Prayer_Requests
             UNION
-            SELECT DISTINCT user_id FROM Joined_Users
-        """)
-        return [row[0] for row in cursor.fetchall()]
+            SELECT user_id FROM Joined_Users
+        ) u
+        LEFT JOIN Reminder_Preferences p ON p.user_id = u.user_id
+        WHERE u.user_id NOT IN (SELECT user_id FROM Delivery_Status WHERE dead = 1)
+          {hour_filter}
+        ORDER BY u.user_id
+    """, params, batch)
+    for row in rows:
+        yield row[0]
+
+def get_all_user_ids() -> list[int]:
+    """Users who made or joined a request, except those marked unreachable."""
+    return list(iter_all_user_ids())
+
+def get_reminder_user_ids(utc_hour: int) -> list[int]:
+    """Reminder recipients whose preferred hour falls in the ``utc_hour`` bucket."""
+    return list(iter_all_user_ids(utc_hour))
 
 # Prayer_Requests functions
-def get_prayer_requests_by_user(user_id) -> list[PrayerRequest]:
-    """Fetch all prayer requests made by a specific user."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, user_id, username, text, is_anonymous FROM Prayer_Requests WHERE user_id = ?", (user_id,))
-        rows = cursor.fetchall()
-        return [
-            PrayerRequest(
-                id=row['id'],
-                user_id=row['user_id'],
-                username=row['username'],
-                text=row['text'],
-                is_anonymous=bool(row['is_anonymous']),
-            )
-            for row in rows
-        ]
+def get_prayer_requests_by_users(user_ids: list[int]) -> list[PrayerRequest]:
+    """Full prayer requests made by any of ``user_ids``, in id order."""
+    with connections.reader() as conn:
+        rows = _tuple_cursor(conn).execute("""
+            SELECT id, user_id, username, text, is_anonymous FROM Prayer_Requests
+            WHERE user_id IN (SELECT value FROM json_each(?))
+            ORDER BY id
+        """, (json.dumps(user_ids),))
+        return [PrayerRequest(row[0], row[1], row[2], row[3], bool(row[4])) for row in rows]
 
-def get_joined_requests_by_user(user_id: int) -> list[PrayerRequest]:
-    """Fetch all prayer requests joined by a specific user."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT Prayer_Requests.id, Prayer_Requests.user_id, Prayer_Requests.username,
-                   Prayer_Requests.text, Prayer_Requests.is_anonymous
-            FROM Prayer_Requests
-            JOIN Joined_Users ON Prayer_Requests.id = Joined_Users.request_id
-            WHERE Joined_Users.user_id = ?
-        """, (user_id,))
-        rows = cursor.fetchall()
-        return [
-            PrayerRequest(
-                id=row['id'],
-                user_id=row['user_id'],
-                username=row['username'],
-                text=row['text'],
-                is_anonymous=bool(row['is_anonymous']),
-            )
-            for row in rows
-        ]
 
+def resolve_request_ref(ref: str) -> int | None:
+    """Request id for a callback reference: base-36 short id or legacy UUID."""
+    request_id = decode_request_id(ref)
+    if request_id is not None:
+        return request_id
+    with connections.reader() as conn:
+        row = conn.execute("SELECT id FROM Prayer_Requests WHERE legacy_id = ?", (ref,)).fetchone()
+        return row[0] if row else None
 
-def get_request_by_rid(req_id: str):
+def get_request_by_rid(req_id: int):
     """Fetch a prayer request by its ID."""
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
+    with connections.reader() as conn:
+        row = _tuple_cursor(conn).execute("""
             SELECT id, user_id, username, text, is_anonymous
             FROM Prayer_Requests
             WHERE id = ?
-        """, (req_id,))
-        row = cursor.fetchone()
+        """, (req_id,)).fetchone()
         if row:
-            return PrayerRequest(
-                id=row[0],
-                user_id=row[1],
-                username=row[2],
-                text=row[3],
-                is_anonymous=bool(row[4]),
-            )
+            return PrayerRequest(row[0], row[1], row[2], row[3], bool(row[4]))
         return None
     
-def insert_prayer_request(req: PrayerRequest):
-    """Insert a new prayer request into the database."""
-    with get_connection() as conn:
+def insert_prayer_request(req: PrayerRequest) -> int:
+    """Insert a new prayer request and return its id (assigned unless ``req.id`` is set)."""
+    with connections.writer() as conn:
         c = conn.cursor()
         c.execute("""
             INSERT INTO Prayer_Requests (id, text, user_id, username, is_anonymous)
             VALUES (?, ?, ?, ?, ?)
         """, (req.id, req.text, req.user_id, req.username, int(req.is_anonymous)))
-        conn.commit()
+        request_id = c.lastrowid
+        _touch_group_peer_digests(conn, req.user_id)
+    _bump_data_version()
+    return request_id
 
-def delete_request_by_id(req_id: str):
-    """Delete a prayer request by its ID."""
-    with get_connection() as conn:
+def delete_request_by_id(req_id: int):
+    """Delete a prayer request by its ID; its joins and prayed marks go with it."""
+    with connections.writer() as conn:
         cursor = conn.cursor()
+        owner = cursor.execute("SELECT user_id FROM Prayer_Requests WHERE id = ?", (req_id,)).fetchone()
         cursor.execute("DELETE FROM Prayer_Requests WHERE id = ?", (req_id,))
-        conn.commit()
+        if owner:
+            _touch_group_peer_digests(conn, owner[0])
+    if owner:
+        _bump_data_version()
+
+def run_maintenance(vacuum_pages: int = 1000) -> dict:
+    """Purge orphaned join/prayed rows, return free pages to the OS and refresh statistics.
+
+    At most ``vacuum_pages`` free pages are released per call. A database
+    created before incremental auto-vacuum was enabled gets one full VACUUM
+    to switch it over.
+    """
+    with connections.writer() as conn:
+        orphans = 0
+        for table in ("Joined_Users", "Prayed_Users"):
+            orphans += conn.execute(
+                f"DELETE FROM {table} WHERE request_id NOT IN (SELECT id FROM Prayer_Requests)"
+            ).rowcount
+
+    with connections.autocommit() as conn:
+        converted = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        if converted:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute(f"PRAGMA incremental_vacuum({max(0, int(vacuum_pages))})").fetchall()
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.execute("ANALYZE")
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+
+    return {
+        "orphans_purged": orphans,
+        "converted_to_incremental": converted,
+        "pages_freed": free_pages - remaining,
+        "free_pages": remaining,
+        "page_count": page_count,
+    }
+
+def iter_all_prayer_requests(batch: int = STREAM_BATCH) -> Iterator[PrayerRequest]:
+    """Every prayer request in id order, streamed ``batch`` rows at a time."""
+    rows = _stream_rows(
+        "SELECT id, user_id, username, text, is_anonymous FROM Prayer_Requests ORDER BY id", (), batch
+    )
+    for row in rows:
+        yield PrayerRequest(row[0], row[1], row[2], row[3], bool(row[4]))
 
 def get_all_prayer_requests() -> list[PrayerRequest]:
     """Fetch all prayer requests from the database."""
-    with get_connection() as conn:
-        rows = conn.execute("SELECT * FROM Prayer_Requests").fetchall()
-        return [
-            PrayerRequest(
-                id=row['id'],
-                user_id=row['user_id'],
-                username=row['username'],
-                text=row['text'],
-                is_anonymous=bool(row['is_anonymous']),
-            ) for row in rows
+    return list(iter_all_prayer_requests())
+
+# Keyset pagination. Cursors are request ids (plus a list kind for the
+# own/joined list), so a page costs the same no matter how deep it is.
+# A visible request is listed under the lowest group it shares with the
+# viewer, and pages never span groups.
+def _listed_in_group(group: str) -> str:
+    """SQL condition: request ``r`` by ``creator`` is listed under ``group`` for :viewer."""
+    return f"""
+        creator.group_id = {group} AND r.user_id != :viewer
+        AND EXISTS (
+            SELECT 1 FROM Group_Membership own
+            WHERE own.user_id = :viewer AND own.group_id = {group}
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM Group_Membership vm
+            JOIN Group_Membership cm ON cm.group_id = vm.group_id
+            WHERE vm.user_id = :viewer AND cm.user_id = r.user_id AND vm.group_id < {group}
+        )
+    """
+
+# Within a group: named users alphabetically, anonymous requests last.
+_LIST_ORDER_COLUMNS = "r.is_anonymous, CASE WHEN r.is_anonymous THEN '' ELSE lower(r.username) END, r.rowid"
+
+def _page(rows: list, limit: int, cursor_of, forward: bool, has_cursor: bool) -> Page:
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    return Page(
+        items=rows,
+        start=cursor_of(rows[0]) if rows else None,
+        end=cursor_of(rows[-1]) if rows else None,
+        has_prev=more if not forward else has_cursor,
+        has_next=more if forward else has_cursor,
+    )
+
+def get_visible_request_page(viewer_id: int, group_id: int, after: int | None = None,
+                             before: int | None = None, limit: int = PAGE_SIZE) -> Page:
+    """One page of the requests listed under ``group_id`` for the viewer.
+
+    Items are VisibleRequest holding a RequestPreview; cursors are request
+    rowids. Pass ``after`` for
+    the next page or ``before`` for the previous one; neither gives the first
+    page and ``before=0`` the last. A cursor whose request was deleted
+    restarts from the matching end of the group.
+    """
+    forward = before is None
+    cursor = after if forward else before
+    with connections.reader() as conn:
+        key = None
+        if cursor:
+            key = conn.execute(
+                f"SELECT {_LIST_ORDER_COLUMNS} FROM Prayer_Requests r WHERE r.rowid = ?", (cursor,)
+            ).fetchone()
+        params = {"viewer": viewer_id, "group": group_id, "limit": limit + 1}
+        keyset = ""
+        if key is not None:
+            keyset = f"AND ({_LIST_ORDER_COLUMNS}) {'>' if forward else '<'} (:k0, :k1, :k2)"
+            params.update(k0=key[0], k1=key[1], k2=key[2])
+        direction = "" if forward else "DESC"
+        rows = _tuple_cursor(conn).execute(f"""
+            SELECT r.rowid, {_PREVIEW_COLUMNS}
+            FROM Group_Membership creator
+            JOIN Prayer_Requests r ON r.user_id = creator.user_id
+            WHERE {_listed_in_group(":group")} {keyset}
+            ORDER BY r.is_anonymous {direction},
+                     CASE WHEN r.is_anonymous THEN '' ELSE lower(r.username) END {direction},
+                     r.rowid {direction}
+            LIMIT :limit
+        """, params).fetchall()
+        page = _page(rows, limit, lambda row: row[0], forward, key is not None)
+        # Looked up for the page alone; in the query above it would run for
+        # every candidate row before the sort.
+        prayed = get_prayed_request_ids(viewer_id, (row[1] for row in page.items))
+        page.items = [
+            VisibleRequest(_preview(row[1:]), group_id, row[1] in prayed)
+            for row in page.items
         ]
+        return page
+
+def get_adjacent_visible_group(viewer_id: int, group_id: int | None = None, forward: bool = True) -> int | None:
+    """The viewer's next (or previous) group with requests listed under it.
+
+    Without ``group_id`` this is the first (or last) such group.
+    """
+    if group_id is None:
+        bound = ""
+    else:
+        bound = "AND viewer.group_id > :after" if forward else "AND viewer.group_id < :after"
+    with connections.reader() as conn:
+        row = conn.execute(f"""
+            SELECT viewer.group_id FROM Group_Membership viewer
+            WHERE viewer.user_id = :viewer {bound}
+              AND EXISTS (
+                  SELECT 1 FROM Group_Membership creator
+                  JOIN Prayer_Requests r ON r.user_id = creator.user_id
+                  WHERE {_listed_in_group("viewer.group_id")}
+              )
+            ORDER BY viewer.group_id {"" if forward else "DESC"}
+            LIMIT 1
+        """, {"viewer": viewer_id, "after": group_id}).fetchone()
+        return row[0] if row else None
+
+def get_my_requests_page(user_id: int, after: tuple[int, int] | None = None,
+                         before: tuple[int, int] | None = None, limit: int = PAGE_SIZE) -> Page:
+    """One page of the user's own requests followed by the requests they joined.
+
+    Items are ``(joined, RequestPreview)``; cursors are ``(kind, request id)``
+    with kind 0 for own requests and 1 for joined ones. Joined_Users rowids
+    are not used: the table has no INTEGER PRIMARY KEY, so a rebuild or
+    VACUUM may renumber them under cursors already sent to chats.
+    """
+    forward = before is None
+    cursor = after if forward else before
+    params = {"user": user_id, "limit": limit + 1}
+    keyset = ""
+    if cursor is not None:
+        keyset = f"WHERE (kind, position) {'>' if forward else '<'} (:kind, :position)"
+        params.update(kind=cursor[0], position=cursor[1])
+    direction = "" if forward else "DESC"
+    with connections.reader() as conn:
+        rows = _tuple_cursor(conn).execute(f"""
+            SELECT * FROM (
+                SELECT 0 AS kind, r.id AS position, {_PREVIEW_COLUMNS}
+                FROM Prayer_Requests r
+                WHERE r.user_id = :user
+                UNION ALL
+                SELECT 1 AS kind, j.request_id AS position, {_PREVIEW_COLUMNS}
+                FROM Joined_Users j
+                JOIN Prayer_Requests r ON r.id = j.request_id
+                WHERE j.user_id = :user
+            )
+            {keyset}
+            ORDER BY kind {direction}, position {direction}
+            LIMIT :limit
+        """, params).fetchall()
+    page = _page(rows, limit, lambda row: (row[0], row[1]), forward, cursor is not None)
+    page.items = [(bool(row[0]), _preview(row[2:])) for row in page.items]
+    return page
 
 
 # Group_Membership functions
 def save_user_group_membership(user_id: int, group_id: int):
-    with get_connection() as conn:
-        conn.execute(
+    with connections.writer() as conn:
+        cursor = conn.execute(
             'INSERT OR IGNORE INTO Group_Membership (user_id, group_id) VALUES (?, ?)',
             (user_id, group_id)
         )
+        added = cursor.rowcount > 0
+        if added:
+            _touch_group_digests(conn, group_id)
+    if added:
+        _bump_data_version()
 
 def get_user_groups(user_id: int) -> set[int]:
-    with get_connection() as conn:
+    with connections.reader() as conn:
         cursor = conn.execute(
             'SELECT group_id FROM Group_Membership WHERE user_id = ?', (user_id,)
         )
         return {row[0] for row in cursor.fetchall()}
 
+def get_shared_group_memberships(user_ids: list[int]) -> list[tuple[int, int]]:
+    """Every (user_id, group_id) membership of the groups ``user_ids`` belong to."""
+    with connections.reader() as conn:
+        rows = _tuple_cursor(conn).execute("""
+            SELECT user_id, group_id FROM Group_Membership
+            WHERE group_id IN (
+                SELECT group_id FROM Group_Membership
+                WHERE user_id IN (SELECT value FROM json_each(?))
+            )
+        """, (json.dumps(user_ids),))
+        return rows.fetchall()
+
 def get_group_users(group_id: int) -> set[int]:
-    with get_connection() as conn:
+    with connections.reader() as conn:
         cursor = conn.execute(
             'SELECT user_id FROM Group_Membership WHERE group_id = ?', (group_id,)
         )
@@ -191,47 +788,362 @@ def get_group_users(group_id: int) -> set[int]:
 
 # Group_Metadata functions
 def save_group_title(group_id: int, title: str):
-    with get_connection() as conn:
-        conn.execute('''
+    with connections.writer() as conn:
+        cursor = conn.execute('''
             INSERT INTO Group_Metadata (group_id, group_title)
             VALUES (?, ?)
             ON CONFLICT(group_id) DO UPDATE SET group_title=excluded.group_title
+            WHERE group_title IS NOT excluded.group_title
         ''', (group_id, title))
+        changed = cursor.rowcount > 0
+    if changed:
+        _bump_data_version()
+
+def save_group_activity(memberships: list[tuple[int, int]], titles: list[tuple[int, str]]):
+    """Store buffered (user_id, group_id) pairs and (group_id, title) pairs in one transaction.
+
+    Only memberships that are actually new touch digests and bump the data
+    version, as with save_user_group_membership.
+    """
+    changed = False
+    with connections.writer() as conn:
+        if memberships:
+            rows = conn.execute("""
+                SELECT m.user_id, m.group_id
+                FROM json_each(?) pair
+                JOIN Group_Membership m
+                  ON m.user_id = json_extract(pair.value, '$[0]')
+                 AND m.group_id = json_extract(pair.value, '$[1]')
+            """, (json.dumps(memberships),)).fetchall()
+            existing = {(row[0], row[1]) for row in rows}
+            added = [pair for pair in memberships if tuple(pair) not in existing]
+            if added:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO Group_Membership (user_id, group_id) VALUES (?, ?)', added
+                )
+                conn.execute("""
+                    INSERT INTO Daily_Digest (user_id)
+                    SELECT user_id FROM Group_Membership
+                    WHERE group_id IN (SELECT value FROM json_each(?))
+                    ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+                """, (json.dumps(sorted({group_id for _, group_id in added})),))
+                changed = True
+        if titles:
+            cursor = conn.executemany('''
+                INSERT INTO Group_Metadata (group_id, group_title)
+                VALUES (?, ?)
+                ON CONFLICT(group_id) DO UPDATE SET group_title=excluded.group_title
+                WHERE group_title IS NOT excluded.group_title
+            ''', titles)
+            changed = changed or cursor.rowcount > 0
+    if changed:
+        _bump_data_version()
 
 def get_group_title(group_id: int) -> str:
-    with get_connection() as conn:
+    with connections.reader() as conn:
         cursor = conn.execute('SELECT group_title FROM Group_Metadata WHERE group_id = ?', (group_id,))
         row = cursor.fetchone()
         return row[0] if row else f"Group {group_id}"
 
 
 # Prayed_Users functions
-def mark_prayed(user_id: int, req_id: str):
-    with get_connection() as conn:
+def mark_prayed(user_id: int, req_id: int):
+    with connections.writer() as conn:
         conn.execute("INSERT OR IGNORE INTO Prayed_Users (user_id, request_id) VALUES (?, ?)", (user_id, req_id))
-        conn.commit()
+    _bump_user_version(user_id)
 
-def get_all_prayed_users() -> dict[int, set[int]]:
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT request_id, user_id FROM Prayed_Users")
-        prayed_map = defaultdict(set)
-        for req_id, user_id in cursor.fetchall():
-            prayed_map[req_id].add(user_id)
-        return prayed_map
+def get_prayed_request_ids(user_id: int, request_ids) -> set[int]:
+    """The subset of ``request_ids`` that ``user_id`` has prayed for.
+
+    The ids drive the join (CROSS JOIN fixes the order), so the cost follows
+    the number of candidates rather than the user's prayer history.
+    """
+    request_ids = list(request_ids)
+    if not request_ids:
+        return set()
+    with connections.reader() as conn:
+        rows = conn.execute("""
+            SELECT p.request_id FROM json_each(?) ids
+            CROSS JOIN Prayed_Users p ON p.user_id = ? AND p.request_id = ids.value
+        """, (json.dumps(request_ids), user_id)).fetchall()
+    return {row[0] for row in rows}
 
 # Joined_Users functions
-def mark_joined(user_id: int, req_id: str):
-    with get_connection() as conn:
+def mark_joined(user_id: int, req_id: int):
+    with connections.writer() as conn:
         conn.execute("INSERT OR IGNORE INTO Joined_Users (user_id, request_id) VALUES (?, ?)", (user_id, req_id))
-        conn.commit()
+    _bump_user_version(user_id)
 
-def unmark_joined(user_id: int, req_id: str):
-    with get_connection() as conn:
+def unmark_joined(user_id: int, req_id: int):
+    with connections.writer() as conn:
         conn.execute("DELETE FROM Joined_Users WHERE user_id = ? AND request_id = ?", (user_id, req_id))
-        conn.commit()
+    _bump_user_version(user_id)
 
-def get_joined_users(req_id: str) -> set[int]:
-    with get_connection() as conn:
+def get_joined_users(req_id: int) -> set[int]:
+    with connections.reader() as conn:
         rows = conn.execute("SELECT user_id FROM Joined_Users WHERE request_id = ?", (req_id,)).fetchall()
-        return {row[0] for row in rows}
\ No newline at end of file
+        return {row[0] for row in rows}
+
+
+# Processed_Updates functions
+def record_update_id(update_id: int, ttl: float) -> bool:
+    """Record a Telegram update id; False if it was already seen within ``ttl`` seconds."""
+    now = time.time()
+    with connections.writer() as conn:
+        cursor = conn.execute("""
+            INSERT INTO Processed_Updates (update_id, seen_at) VALUES (?, ?)
+            ON CONFLICT(update_id) DO UPDATE SET seen_at = excluded.seen_at
+            WHERE Processed_Updates.seen_at < ?
+        """, (update_id, now, now - ttl))
+        return cursor.rowcount == 1
+
+def forget_update_id(update_id: int):
+    with connections.writer() as conn:
+        conn.execute("DELETE FROM Processed_Updates WHERE update_id = ?", (update_id,))
+
+def prune_processed_updates(ttl: float):
+    with connections.writer() as conn:
+        conn.execute("DELETE FROM Processed_Updates WHERE seen_at < ?", (time.time() - ttl,))
+
+
+# Reminder_Runs functions
+def get_reminder_checkpoint(run_key: str, shard: int, shard_count: int) -> dict | None:
+    """Fetch the progress of one shard of a reminder run, if it has started."""
+    with connections.reader() as conn:
+        row = conn.execute("""
+            SELECT last_user_id, sent, failed, completed
+            FROM Reminder_Runs
+            WHERE run_key = ? AND shard = ? AND shard_count = ?
+        """, (run_key, shard, shard_count)).fetchone()
+        if row is None:
+            return None
+        return {
+            "last_user_id": row['last_user_id'],
+            "sent": row['sent'],
+            "failed": row['failed'],
+            "completed": bool(row['completed']),
+        }
+
+def save_reminder_checkpoint(run_key: str, shard: int, shard_count: int, last_user_id: int | None,
+                             sent: int, failed: int, completed: bool,
+                             retry: Iterable[int] = (), resolved: Iterable[int] = ()):
+    """Advance a shard's checkpoint, adding ``sent``/``failed`` to its totals.
+
+    ``retry`` user ids are kept for the next invocation to send to again and
+    ``resolved`` ones are dropped from that list. A shard is only completed
+    once no retries are left.
+    """
+    key = (run_key, shard, shard_count)
+    with connections.writer() as conn:
+        conn.executemany(
+            "DELETE FROM Reminder_Retries WHERE run_key = ? AND shard = ? AND shard_count = ? AND user_id = ?",
+            ((*key, uid) for uid in resolved),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO Reminder_Retries (run_key, shard, shard_count, user_id) VALUES (?, ?, ?, ?)",
+            ((*key, uid) for uid in retry),
+        )
+        conn.execute("""
+            INSERT INTO Reminder_Runs (run_key, shard, shard_count, last_user_id, sent, failed, completed, updated_at)
+            VALUES (:run_key, :shard, :shard_count, :last_user_id, :sent, :failed, :completed AND NOT EXISTS (
+                SELECT 1 FROM Reminder_Retries
+                WHERE run_key = :run_key AND shard = :shard AND shard_count = :shard_count
+            ), :updated_at)
+            ON CONFLICT(run_key, shard, shard_count) DO UPDATE SET
+                last_user_id = COALESCE(excluded.last_user_id, Reminder_Runs.last_user_id),
+                sent = Reminder_Runs.sent + excluded.sent,
+                failed = Reminder_Runs.failed + excluded.failed,
+                completed = excluded.completed,
+                updated_at = excluded.updated_at
+        """, {
+            "run_key": run_key, "shard": shard, "shard_count": shard_count, "last_user_id": last_user_id,
+            "sent": sent, "failed": failed, "completed": int(completed), "updated_at": time.time(),
+        })
+
+def get_reminder_retries(run_key: str, shard: int, shard_count: int) -> list[int]:
+    """Recipients of a shard's run still waiting for a retry, in user id order."""
+    with connections.reader() as conn:
+        return [row[0] for row in conn.execute("""
+            SELECT user_id FROM Reminder_Retries
+            WHERE run_key = ? AND shard = ? AND shard_count = ?
+            ORDER BY user_id
+        """, (run_key, shard, shard_count))]
+
+
+# Votd_Cache functions
+def get_cached_votd(day: str) -> str | None:
+    with connections.reader() as conn:
+        row = conn.execute("SELECT verse FROM Votd_Cache WHERE day = ?", (day,)).fetchone()
+        return row[0] if row else None
+
+def get_latest_votd() -> str | None:
+    """The most recently cached verse, used when today's fetch fails."""
+    with connections.reader() as conn:
+        row = conn.execute("SELECT verse FROM Votd_Cache ORDER BY day DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+def save_cached_votd(day: str, verse: str):
+    with connections.writer() as conn:
+        conn.execute("""
+            INSERT INTO Votd_Cache (day, verse, fetched_at) VALUES (?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET verse = excluded.verse, fetched_at = excluded.fetched_at
+        """, (day, verse, time.time()))
+
+
+# Daily_Digest functions
+def _touch_group_peer_digests(conn: sqlite3.Connection, user_id: int):
+    """Mark stale the digests of everyone sharing a group with ``user_id``."""
+    conn.execute("""
+        INSERT INTO Daily_Digest (user_id)
+        SELECT DISTINCT peer.user_id
+        FROM Group_Membership own
+        JOIN Group_Membership peer ON peer.group_id = own.group_id
+        WHERE own.user_id = ?
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+    """, (user_id,))
+
+def _touch_group_digests(conn: sqlite3.Connection, group_id: int):
+    """Mark stale the digests of every member of ``group_id``."""
+    conn.execute("""
+        INSERT INTO Daily_Digest (user_id)
+        SELECT user_id FROM Group_Membership WHERE group_id = ?
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+    """, (group_id,))
+
+def mark_daily_digests_stale(user_ids: list[int]):
+    with connections.writer() as conn:
+        conn.execute("""
+            INSERT INTO Daily_Digest (user_id)
+            SELECT value FROM json_each(?) WHERE true
+            ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+        """, (json.dumps(user_ids),))
+
+def get_stale_daily_digests(user_ids: list[int] | None = None, after: int | None = None,
+                            limit: int = -1) -> list[tuple[int, int]]:
+    """(user_id, version) of stale digests among ``user_ids``, or among all reminder recipients.
+
+    Rows come in user id order; ``after`` and ``limit`` page through them.
+    """
+    params = {"after": after, "limit": limit, "user_ids": json.dumps(user_ids)}
+    if user_ids is not None:
+        recipients = "d.user_id IN (SELECT value FROM json_each(:user_ids))"
+    else:
+        # Probed per digest through the user_id indexes, so a page does not
+        # build a temporary index over every request.
+        recipients = """(EXISTS (SELECT 1 FROM Prayer_Requests r WHERE r.user_id = d.user_id)
+                       OR EXISTS (SELECT 1 FROM Joined_Users j WHERE j.user_id = d.user_id))"""
+    with connections.reader() as conn:
+        rows = _tuple_cursor(conn).execute(f"""
+            SELECT d.user_id, d.version FROM Daily_Digest d
+            WHERE d.version != d.rendered_version
+              AND d.user_id > COALESCE(:after, -9223372036854775808)
+              AND {recipients}
+            ORDER BY d.user_id
+            LIMIT :limit
+        """, params)
+        return rows.fetchall()
+
+def save_daily_digests(digests: list[tuple[int, int, int, list[str]]]):
+    """Store rendered digests as (user_id, version, request_count, lines).
+
+    A digest touched again since ``version`` was read stays stale.
+    """
+    now = time.time()
+    with connections.writer() as conn:
+        conn.executemany("""
+            UPDATE Daily_Digest
+            SET request_count = ?, body = ?, rendered_version = ?, updated_at = ?
+            WHERE user_id = ?
+        """, [
+            (request_count, json.dumps(lines), version, now, user_id)
+            for user_id, version, request_count, lines in digests
+        ])
+
+def get_daily_digests(user_ids: list[int]) -> dict[int, tuple[int, str]]:
+    """Fresh digests for ``user_ids`` as user_id -> (request_count, body JSON)."""
+    with connections.reader() as conn:
+        rows = conn.execute("""
+            SELECT user_id, request_count, body FROM Daily_Digest
+            WHERE user_id IN (SELECT value FROM json_each(?))
+              AND version = rendered_version
+        """, (json.dumps(user_ids),)).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+
+# Reminder_Preferences functions
+def save_reminder_preference(user_id: int, local_hour: int, utc_offset: int):
+    """Store a user's preferred local reminder hour and their UTC offset in hours."""
+    with connections.writer() as conn:
+        conn.execute("""
+            INSERT INTO Reminder_Preferences (user_id, local_hour, utc_offset, utc_hour)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                local_hour = excluded.local_hour,
+                utc_offset = excluded.utc_offset,
+                utc_hour = excluded.utc_hour
+        """, (user_id, local_hour, utc_offset, (local_hour - utc_offset) % 24))
+
+def get_reminder_preference(user_id: int) -> tuple[int, int]:
+    """(local_hour, utc_offset) for ``user_id``, or the defaults if unset."""
+    with connections.reader() as conn:
+        row = conn.execute(
+            "SELECT local_hour, utc_offset FROM Reminder_Preferences WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return DEFAULT_REMINDER_HOUR, DEFAULT_REMINDER_OFFSET
+        return row[0], row[1]
+
+
+# Delivery_Status functions
+def record_delivery_outcomes(delivered: list[int], failures: list[tuple[int, bool, str]]):
+    """Record one broadcast chunk: delivered user ids and (user_id, permanent, error).
+
+    A permanent failure marks the user dead; a transient one increments
+    their failure count. Delivering successfully clears the count.
+    """
+    now = time.time()
+    with connections.writer() as conn:
+        if delivered:
+            conn.execute("""
+                UPDATE Delivery_Status SET transient_failures = 0, updated_at = ?
+                WHERE user_id IN (SELECT value FROM json_each(?)) AND transient_failures != 0
+            """, (now, json.dumps(delivered)))
+        conn.executemany("""
+            INSERT INTO Delivery_Status (user_id, dead, transient_failures, last_error, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                dead = MAX(dead, excluded.dead),
+                transient_failures = transient_failures + excluded.transient_failures,
+                last_error = excluded.last_error,
+                updated_at = excluded.updated_at
+        """, [
+            (user_id, int(permanent), int(not permanent), error, now)
+            for user_id, permanent, error in failures
+        ])
+
+def get_delivery_status(user_id: int) -> dict | None:
+    with connections.reader() as conn:
+        row = conn.execute("""
+            SELECT dead, transient_failures, last_error FROM Delivery_Status WHERE user_id = ?
+        """, (user_id,)).fetchone()
+        if row is None:
+            return None
+        return {"dead": bool(row[0]), "transient_failures": row[1], "last_error": row[2]}
+
+def revive_recipient(user_id: int) -> bool:
+    """Clear the dead mark after the user interacts again; True if it was set.
+
+    Checks with a read first so live users never take the write lock.
+    """
+    with connections.reader() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM Delivery_Status WHERE user_id = ? AND dead = 1", (user_id,)
+        ).fetchone()
+    if row is None:
+        return False
+    with connections.writer() as conn:
+        cursor = conn.execute("""
+            UPDATE Delivery_Status SET dead = 0, transient_failures = 0, updated_at = ?
+            WHERE user_id = ? AND dead = 1
+        """, (time.time(), user_id))
+        return cursor.rowcount == 1
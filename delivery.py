@@ -0,0 +1,254 @@
+# delivery.py
+import asyncio
+import math
+import time
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+# Telegram allows roughly 30 messages per second overall and about one per
+# second to the same chat (short bursts are tolerated).
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+PER_CHAT_BURST = 3
+MAX_CONCURRENT_SENDS = 10
+MAX_RETRIES = 3
+# Transient network failures back off exponentially from this many seconds.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self._tokens >= self.capacity
+
+    async def acquire(self):
+        while True:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LatencyHistogram:
+    """Log-scale histogram of durations in seconds, with a fixed number of buckets.
+
+    Bucket bounds grow by ``growth`` from ``smallest`` to ``largest``, so a
+    percentile is at most that factor above the true value and memory does
+    not grow with the number of durations recorded. The maximum is exact.
+    """
+
+    def __init__(self, smallest: float = 0.001, largest: float = 600.0, growth: float = 1.05):
+        self._smallest = smallest
+        self._log_growth = math.log(growth)
+        self._counts = [0] * (self._bucket(largest) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self._smallest:
+            return 0
+        return math.ceil(math.log(seconds / self._smallest) / self._log_growth)
+
+    def record(self, seconds: float):
+        self._counts[min(self._bucket(seconds), len(self._counts) - 1)] += 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the ``fraction`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self._counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return min(self._smallest * math.exp(index * self._log_growth), self.max)
+        # The last bucket also holds everything above ``largest``.
+        return self.max
+
+
+def is_transient_error(exc: Exception) -> bool:
+    """Network hiccups and timeouts are worth retrying; BadRequest never is."""
+    return isinstance(exc, NetworkError) and not isinstance(exc, BadRequest)
+
+
+# BadRequest messages that mean the chat can never be delivered to.
+PERMANENT_BAD_REQUESTS = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+def is_permanent_error(exc: Exception) -> bool:
+    """Blocked, kicked or deactivated users, and chats that no longer exist."""
+    if isinstance(exc, Forbidden):
+        return True
+    if isinstance(exc, BadRequest):
+        message = str(exc).lower()
+        return any(reason in message for reason in PERMANENT_BAD_REQUESTS)
+    return False
+
+
+def _retry_after_seconds(exc: RetryAfter) -> float:
+    # PTB 22 warns that retry_after will become a timedelta; accept either.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        value = exc.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+# Deliveries submitted while handling the current update (see OutboundSender.collect).
+_collected: ContextVar[Optional[list]] = ContextVar("outbound_collected", default=None)
+
+
+class OutboundSender:
+    """Shared, rate-limited delivery of outbound Telegram calls.
+
+    ``send`` awaits one call within the global and per-chat limits, backing off
+    on ``RetryAfter`` and on transient network errors. ``submit`` schedules the same in the background so
+    handlers can reply to the user without waiting for notification fan-out.
+    ``collect`` gathers the deliveries one update submits, so a serverless
+    webhook can ``wait`` for them before it returns and the instance is frozen.
+    """
+
+    # Idle per-chat buckets are discarded beyond this many chats.
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(
+        self,
+        rate: float = GLOBAL_RATE,
+        per_chat_rate: float = PER_CHAT_RATE,
+        per_chat_burst: float = PER_CHAT_BURST,
+        max_concurrency: int = MAX_CONCURRENT_SENDS,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+    ):
+        self._global_bucket = TokenBucket(rate, rate)
+        self._per_chat_rate = per_chat_rate
+        self._per_chat_burst = per_chat_burst
+        self._chat_buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._paused_until = 0.0
+        self._pending: set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self._per_chat_rate, self._per_chat_burst)
+            if len(self._chat_buckets) > self.MAX_CHAT_BUCKETS:
+                oldest_id, oldest = next(iter(self._chat_buckets.items()))
+                if oldest.idle:
+                    del self._chat_buckets[oldest_id]
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _wait_for_flood_pause(self):
+        delay = self._paused_until - time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._paused_until - time.monotonic()
+
+    async def send(self, method: Callable[..., Awaitable[Any]], chat_id: int, **kwargs) -> Any:
+        """Call ``method(chat_id=chat_id, **kwargs)`` within the rate limits."""
+        attempt = 0
+        while True:
+            backoff = 0.0
+            async with self._slots:
+                await self._wait_for_flood_pause()
+                await self._chat_bucket(chat_id).acquire()
+                await self._global_bucket.acquire()
+                try:
+                    result = await method(chat_id=chat_id, **kwargs)
+                except RetryAfter as exc:
+                    if attempt >= self.max_retries:
+                        self.failed += 1
+                        raise
+                    # Flood control applies to the whole bot, so pause every send.
+                    delay = _retry_after_seconds(exc)
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                except Exception as exc:
+                    if attempt >= self.max_retries or not is_transient_error(exc):
+                        self.failed += 1
+                        raise
+                    backoff = min(BACKOFF_MAX, self.backoff_base * 2 ** attempt)
+                else:
+                    self.sent += 1
+                    return result
+            attempt += 1
+            self.retried += 1
+            if backoff:
+                await asyncio.sleep(backoff)
+
+    def submit(self, method: Callable[..., Awaitable[Any]], chat_id: int, **kwargs) -> asyncio.Task:
+        """Deliver in the background; failures are logged rather than raised."""
+        task = asyncio.create_task(self._send_logged(method, chat_id, **kwargs))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        collected = _collected.get()
+        if collected is not None:
+            collected.append(task)
+        return task
+
+    @contextmanager
+    def collect(self) -> Iterator[list]:
+        """Gather the tasks ``submit`` starts within this block, in this context."""
+        tasks = []
+        token = _collected.set(tasks)
+        try:
+            yield tasks
+        finally:
+            _collected.reset(token)
+
+    async def _send_logged(self, method, chat_id: int, **kwargs):
+        try:
+            await self.send(method, chat_id, **kwargs)
+        except Exception as exc:
+            print(f"Failed to deliver to {chat_id}: {exc}")
+
+    async def wait(self, tasks, timeout: float = 10.0) -> bool:
+        """Wait for ``tasks`` from ``submit``; False if some were still pending."""
+        if not tasks:
+            return True
+        _, pending = await asyncio.wait(set(tasks), timeout=timeout)
+        return not pending
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Wait for all background deliveries; False if some were still pending."""
+        return await self.wait(self._pending, timeout)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+outbound = OutboundSender()
@@ -0,0 +1,146 @@
+# digest.py
+import html
+import json
+
+from collections import OrderedDict
+
+from database import (
+    get_prayer_requests_by_users,
+    get_shared_group_memberships,
+    get_stale_daily_digests,
+    save_daily_digests,
+)
+from visibility import VisibilityIndex, iter_bits
+
+# Telegram rejects messages longer than this many characters.
+MESSAGE_LIMIT = 4096
+# Stale digests rendered per pass of refresh_daily_digests.
+DIGEST_BATCH = 200
+# Distinct digests whose rendered messages a reminder run keeps.
+RENDER_CACHE_SIZE = 1024
+
+
+def truncate_html(line: str, limit: int) -> str:
+    """Shorten escaped text to ``limit`` chars without cutting an entity in half."""
+    if len(line) <= limit:
+        return line
+    cut = line[:limit - 1]
+    amp = cut.rfind("&")
+    if amp > cut.rfind(";"):
+        cut = cut[:amp]
+    return cut + "…"
+
+
+def pack_messages(parts: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Join lines into as few messages as possible, each at most ``limit`` chars."""
+    messages = []
+    current = ""
+    for part in parts:
+        part = truncate_html(part, limit)
+        if current and len(current) + 1 + len(part) > limit:
+            messages.append(current)
+            current = part
+        else:
+            current = f"{current}\n{part}" if current else part
+    if current:
+        messages.append(current)
+    return messages
+
+
+class DigestBuilder:
+    """Build the request lines of each user's digest.
+
+    Users with the same visible request set (same bitset) share one list of
+    lines, and each request is escaped once.
+    """
+
+    def __init__(self, visibility: VisibilityIndex):
+        self._visibility = visibility
+        self._lines: dict[int, str] = {}
+        self._digests: dict[int, list[str]] = {}
+
+    @property
+    def distinct_digests(self) -> int:
+        return len(self._digests)
+
+    def _line(self, position: int) -> str:
+        line = self._lines.get(position)
+        if line is None:
+            req = self._visibility.requests[position]
+            line = self._lines[position] = f"• {html.escape(req.text)}"
+        return line
+
+    def lines_for(self, user_id: int) -> list[str]:
+        bits = self._visibility.visible_bits(user_id)
+        lines = self._digests.get(bits)
+        if lines is None:
+            lines = self._digests[bits] = [self._line(position) for position in iter_bits(bits)]
+        return lines
+
+
+def _refresh_batch(stale: list[tuple[int, int]]) -> int:
+    # Only the groups of these users and the requests of their members
+    # decide what they see, so the rest of the tables stays on disk.
+    user_ids = [user_id for user_id, _ in stale]
+    memberships = get_shared_group_memberships(user_ids)
+    members = list({user_id for user_id, _ in memberships})
+    builder = DigestBuilder(VisibilityIndex(get_prayer_requests_by_users(members), memberships))
+    rendered = []
+    for user_id, version in stale:
+        lines = builder.lines_for(user_id)
+        rendered.append((user_id, version, len(lines), lines))
+    save_daily_digests(rendered)
+    return len(rendered)
+
+
+def refresh_daily_digests(user_ids: list[int] | None = None, batch: int = DIGEST_BATCH) -> int:
+    """Re-render stale Daily_Digest rows; returns how many were rendered.
+
+    Write helpers in database.py mark digests stale when requests or group
+    memberships change, so only affected users are rendered here. Without
+    ``user_ids`` every stale reminder recipient is refreshed. Users are
+    rendered ``batch`` at a time in user id order.
+    """
+    refreshed = 0
+    after = None
+    while True:
+        stale = get_stale_daily_digests(user_ids, after=after, limit=batch)
+        if not stale:
+            return refreshed
+        refreshed += _refresh_batch(stale)
+        after = stale[-1][0]
+
+
+class DigestRenderer:
+    """Turn stored digests into reminder messages, once per distinct digest.
+
+    The most recently used ``cache_size`` digests are kept, so a run over
+    many distinct digests holds a bounded number of rendered messages.
+    """
+
+    def __init__(self, verse_of_the_day: str, cache_size: int = RENDER_CACHE_SIZE):
+        self._header = f"<b>-- Daily Prayer Reminder --</b>\n\n{verse_of_the_day}\n"
+        self.cache_size = cache_size
+        self._messages: OrderedDict[str, list[str]] = OrderedDict()
+        self.distinct_digests = 0
+
+    def render(self, request_count: int, body: str) -> list[str]:
+        messages = self._messages.get(body)
+        if messages is not None:
+            self._messages.move_to_end(body)
+            return messages
+        messages = self._messages[body] = self._render(request_count, json.loads(body))
+        self.distinct_digests += 1
+        if len(self._messages) > self.cache_size:
+            self._messages.popitem(last=False)
+        return messages
+
+    def _render(self, request_count: int, lines: list[str]) -> list[str]:
+        if not request_count:
+            return [f"{self._header}\nThere are no prayer requests from others today."]
+        return pack_messages([
+            self._header,
+            f"📋 <b>Prayer Requests ({request_count}):</b>",
+            *lines,
+            "\nUse /request_list to view and interact with these requests.",
+        ])
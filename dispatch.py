@@ -0,0 +1,299 @@
+# dispatch.py
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+from telegram import Update
+
+from async_database import run
+
+T = TypeVar("T")
+
+
+def update_shard_key(update: Update) -> Optional[Hashable]:
+    """Key that must be processed in order: the chat, or the user without one."""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return ("user", update.effective_user.id)
+    return None
+
+
+class UpdateDispatcher:
+    """Process updates concurrently across chats while keeping per-chat order.
+
+    Updates sharing a shard key run one at a time in arrival order, so
+    ConversationHandler flows see their messages in sequence. At most
+    ``max_in_flight`` updates run at once across all keys.
+    """
+
+    def __init__(self, max_in_flight: int = 8):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._shard_locks: dict[Hashable, asyncio.Lock] = {}
+        self._shard_refs: dict[Hashable, int] = {}
+        self.waiting = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, key: Optional[Hashable], func: Callable[[], Awaitable[T]]) -> T:
+        enqueued_at = time.monotonic()
+        self.waiting += 1
+        started = False
+        lock = self._acquire_shard(key)
+        try:
+            async with lock:
+                async with self._slots:
+                    started = True
+                    self._record_start(time.monotonic() - enqueued_at)
+                    try:
+                        return await func()
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+            self._release_shard(key)
+
+    def _record_start(self, wait: float):
+        self.waiting -= 1
+        self.in_flight += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def _acquire_shard(self, key: Optional[Hashable]) -> asyncio.Lock:
+        if key is None:
+            # Updates without a chat or user have nothing to stay ordered with.
+            return asyncio.Lock()
+        lock = self._shard_locks.get(key)
+        if lock is None:
+            lock = self._shard_locks[key] = asyncio.Lock()
+        self._shard_refs[key] = self._shard_refs.get(key, 0) + 1
+        return lock
+
+    def _release_shard(self, key: Optional[Hashable]):
+        if key is None:
+            return
+        refs = self._shard_refs[key] - 1
+        if refs:
+            self._shard_refs[key] = refs
+        else:
+            del self._shard_refs[key]
+            del self._shard_locks[key]
+
+    def stats(self) -> dict:
+        started = self.processed + self.in_flight
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "active_shards": len(self._shard_locks),
+            "processed": self.processed,
+            "avg_wait_ms": round(self.total_wait / started * 1000, 3) if started else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class QueueFull(Exception):
+    """Raised when the update queue cannot accept more work."""
+
+
+class UpdateQueue:
+    """Bounded queue of updates drained by a fixed pool of background workers.
+
+    Lets the webhook acknowledge Telegram as soon as an update is accepted.
+    Workers hand updates to the dispatcher, so the in-flight cap still
+    applies. A worker that takes an update for a chat another worker is
+    already processing parks it on that chat's backlog and moves on; the
+    busy worker runs the backlog in order. A burst from one chat therefore
+    occupies one worker instead of all of them. ``maxsize`` bounds queued
+    and parked updates together.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Update], Awaitable[object]],
+        dispatcher: UpdateDispatcher,
+        maxsize: int = 100,
+        workers: int = 8,
+    ):
+        self._handler = handler
+        self._dispatcher = dispatcher
+        self.maxsize = maxsize
+        self.worker_count = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._backlogs: dict[Hashable, deque[Update]] = {}
+        self._parked = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._backlogs = {}
+        self._parked = 0
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"update-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+
+    def submit(self, update: Update):
+        if not self.running:
+            self.rejected += 1
+            raise QueueFull("Update queue is not accepting updates")
+        if self._pending() >= self.maxsize:
+            self.rejected += 1
+            raise QueueFull(f"Update queue is full ({self.maxsize} pending)")
+        self._queue.put_nowait(update)
+        self.accepted += 1
+
+    def _pending(self) -> int:
+        return self._queue.qsize() + self._parked
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            key = update_shard_key(update)
+            if key is None:
+                await self._process(key, update)
+                continue
+            backlog = self._backlogs.get(key)
+            if backlog is not None:
+                # Another worker owns this chat and will run it in order.
+                backlog.append(update)
+                self._parked += 1
+                continue
+            backlog = self._backlogs[key] = deque()
+            try:
+                await self._process(key, update)
+                while backlog:
+                    self._parked -= 1
+                    await self._process(key, backlog.popleft())
+            finally:
+                del self._backlogs[key]
+
+    async def _process(self, key: Optional[Hashable], update: Update):
+        try:
+            await self._dispatcher.run(key, lambda: self._handler(update))
+        except Exception as exc:
+            self.failed += 1
+            print(f"Failed to process queued update {update.update_id}: {exc}")
+        finally:
+            self._queue.task_done()
+
+    async def drain(self, timeout: float = 10.0) -> bool:
+        """Wait for queued updates to finish, then stop the workers.
+
+        Returns False if the timeout expired with updates still pending.
+        """
+        if not self.running:
+            return True
+        drained = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            drained = False
+            print(f"Update queue drain timed out with {self._pending()} pending")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        return drained
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self._pending() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "workers": self.worker_count,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+
+class UpdateDeduplicator:
+    """Bounded LRU/TTL record of recently seen Telegram ``update_id`` values.
+
+    Telegram redelivers updates when the webhook is slow or fails, so
+    duplicates are dropped before they reach the handlers. ``store``
+    optionally persists ids (see ``database.record_update_id``) so a warm
+    restart still recognizes them.
+    """
+
+    # Persisted ids older than the TTL are purged after this many new ids.
+    PRUNE_EVERY = 1000
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0, store=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._store = store
+        self._store_writes = 0
+        self._seen: OrderedDict[int, float] = OrderedDict()
+        self.duplicates = 0
+
+    async def check_and_add(self, update_id: int) -> bool:
+        """Record ``update_id`` and return True if it was already seen.
+
+        Store calls run on the database threads, so a busy writer never
+        blocks the event loop.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if update_id in self._seen:
+            self._seen.move_to_end(update_id)
+            self._seen[update_id] = now
+            self.duplicates += 1
+            return True
+        # Remembered before awaiting the store, so a concurrent redelivery
+        # is caught in memory.
+        self._remember(update_id, now)
+        if self._store is None:
+            return False
+        duplicate = not await run(self._store.record_update_id, update_id, self.ttl)
+        self._store_writes += 1
+        if self._store_writes % self.PRUNE_EVERY == 0:
+            await run(self._store.prune_processed_updates, self.ttl)
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+    async def forget(self, update_id: int):
+        """Allow a redelivery of ``update_id``, e.g. after processing failed."""
+        self._seen.pop(update_id, None)
+        if self._store is not None:
+            await run(self._store.forget_update_id, update_id)
+
+    def _remember(self, update_id: int, now: float):
+        self._seen[update_id] = now
+        if len(self._seen) > self.maxsize:
+            self._seen.popitem(last=False)
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        while self._seen:
+            update_id, seen_at = next(iter(self._seen.items()))
+            if seen_at >= cutoff:
+                break
+            del self._seen[update_id]
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._seen),
+            "maxsize": self.maxsize,
+            "duplicates": self.duplicates,
+            "persistent": self._store is not None,
+        }
@@ -0,0 +1,142 @@
+# group_activity.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from async_database import run
+from storage import get_storage
+
+
+class GroupActivityBuffer:
+    """Coalesce the membership and title writes made for every group message.
+
+    Recently seen (user, group) pairs and group titles are kept in bounded
+    LRUs, so repeat sightings cost no SQLite work at all. New facts are held
+    in a write-behind buffer and written in one transaction (see
+    ``Storage.save_group_activity``) once ``flush_size`` are pending or the
+    oldest has waited ``flush_interval`` seconds, and on shutdown. Flushes
+    run on the database threads, so the event loop never waits on the writer.
+    Without an explicit ``store`` each flush goes to ``get_storage()``, the
+    backend the handlers read from. Handlers that read memberships call
+    ``flush`` first, so a sighting is visible to the very next command.
+    """
+
+    def __init__(self, store=None, seen_size: int = 10000, flush_size: int = 50,
+                 flush_interval: float = 2.0):
+        self._store = store
+        self.seen_size = seen_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._seen_members: OrderedDict[tuple[int, int], None] = OrderedDict()
+        self._seen_titles: OrderedDict[int, str] = OrderedDict()
+        self._pending_members: dict[tuple[int, int], None] = {}
+        self._pending_titles: dict[int, str] = {}
+        self._oldest_pending: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.skipped = 0
+        self.flushes = 0
+        self.written = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending_members) + len(self._pending_titles)
+
+    async def record(self, group_id: int, title: str, *user_ids: int):
+        """Note that ``user_ids`` are in ``group_id`` and that it is called ``title``."""
+        for user_id in user_ids:
+            key = (user_id, group_id)
+            if key in self._seen_members:
+                self._seen_members.move_to_end(key)
+                self.skipped += 1
+                continue
+            self._remember(self._seen_members, key, None)
+            self._pending_members[key] = None
+
+        if self._seen_titles.get(group_id) == title:
+            self._seen_titles.move_to_end(group_id)
+            self.skipped += 1
+        else:
+            self._remember(self._seen_titles, group_id, title)
+            self._pending_titles[group_id] = title
+
+        if self.pending:
+            now = time.monotonic()
+            if self._oldest_pending is None:
+                self._oldest_pending = now
+            if self.pending >= self.flush_size or now - self._oldest_pending >= self.flush_interval:
+                await self.flush()
+
+    def _remember(self, lru: OrderedDict, key, value):
+        lru[key] = value
+        lru.move_to_end(key)
+        if len(lru) > self.seen_size:
+            lru.popitem(last=False)
+
+    async def flush(self) -> int:
+        """Write everything pending in one transaction; returns how many facts.
+
+        Also waits for a flush already in progress, so once it returns every
+        fact recorded before the call is in storage.
+        """
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        if not self.pending:
+            return 0
+        members = list(self._pending_members)
+        titles = list(self._pending_titles.items())
+        self._pending_members = {}
+        self._pending_titles = {}
+        self._oldest_pending = None
+        try:
+            store = self._store if self._store is not None else get_storage()
+            await run(store.save_group_activity, members, titles)
+        except Exception as exc:
+            # Forget the facts so the next sighting records them again.
+            print(f"Failed to save group activity: {exc}")
+            for key in members:
+                self._seen_members.pop(key, None)
+            for group_id, _ in titles:
+                self._seen_titles.pop(group_id, None)
+            return 0
+        self.flushes += 1
+        self.written += len(members) + len(titles)
+        return len(members) + len(titles)
+
+    def start(self):
+        """Flush on a timer too, so quiet groups don't leave facts pending."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "seen_members": len(self._seen_members),
+            "seen_titles": len(self._seen_titles),
+            "pending": self.pending,
+            "skipped": self.skipped,
+            "flushes": self.flushes,
+            "written": self.written,
+        }
+
+
+# Shared by the group message handler and the handlers that read
+# memberships; api/index.py applies the GROUP_* settings.
+group_activity = GroupActivityBuffer()
@@ -2,121 +2,202 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
+from delivery import outbound
 from state import (
     PRAY_TEXT,
     PRAY_AUDIO,
+    PAGE_SIZE,
+    PrayerRequest,
+    encode_request_id,
 )
-from database import (
-    get_request_by_rid,
-    get_all_prayer_requests,
-    get_user_groups,
-    get_group_title,
+from visibility import VisibilityCache
+from group_activity import group_activity
+# The helpers below are blocking and run on the database threads via run().
+from storage import get_storage
+from async_database import (
+    run,
     mark_prayed,
-    get_all_prayed_users,
     mark_joined,
     unmark_joined,
     get_joined_users,
 )
 
 
+# Per-viewer rendered pages survive between taps until the data they were
+# built from changes.
+VISIBILITY_CACHE_SIZE = 1024
+# Rendered pages kept per viewer before their cached pages are reset.
+MAX_CACHED_PAGES = 32
+visibility_cache = VisibilityCache(maxsize=VISIBILITY_CACHE_SIZE)
+
+
+class _ViewerListing:
+    """Pages of one viewer's request list rendered so far, keyed by callback data."""
+
+    def __init__(self):
+        self.pages: dict[str, tuple[str, InlineKeyboardMarkup]] = {}
+        self.first_page: str | None = None
+
+
+def _viewer_listing(user_id: int) -> _ViewerListing:
+    # Read the version before the data so a concurrent write can't be cached
+    # under the newer version.
+    version = get_storage().get_visibility_version(user_id)
+    listing = visibility_cache.get(user_id, version)
+    if listing is None:
+        listing = _ViewerListing()
+        visibility_cache.put(user_id, version, listing)
+    return listing
+
+
+def _page_callback(group_id: int, direction: str, cursor: int = 0) -> str:
+    # direction: "s"tart or "e"nd of the group, "a"fter or "b"efore a cursor.
+    return f"plist_{group_id}_{direction}_{cursor}"
+
+
+def _build_page(user_id: int, page_key: str) -> tuple[str, InlineKeyboardMarkup] | None:
+    """Render the request list page named by ``page_key``; None if it is empty."""
+    _, group_id, direction, cursor = page_key.split("_")
+    group_id, cursor = int(group_id), int(cursor)
+    store = get_storage()
+    if direction == "a":
+        page = store.get_visible_request_page(user_id, group_id, after=cursor, limit=PAGE_SIZE)
+    elif direction in ("b", "e"):
+        page = store.get_visible_request_page(user_id, group_id, before=cursor, limit=PAGE_SIZE)
+    else:
+        page = store.get_visible_request_page(user_id, group_id, limit=PAGE_SIZE)
+    if not page.items:
+        return None
+
+    keyboard_buttons = []
+    for visible in page.items:
+        r = visible.request
+        display_name = "Anonymous" if r.is_anonymous else r.username
+        prayed_mark = " ✔️" if visible.prayed else ""
+        keyboard_buttons.append([InlineKeyboardButton(f"{display_name}: {r.preview}{prayed_mark}", callback_data=f'public_view_{encode_request_id(r.id)}')])
+
+    # Previous/next pages continue into the neighbouring groups.
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton("◀️ Prev", callback_data=_page_callback(group_id, "b", page.start)))
+    else:
+        prev_group = store.get_adjacent_visible_group(user_id, group_id, forward=False)
+        if prev_group is not None:
+            nav.append(InlineKeyboardButton("◀️ Prev", callback_data=_page_callback(prev_group, "e")))
+    if page.has_next:
+        nav.append(InlineKeyboardButton("Next ▶️", callback_data=_page_callback(group_id, "a", page.end)))
+    else:
+        next_group = store.get_adjacent_visible_group(user_id, group_id)
+        if next_group is not None:
+            nav.append(InlineKeyboardButton("Next ▶️", callback_data=_page_callback(next_group, "s")))
+    if nav:
+        keyboard_buttons.append(nav)
+
+    message_text = f"<b>-- {store.get_group_title(group_id)} --</b>"
+    return message_text, InlineKeyboardMarkup(keyboard_buttons)
+
+
+def _render_page(user_id: int, page_key: str | None) -> tuple[str, InlineKeyboardMarkup] | None:
+    """Cached page for ``page_key`` (the first page if None); None if nothing is visible."""
+    listing = _viewer_listing(user_id)
+    if page_key is None:
+        page_key = listing.first_page
+    if page_key is not None and page_key in listing.pages:
+        return listing.pages[page_key]
+
+    built = _build_page(user_id, page_key) if page_key is not None else None
+    if built is None:
+        # First page, or a page that emptied since its button was drawn.
+        first_group = get_storage().get_adjacent_visible_group(user_id)
+        if first_group is None:
+            return None
+        page_key = listing.first_page = _page_callback(first_group, "s")
+        if page_key in listing.pages:
+            return listing.pages[page_key]
+        built = _build_page(user_id, page_key)
+        if built is None:
+            return None
+
+    if len(listing.pages) >= MAX_CACHED_PAGES:
+        listing.pages.clear()
+    listing.pages[page_key] = built
+    return built
+
+
+def _lookup_request(ref: str | None) -> PrayerRequest | None:
+    """The full request a callback reference points to; lists only load previews."""
+    store = get_storage()
+    req_id = store.resolve_request_ref(ref) if ref else None
+    if req_id is None:
+        return None
+    return store.get_request_by_rid(req_id)
+
+
 async def request_list_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     if chat.type != 'private':
         return
 
     user_id = update.effective_user.id
-    viewer_groups = get_user_groups(user_id)
-
-    # Fetch all prayer requests
-    all_requests = get_all_prayer_requests()
-    
-    # Filter out user's own requests and keep only those in shared groups
-    filtered_requests = []
-    for r in all_requests:
-        if r.user_id == user_id:
-            continue
-
-        creator_groups = get_user_groups(r.user_id)
-        shared_groups = viewer_groups & creator_groups
-        if shared_groups:
-            filtered_requests.append((r, shared_groups))
-
-    if not filtered_requests:
-        await update.message.reply_text('No prayer requests from others are available.')
+    page_key = None
+    if update.callback_query:
+        data = update.callback_query.data
+        if data.startswith("plist_"):
+            page_key = data
+        else:
+            page_key = context.user_data.get('request_list_page')
+
+    # Groups the viewer was just seen in must be listed too.
+    await group_activity.flush()
+    rendered = await run(_render_page, user_id, page_key)
+    if rendered is None:
+        text = 'No prayer requests from others are available.'
+        if update.callback_query:
+            await update.callback_query.edit_message_text(text)
+        else:
+            await update.message.reply_text(text)
         return
 
-    all_prayed = get_all_prayed_users()
-
-    # Group requests by group_id
-    requests_by_group = {}
-    assigned_request_ids = set()
-
-    for req, shared_groups in filtered_requests:
-        if req.id in assigned_request_ids:
-            continue  # already assigned
-        
-        chosen_gid = min(shared_groups)  # deterministic selection
-        requests_by_group.setdefault(chosen_gid, []).append(req)
-        assigned_request_ids.add(req.id)
-
-    # For each group, sort requests by username (anon last)
-    for gid, requests in requests_by_group.items():
-        group_name = get_group_title(gid)
-
-        # Group requests by username (anon = None)
-        reqs_by_user = {}
-        for r in requests:
-            key = r.username if not r.is_anonymous else None
-            reqs_by_user.setdefault(key, []).append(r)
-
-        # Sort usernames alphabetically, put None (anonymous) last
-        sorted_usernames = sorted([u for u in reqs_by_user if u is not None], key=lambda x: x.lower())
-        if None in reqs_by_user:
-            sorted_usernames.append(None)
-
-        # Compose message text and buttons
-        message_lines = [f"<b>-- {group_name} --</b>"]
-        keyboard_buttons = []
-
-        for username in sorted_usernames:
-            display_name = "Anonymous" if username is None else username
-            for r in reqs_by_user[username]:
-                prayed_users = all_prayed.get(r.id, set())
-                prayed_mark = " ✔️" if user_id in prayed_users else ""
-                keyboard_buttons.append([InlineKeyboardButton(f"{display_name}: {r.text}{prayed_mark}", callback_data=f'public_view_{r.id}')])
-
-        message_text = "\n".join(message_lines)
-
-        if update.message:
-            await update.message.reply_text(
-                message_text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode=ParseMode.HTML
-            )
-        elif update.callback_query:
-            await update.callback_query.edit_message_text(
-                message_text,
-                reply_markup=InlineKeyboardMarkup(keyboard_buttons),
-                parse_mode=ParseMode.HTML
-            )
+    if page_key is not None:
+        context.user_data['request_list_page'] = page_key
+    else:
+        context.user_data.pop('request_list_page', None)
+    message_text, keyboard = rendered
+    if update.message:
+        await update.message.reply_text(
+            message_text,
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+    elif update.callback_query:
+        await update.callback_query.edit_message_text(
+            message_text,
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+
+
+async def request_list_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+    return await request_list_command(update, context)
 
 
 async def handle_public_request_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    req_id = query.data.split('_', 2)[2]
-    req = get_request_by_rid(req_id)
+    req = await run(_lookup_request, query.data.split('_', 2)[2])
     if not req:
         await query.edit_message_text("⚠️ This prayer request no longer exists.")
         return
 
-    joined_users = get_joined_users(req.id)
+    joined_users = await get_joined_users(req.id)
     joined = query.from_user.id in joined_users
-    join_cb = f'unjoin_{req.id}' if joined else f'join_{req.id}'
+    ref = encode_request_id(req.id)
+    join_cb = f'unjoin_{ref}' if joined else f'join_{ref}'
     keyboard = [
-        [InlineKeyboardButton('Mark as prayed', callback_data=f'pray_{req.id}')],
-        [InlineKeyboardButton('Send a written prayer', callback_data=f'textpray_{req.id}')],
-        [InlineKeyboardButton('Send an audio prayer', callback_data=f'audiopray_{req.id}')],
+        [InlineKeyboardButton('Mark as prayed', callback_data=f'pray_{ref}')],
+        [InlineKeyboardButton('Send a written prayer', callback_data=f'textpray_{ref}')],
+        [InlineKeyboardButton('Send an audio prayer', callback_data=f'audiopray_{ref}')],
         [InlineKeyboardButton(joined and '➖ Unjoin' or '➕ Join', callback_data=join_cb)],
         [InlineKeyboardButton("Back", callback_data="public_back_to_list")],
     ]
@@ -134,9 +215,9 @@ async def handle_request_actions(update: Update, context: ContextTypes.DEFAULT_T
     if query.data == "public_back_to_list":
         return await request_list_command(update, context)
 
-    action, req_id = query.data.split('_', 1)
-    req = get_request_by_rid(req_id)
+    action, ref = query.data.split('_', 1)
     user_id = query.from_user.id
+    req = await run(_lookup_request, ref)
     username = query.from_user.username or f"user_{user_id}"
 
     if not req:
@@ -144,24 +225,26 @@ async def handle_request_actions(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     elif action == 'pray':
-        mark_prayed(user_id, req.id)
+        await mark_prayed(user_id, req.id)
 
+        # Notifications are delivered in the background so the reply isn't
+        # held up by a request with many joined users.
         message = f'🙏 {username} has prayed for your request:\n{req.text}'
-        await context.bot.send_message(chat_id=req.user_id, text=message)
+        outbound.submit(context.bot.send_message, req.user_id, text=message)
 
         notify = f'🙏 {username} has prayed for a request you joined: {req.text}'
-        joined_users = get_joined_users(req.id)
+        joined_users = await get_joined_users(req.id)
         for uid in joined_users:
             if uid != user_id:
-                await context.bot.send_message(chat_id=uid, text=notify)
+                outbound.submit(context.bot.send_message, uid, text=notify)
         await query.edit_message_text('✅ Marked as prayed.')
 
     elif action == 'join':
-        mark_joined(user_id, req.id)
+        await mark_joined(user_id, req.id)
         await query.edit_message_text('✅ You joined the prayer request.')
     
     elif action == 'unjoin':
-        unmark_joined(user_id, req.id)
+        await unmark_joined(user_id, req.id)
         await query.edit_message_text('✅ You left the prayer request.')
 
 async def pray_text_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -170,8 +253,7 @@ async def pray_text_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
 
     await query.answer()
-    req_id = query.data.split('_', 1)[1]
-    context.user_data['praying_req'] = req_id
+    context.user_data['praying_req'] = query.data.split('_', 1)[1]
     await query.edit_message_text('✍️ Please send your prayer as a message.')
     return PRAY_TEXT
 
@@ -179,9 +261,9 @@ async def pray_text_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     username = update.effective_user.username or f"user_{update.effective_user.id}"
     
-    req_id = context.user_data.pop('praying_req', None)
-    if req_id:
-        req = get_request_by_rid(req_id)
+    req_ref = context.user_data.pop('praying_req', None)
+    if req_ref:
+        req = await run(_lookup_request, req_ref)
         if not req:
             await update.message.reply_text('⚠️ That prayer request no longer exists.')
             context.user_data.clear()
@@ -192,9 +274,10 @@ async def pray_text_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f'<b>Request:</b> {req.text}\n'
             f'<b>Prayer:</b> {update.message.text}'
         )
-        await context.bot.send_message(
-            chat_id=req.user_id, 
-            text=message, 
+        outbound.submit(
+            context.bot.send_message,
+            req.user_id,
+            text=message,
             parse_mode=ParseMode.HTML
         )
         await update.message.reply_text('✅ Your prayer was sent.')
@@ -206,25 +289,25 @@ async def pray_audio_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     query = update.callback_query
     await query.answer()
-    req_id = query.data.split('_', 1)[1]
-    context.user_data['praying_req'] = req_id
+    context.user_data['praying_req'] = query.data.split('_', 1)[1]
     await query.edit_message_text('🎤 Please send your prayer as a voice message.')
     return PRAY_AUDIO
 
 async def pray_audio_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.effective_user.username or f"user_{update.effective_user.id}"
 
-    req_id = context.user_data.pop('praying_req', None)
-    if req_id and update.message.voice:
-        req = get_request_by_rid(req_id)
+    req_ref = context.user_data.pop('praying_req', None)
+    if req_ref and update.message.voice:
+        req = await run(_lookup_request, req_ref)
         if not req:
             await update.message.reply_text('⚠️ That prayer request no longer exists.')
             context.user_data.clear()
             return ConversationHandler.END
 
         caption = f'🎤 {username} sent an audio prayer\n<b>Request:</b> {req.text}'
-        await context.bot.send_voice(
-            chat_id=req.user_id,
+        outbound.submit(
+            context.bot.send_voice,
+            req.user_id,
             voice=update.message.voice.file_id,
             caption=caption,
             parse_mode=ParseMode.HTML
@@ -2,17 +2,19 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode
-from uuid import uuid4
 from dotenv import load_dotenv
 import os
 from state import (
     ADD_TEXT, 
     ADD_ANON,
+    PAGE_SIZE,
     PrayerRequest,
+    encode_request_id,
 )
-from database import (
-    get_prayer_requests_by_user,
-    get_joined_requests_by_user,
+from group_activity import group_activity
+from async_database import (
+    resolve_request_ref,
+    get_my_requests_page,
     insert_prayer_request,
     get_request_by_rid,
     delete_request_by_id,
@@ -74,17 +76,18 @@ async def add_request_anon(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     req = PrayerRequest(
-        id=str(uuid4()),
+        id=None,
         user_id=user.id,
         username=user.username or f"user_{user.id}",
         text=text,
         is_anonymous=is_anon,
     )
-    insert_prayer_request(req)
+    await insert_prayer_request(req)
     
-    # Find shared groups of user and bot
-    user_gs = get_user_groups(user.id)
-    bot_gs = get_user_groups(BOT_ID)
+    # Find shared groups of user and bot, including ones only just seen
+    await group_activity.flush()
+    user_gs = await get_user_groups(user.id)
+    bot_gs = await get_user_groups(BOT_ID)
     shared_groups = user_gs & bot_gs
 
     if not shared_groups:
@@ -97,29 +100,64 @@ async def add_request_anon(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 # --- List user's own prayer requests ---
+def _my_page_callback(direction: str, cursor: tuple[int, int] | None = None) -> str:
+    # direction: "s"tart, or "a"fter / "b"efore a (kind, rowid) cursor.
+    kind, position = cursor or (0, 0)
+    return f"mylist_{direction}_{kind}_{position}"
+
+
+async def _my_requests_page(user_id: int, page_key: str | None):
+    if page_key:
+        _, direction, kind, position = page_key.split("_")
+        cursor = (int(kind), int(position))
+        if direction == "a":
+            return await get_my_requests_page(user_id, after=cursor, limit=PAGE_SIZE)
+        if direction == "b":
+            return await get_my_requests_page(user_id, before=cursor, limit=PAGE_SIZE)
+    return await get_my_requests_page(user_id, limit=PAGE_SIZE)
+
+
 async def my_requests_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     if chat.type != 'private':
         return
 
     user_id = update.effective_user.id
-    my_requests = get_prayer_requests_by_user(user_id)
-    joined_requests = get_joined_requests_by_user(user_id)
+    page_key = None
+    if update.callback_query:
+        data = update.callback_query.data
+        page_key = data if data.startswith("mylist_") else context.user_data.get('my_requests_page')
+
+    page = await _my_requests_page(user_id, page_key)
+    if not page.items and page_key:
+        # The page emptied (e.g. its last request was removed); start over.
+        page_key = None
+        page = await _my_requests_page(user_id, None)
+    if page_key:
+        context.user_data['my_requests_page'] = page_key
+    else:
+        context.user_data.pop('my_requests_page', None)
 
     keyboard = []
 
-    # Own requests
-    if my_requests:
-        for req in my_requests:
-            keyboard.append([InlineKeyboardButton(f"{req.text[:50]}", callback_data=f"view_{req.id}")])
-
-    # Joined requests
-    if joined_requests:
-        for req in joined_requests:
-            text = f"joined {req.username}: {req.text[:30]}" if req.username else req.text[:50]
-            keyboard.append([InlineKeyboardButton(f"{text}", callback_data=f"view_{req.id}")])
-
-    if not my_requests and not joined_requests:
+    for joined, req in page.items:
+        if not joined:
+            # Own requests
+            keyboard.append([InlineKeyboardButton(f"{req.preview}", callback_data=f"view_{encode_request_id(req.id)}")])
+        else:
+            # Joined requests
+            text = f"joined {req.username}: {req.preview[:30]}" if req.username else req.preview
+            keyboard.append([InlineKeyboardButton(f"{text}", callback_data=f"view_{encode_request_id(req.id)}")])
+
+    nav = []
+    if page.has_prev:
+        nav.append(InlineKeyboardButton("◀️ Prev", callback_data=_my_page_callback("b", page.start)))
+    if page.has_next:
+        nav.append(InlineKeyboardButton("Next ▶️", callback_data=_my_page_callback("a", page.end)))
+    if nav:
+        keyboard.append(nav)
+
+    if not page.items:
         text = "😕 You haven't made or joined any prayer requests yet."
     else:
         text = "<b>-- Your Prayer Requests --</b>"
@@ -137,6 +175,10 @@ async def my_requests_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode=ParseMode.HTML
         )
 
+async def my_requests_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+    return await my_requests_list(update, context)
+
 # --- Handle view and removal of user's requests ---
 async def handle_my_request_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -145,15 +187,15 @@ async def handle_my_request_action(update: Update, context: ContextTypes.DEFAULT
     user_id = query.from_user.id
     
     if data.startswith("view_"):
-        req_id = data.split("_", 1)[1]
-        req = get_request_by_rid(req_id)
+        req_id = await resolve_request_ref(data.split("_", 1)[1])
+        req = await get_request_by_rid(req_id) if req_id is not None else None
         if not req:
             return await query.edit_message_text("⚠️ This request no longer exists.")
         if req.user_id != user_id:
             return await query.edit_message_text("❌ You do not own this request.")
         
         keyboard = [
-            [InlineKeyboardButton("❌ Remove", callback_data=f"remove_{req.id}")],
+            [InlineKeyboardButton("❌ Remove", callback_data=f"remove_{encode_request_id(req.id)}")],
             [InlineKeyboardButton("Back", callback_data="back_to_list")]
         ]
         return await query.edit_message_text(
@@ -163,10 +205,10 @@ async def handle_my_request_action(update: Update, context: ContextTypes.DEFAULT
         )
     
     if data.startswith("remove_"):
-        req_id = data.split("_", 1)[1]
-        req = get_request_by_rid(req_id)
+        req_id = await resolve_request_ref(data.split("_", 1)[1])
+        req = await get_request_by_rid(req_id) if req_id is not None else None
         if req and req.user_id == user_id:
-            delete_request_by_id(req_id)
+            await delete_request_by_id(req_id)
             return await my_requests_list(update, context)
         else:
             await query.edit_message_text("❌ Could not remove the request.")
@@ -0,0 +1,73 @@
+# handle_settings.py
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from async_database import get_reminder_preference, save_reminder_preference
+
+USAGE = (
+    "Usage: /reminder_time <hour> [UTC offset]\n"
+    "e.g. /reminder_time 21 +8 for 9pm at UTC+8. Reminders are sent on the hour."
+)
+
+
+def _format_offset(utc_offset: int) -> str:
+    return f"UTC{utc_offset:+d}"
+
+
+def _parse_hour(raw: str) -> int:
+    """Parse "21" or "21:00" into an hour; raises ValueError with a reply for the user."""
+    hour, _, minutes = raw.strip().partition(":")
+    if minutes.strip("0"):
+        raise ValueError("Reminders are sent on the hour, so give a whole hour such as 21 or 21:00.")
+    if not hour.isdigit() or not 0 <= int(hour) <= 23:
+        raise ValueError("The hour must be between 0 and 23.")
+    return int(hour)
+
+
+def _parse_offset(raw: str) -> int:
+    """Parse "+8", "-5" or "UTC+8" into whole hours; raises ValueError with a reply for the user."""
+    raw = raw.strip().upper()
+    if raw.startswith("UTC"):
+        raw = raw[3:] or "0"
+    hours, _, minutes = raw.partition(":")
+    if minutes.strip("0"):
+        # Reminder runs go out once an hour, so a half-hour zone can only
+        # pick the slot either side of its local time.
+        raise ValueError(
+            "Reminders are sent in hourly slots, so give a whole-hour offset: "
+            "e.g. +5 or +6 for UTC+5:30."
+        )
+    try:
+        offset = int(hours)
+    except ValueError:
+        raise ValueError("Could not read that UTC offset; use e.g. +8 or -5.") from None
+    if not -12 <= offset <= 14:
+        raise ValueError("The UTC offset must be between -12 and +14.")
+    return offset
+
+
+async def reminder_time_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    if chat.type != 'private':
+        return
+
+    user_id = update.effective_user.id
+    local_hour, utc_offset = await get_reminder_preference(user_id)
+    args = context.args or []
+
+    if not args:
+        return await update.message.reply_text(
+            f"⏰ Your daily reminder is sent at {local_hour:02d}:00 ({_format_offset(utc_offset)}).\n\n{USAGE}"
+        )
+
+    try:
+        local_hour = _parse_hour(args[0])
+        if len(args) > 1:
+            utc_offset = _parse_offset(args[1])
+    except ValueError as exc:
+        return await update.message.reply_text(f"❌ {exc}\n\n{USAGE}")
+
+    await save_reminder_preference(user_id, local_hour, utc_offset)
+    await update.message.reply_text(
+        f"✅ Your daily reminder will be sent at {local_hour:02d}:00 ({_format_offset(utc_offset)})."
+    )
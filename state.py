@@ -1,13 +1,63 @@
 from dataclasses import dataclass
+from typing import Any
 
 # Constants
 ADD_TEXT, ADD_ANON = range(2)
 PRAY_TEXT, PRAY_AUDIO = range(10, 12)
+# Buttons per page of a request list keyboard.
+PAGE_SIZE = 8
+# Characters of request text loaded for list buttons.
+PREVIEW_LENGTH = 50
 
-@dataclass
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def encode_request_id(request_id: int) -> str:
+    """Short base-36 form of a request id for callback data."""
+    if request_id == 0:
+        return "0"
+    digits = []
+    while request_id:
+        request_id, digit = divmod(request_id, 36)
+        digits.append(_BASE36[digit])
+    return "".join(reversed(digits))
+
+
+def decode_request_id(ref: str) -> int | None:
+    """Inverse of encode_request_id; None if ``ref`` is not a short id."""
+    if not 0 < len(ref) <= 12 or not all(ch in _BASE36 for ch in ref):
+        return None
+    return int(ref, 36)
+
+
+@dataclass(slots=True)
 class PrayerRequest:
-    id: str
+    id: int | None
     user_id: int
     username: str
     text: str
-    is_anonymous: bool
\ No newline at end of file
+    is_anonymous: bool
+
+@dataclass(slots=True)
+class RequestPreview:
+    """A request as shown in lists: the first PREVIEW_LENGTH characters of its text."""
+    id: int
+    user_id: int
+    username: str
+    preview: str
+    is_anonymous: bool
+
+@dataclass(slots=True)
+class VisibleRequest:
+    request: PrayerRequest | RequestPreview
+    group_id: int
+    prayed: bool
+
+@dataclass(slots=True)
+class Page:
+    """One keyset page; ``start``/``end`` are the cursors of its first and last item."""
+    items: list
+    start: Any
+    end: Any
+    has_prev: bool
+    has_next: bool
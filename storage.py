@@ -0,0 +1,306 @@
+# storage.py
+import heapq
+import sqlite3
+import threading
+from typing import Iterable, Optional, Protocol
+
+import database
+from state import PAGE_SIZE, PREVIEW_LENGTH, Page, PrayerRequest, RequestPreview, VisibleRequest, decode_request_id
+
+
+class Storage(Protocol):
+    """Requests, group membership and metadata, joins and prayed marks.
+
+    The handlers go through ``get_storage()`` so the backend can be swapped,
+    e.g. for ``MemoryStorage`` in benchmarks. Reminder runs, digests and
+    delivery bookkeeping stay on SQLite (``database``).
+    """
+
+    # Prayer_Requests
+    def insert_prayer_request(self, req: PrayerRequest) -> int: ...
+    def get_request_by_rid(self, req_id: int) -> Optional[PrayerRequest]: ...
+    def resolve_request_ref(self, ref: str) -> Optional[int]: ...
+    def delete_request_by_id(self, req_id: int): ...
+    def get_visible_request_page(self, viewer_id: int, group_id: int, after: Optional[int] = None,
+                                 before: Optional[int] = None, limit: int = PAGE_SIZE) -> Page: ...
+    def get_adjacent_visible_group(self, viewer_id: int, group_id: Optional[int] = None,
+                                   forward: bool = True) -> Optional[int]: ...
+    def get_my_requests_page(self, user_id: int, after: Optional[tuple[int, int]] = None,
+                             before: Optional[tuple[int, int]] = None, limit: int = PAGE_SIZE) -> Page: ...
+    def get_visibility_version(self, user_id: int) -> tuple[int, int]: ...
+
+    # Group_Membership / Group_Metadata
+    def save_user_group_membership(self, user_id: int, group_id: int): ...
+    def get_user_groups(self, user_id: int) -> set[int]: ...
+    def get_group_users(self, group_id: int) -> set[int]: ...
+    def save_group_title(self, group_id: int, title: str): ...
+    def get_group_title(self, group_id: int) -> str: ...
+    def save_group_activity(self, memberships: list[tuple[int, int]], titles: list[tuple[int, str]]): ...
+
+    # Prayed_Users / Joined_Users
+    def mark_prayed(self, user_id: int, req_id: int): ...
+    def get_prayed_request_ids(self, user_id: int, request_ids: Iterable[int]) -> set[int]: ...
+    def mark_joined(self, user_id: int, req_id: int): ...
+    def unmark_joined(self, user_id: int, req_id: int): ...
+    def get_joined_users(self, req_id: int) -> set[int]: ...
+
+
+class SqliteStorage:
+    """The production backend: the functions in ``database``."""
+
+    insert_prayer_request = staticmethod(database.insert_prayer_request)
+    get_request_by_rid = staticmethod(database.get_request_by_rid)
+    resolve_request_ref = staticmethod(database.resolve_request_ref)
+    delete_request_by_id = staticmethod(database.delete_request_by_id)
+    get_visible_request_page = staticmethod(database.get_visible_request_page)
+    get_adjacent_visible_group = staticmethod(database.get_adjacent_visible_group)
+    get_my_requests_page = staticmethod(database.get_my_requests_page)
+    get_visibility_version = staticmethod(database.get_visibility_version)
+
+    save_user_group_membership = staticmethod(database.save_user_group_membership)
+    get_user_groups = staticmethod(database.get_user_groups)
+    get_group_users = staticmethod(database.get_group_users)
+    save_group_title = staticmethod(database.save_group_title)
+    get_group_title = staticmethod(database.get_group_title)
+    save_group_activity = staticmethod(database.save_group_activity)
+
+    mark_prayed = staticmethod(database.mark_prayed)
+    get_prayed_request_ids = staticmethod(database.get_prayed_request_ids)
+    mark_joined = staticmethod(database.mark_joined)
+    unmark_joined = staticmethod(database.unmark_joined)
+    get_joined_users = staticmethod(database.get_joined_users)
+
+
+def _list_key(req: PrayerRequest) -> tuple:
+    # Same order as database._LIST_ORDER_COLUMNS.
+    return (req.is_anonymous, "" if req.is_anonymous else (req.username or "").lower(), req.id)
+
+
+def _preview(req: PrayerRequest) -> RequestPreview:
+    return RequestPreview(req.id, req.user_id, req.username, req.text[:PREVIEW_LENGTH], req.is_anonymous)
+
+
+def _page_of(ranked: list, limit: int, forward: bool, has_cursor: bool, cursor_of) -> Page:
+    more = len(ranked) > limit
+    ranked = ranked[:limit]
+    if not forward:
+        ranked.reverse()
+    return Page(
+        items=ranked,
+        start=cursor_of(ranked[0]) if ranked else None,
+        end=cursor_of(ranked[-1]) if ranked else None,
+        has_prev=more if not forward else has_cursor,
+        has_next=more if forward else has_cursor,
+    )
+
+
+class MemoryStorage:
+    """Dict-and-set backend with the same behaviour as SQLite, for benchmarks and tests.
+
+    Every lookup the handlers make is served from an index: requests by id
+    and by owner, groups by user and users by group, joins and prayed marks
+    in both directions. One lock covers reads as well as writes, so a call
+    from any of the database threads sees a consistent snapshot, as an
+    SQLite read transaction does.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._next_id = 1
+        self._requests: dict[int, PrayerRequest] = {}
+        self._requests_by_user: dict[int, dict[int, None]] = {}
+        self._groups_by_user: dict[int, set[int]] = {}
+        self._users_by_group: dict[int, set[int]] = {}
+        self._titles: dict[int, str] = {}
+        self._joined_by_request: dict[int, set[int]] = {}
+        self._joined_by_user: dict[int, set[int]] = {}
+        self._prayed_by_request: dict[int, set[int]] = {}
+        self._prayed_by_user: dict[int, set[int]] = {}
+        self._data_version = 0
+        self._user_versions: dict[int, int] = {}
+
+    # Prayer_Requests
+    def insert_prayer_request(self, req: PrayerRequest) -> int:
+        with self._lock:
+            request_id = req.id if req.id is not None else self._next_id
+            if request_id in self._requests:
+                raise ValueError(f"Duplicate request id: {request_id}")
+            self._next_id = max(self._next_id, request_id + 1)
+            self._requests[request_id] = PrayerRequest(
+                request_id, req.user_id, req.username, req.text, bool(req.is_anonymous)
+            )
+            self._requests_by_user.setdefault(req.user_id, {})[request_id] = None
+            self._data_version += 1
+        return request_id
+
+    def get_request_by_rid(self, req_id: int) -> Optional[PrayerRequest]:
+        return self._requests.get(req_id)
+
+    def resolve_request_ref(self, ref: str) -> Optional[int]:
+        return decode_request_id(ref)
+
+    def delete_request_by_id(self, req_id: int):
+        with self._lock:
+            req = self._requests.pop(req_id, None)
+            if req is None:
+                return
+            self._requests_by_user[req.user_id].pop(req_id, None)
+            for user_id in self._joined_by_request.pop(req_id, set()):
+                self._joined_by_user[user_id].discard(req_id)
+            for user_id in self._prayed_by_request.pop(req_id, set()):
+                self._prayed_by_user[user_id].discard(req_id)
+            self._data_version += 1
+
+    def _lowest_shared_group(self, viewer_id: int, user_id: int) -> Optional[int]:
+        shared = self._groups_by_user.get(viewer_id, set()) & self._groups_by_user.get(user_id, set())
+        return min(shared) if shared else None
+
+    def _listed_creators(self, viewer_id: int, group_id: int):
+        if viewer_id not in self._users_by_group.get(group_id, ()):
+            return
+        for user_id in self._users_by_group[group_id]:
+            if (user_id != viewer_id and self._requests_by_user.get(user_id)
+                    and self._lowest_shared_group(viewer_id, user_id) == group_id):
+                yield user_id
+
+    def get_visible_request_page(self, viewer_id: int, group_id: int, after: Optional[int] = None,
+                                 before: Optional[int] = None, limit: int = PAGE_SIZE) -> Page:
+        with self._lock:
+            forward = before is None
+            cursor = after if forward else before
+            anchor = self._requests.get(cursor) if cursor else None
+            anchor_key = _list_key(anchor) if anchor is not None else None
+            candidates = (
+                self._requests[req_id]
+                for user_id in self._listed_creators(viewer_id, group_id)
+                for req_id in self._requests_by_user[user_id]
+            )
+            if anchor_key is not None:
+                if forward:
+                    candidates = (r for r in candidates if _list_key(r) > anchor_key)
+                else:
+                    candidates = (r for r in candidates if _list_key(r) < anchor_key)
+            pick = heapq.nsmallest if forward else heapq.nlargest
+            ranked = pick(limit + 1, candidates, key=_list_key)
+            page = _page_of(ranked, limit, forward, anchor_key is not None, lambda r: r.id)
+            prayed = self._prayed_by_user.get(viewer_id, set())
+            page.items = [VisibleRequest(_preview(r), group_id, r.id in prayed) for r in page.items]
+            return page
+
+    def get_adjacent_visible_group(self, viewer_id: int, group_id: Optional[int] = None,
+                                   forward: bool = True) -> Optional[int]:
+        with self._lock:
+            groups = sorted(self._groups_by_user.get(viewer_id, ()), reverse=not forward)
+            for candidate in groups:
+                if group_id is not None and (candidate <= group_id if forward else candidate >= group_id):
+                    continue
+                if next(self._listed_creators(viewer_id, candidate), None) is not None:
+                    return candidate
+            return None
+
+    def get_my_requests_page(self, user_id: int, after: Optional[tuple[int, int]] = None,
+                             before: Optional[tuple[int, int]] = None, limit: int = PAGE_SIZE) -> Page:
+        with self._lock:
+            forward = before is None
+            cursor = after if forward else before
+            entries = [(0, req_id) for req_id in self._requests_by_user.get(user_id, ())]
+            entries += [(1, req_id) for req_id in self._joined_by_user.get(user_id, ())]
+            if cursor is not None:
+                entries = [e for e in entries if (e > cursor if forward else e < cursor)]
+            pick = heapq.nsmallest if forward else heapq.nlargest
+            page = _page_of(pick(limit + 1, entries), limit, forward, cursor is not None, lambda e: e)
+            page.items = [(bool(kind), _preview(self._requests[req_id])) for kind, req_id in page.items]
+            return page
+
+    def get_visibility_version(self, user_id: int) -> tuple[int, int]:
+        with self._lock:
+            return self._data_version, self._user_versions.get(user_id, 0)
+
+    # Group_Membership / Group_Metadata
+    def save_user_group_membership(self, user_id: int, group_id: int):
+        with self._lock:
+            groups = self._groups_by_user.setdefault(user_id, set())
+            if group_id not in groups:
+                groups.add(group_id)
+                self._users_by_group.setdefault(group_id, set()).add(user_id)
+                self._data_version += 1
+
+    def get_user_groups(self, user_id: int) -> set[int]:
+        with self._lock:
+            return set(self._groups_by_user.get(user_id, ()))
+
+    def get_group_users(self, group_id: int) -> set[int]:
+        with self._lock:
+            return set(self._users_by_group.get(group_id, ()))
+
+    def save_group_title(self, group_id: int, title: str):
+        with self._lock:
+            if self._titles.get(group_id) != title:
+                self._titles[group_id] = title
+                self._data_version += 1
+
+    def get_group_title(self, group_id: int) -> str:
+        return self._titles.get(group_id, f"Group {group_id}")
+
+    def save_group_activity(self, memberships: list[tuple[int, int]], titles: list[tuple[int, str]]):
+        with self._lock:
+            for user_id, group_id in memberships:
+                self.save_user_group_membership(user_id, group_id)
+            for group_id, title in titles:
+                self.save_group_title(group_id, title)
+
+    # Prayed_Users / Joined_Users
+    def _require_request(self, req_id: int):
+        # SQLite rejects marks on a missing request through its foreign keys.
+        if req_id not in self._requests:
+            raise sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+
+    def mark_prayed(self, user_id: int, req_id: int):
+        with self._lock:
+            self._require_request(req_id)
+            self._prayed_by_request.setdefault(req_id, set()).add(user_id)
+            self._prayed_by_user.setdefault(user_id, set()).add(req_id)
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def get_prayed_request_ids(self, user_id: int, request_ids: Iterable[int]) -> set[int]:
+        with self._lock:
+            return self._prayed_by_user.get(user_id, set()).intersection(request_ids)
+
+    def mark_joined(self, user_id: int, req_id: int):
+        with self._lock:
+            self._require_request(req_id)
+            joined = self._joined_by_user.setdefault(user_id, set())
+            if req_id not in joined:
+                joined.add(req_id)
+                self._joined_by_request.setdefault(req_id, set()).add(user_id)
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def unmark_joined(self, user_id: int, req_id: int):
+        with self._lock:
+            joined = self._joined_by_user.get(user_id, set())
+            if req_id in joined:
+                joined.discard(req_id)
+                self._joined_by_request[req_id].discard(user_id)
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+
+    def get_joined_users(self, req_id: int) -> set[int]:
+        with self._lock:
+            return set(self._joined_by_request.get(req_id, ()))
+
+
+_storage: Storage = SqliteStorage()
+
+
+def get_storage() -> Storage:
+    return _storage
+
+
+def set_storage(storage: Storage) -> Storage:
+    """Swap the backend the handlers use; returns the previous one.
+
+    Listings cached under the old backend's versions should be dropped too
+    (``handle_prayer.visibility_cache.clear()``).
+    """
+    global _storage
+    previous, _storage = _storage, storage
+    return previous
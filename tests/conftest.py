@@ -0,0 +1,19 @@
+"""Shared fixtures for the test suite."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated throwaway database; yields its path."""
+    path = str(tmp_path / "prayerbot.db")
+    monkeypatch.setattr(database, "_db_path", lambda: path)
+    database.init_db()
+    yield path
+    database.close_connections()
@@ -0,0 +1,62 @@
+"""Tests for the awaitable database API."""
+import sys
+import os
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import async_database
+import database
+from state import PrayerRequest
+
+
+@pytest.fixture
+def db(db):
+    yield db
+    async_database.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_wrappers_match_the_sync_api(db):
+    req_id = await async_database.insert_prayer_request(PrayerRequest(None, 2, "user_2", "Pray", False))
+    await async_database.mark_joined(1, req_id)
+
+    assert (await async_database.get_request_by_rid(req_id)).text == "Pray"
+    assert await async_database.get_joined_users(req_id) == {1}
+    assert database.get_joined_users(req_id) == {1}
+
+
+@pytest.mark.asyncio
+async def test_calls_run_on_database_threads(db):
+    assert (await async_database.run(threading.current_thread)).name.startswith("db")
+
+
+@pytest.mark.asyncio
+async def test_lock_wait_does_not_block_the_event_loop(db):
+    database.insert_prayer_request(PrayerRequest(None, 2, "user_2", "Pray", False))
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold_writer():
+        with database.connections.writer():
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_writer)
+    holder.start()
+    holding.wait(5)
+    try:
+        write = asyncio.create_task(async_database.mark_prayed(1, 1))
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert ticks == 5 and not write.done()
+    finally:
+        release.set()
+        holder.join()
+    await write
+    assert database.get_prayed_request_ids(1, [1]) == {1}
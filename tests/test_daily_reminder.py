@@ -10,6 +10,7 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from httpx import AsyncClient, ASGITransport
 
+import database
 from state import PrayerRequest
 
 
@@ -17,6 +18,15 @@ from state import PrayerRequest
 # Helpers
 # ---------------------------------------------------------------------------
 
+# Reminder checkpoints go to a throwaway database.
+pytestmark = pytest.mark.usefixtures("db")
+
+
+def _streamed(user_ids):
+    """Stand-in for database.iter_all_user_ids yielding ``user_ids`` in order."""
+    return lambda *args, **kwargs: iter(sorted(user_ids))
+
+
 def _make_request(req_id, user_id, text, is_anonymous=False):
     return PrayerRequest(
         id=req_id,
@@ -27,51 +37,14 @@ def _make_request(req_id, user_id, text, is_anonymous=False):
     )
 
 
-def _mock_votd_response(verse="Be strong.", reference="Josh 1:9"):
-    mock_resp = MagicMock()
-    mock_resp.raise_for_status = MagicMock()
-    mock_resp.json.return_value = {
-        "verse": {"details": {"text": verse, "reference": reference}}
-    }
-    return mock_resp
+def _seed(requests, memberships):
+    for user_id, group_id in memberships:
+        database.save_user_group_membership(user_id, group_id)
+    for req in requests:
+        database.insert_prayer_request(req)
 
 
-# ---------------------------------------------------------------------------
-# _get_votd unit tests
-# ---------------------------------------------------------------------------
-
-class TestGetVotd:
-    def test_returns_formatted_verse(self):
-        import index as dr
-        with patch("index.http_requests.get", return_value=_mock_votd_response()) as mock_get:
-            result = dr._get_votd()
-        mock_get.assert_called_once()
-        assert "Be strong." in result
-        assert "Josh 1:9" in result
-        assert "<i>" in result
-
-    def test_fallback_on_network_error(self):
-        import index as dr
-        with patch("index.http_requests.get", side_effect=Exception("timeout")):
-            result = dr._get_votd()
-        assert result == "Stay faithful and trust in the Lord today!"
-
-    def test_fallback_on_empty_verse(self):
-        import index as dr
-        mock_resp = MagicMock()
-        mock_resp.raise_for_status = MagicMock()
-        mock_resp.json.return_value = {"verse": {"details": {"text": "", "reference": ""}}}
-        with patch("index.http_requests.get", return_value=mock_resp):
-            result = dr._get_votd()
-        assert result == "Stay faithful and trust in the Lord today!"
-
-    def test_html_special_chars_are_escaped(self):
-        import index as dr
-        verse = "Trust <Him> & 'believe'."
-        with patch("index.http_requests.get", return_value=_mock_votd_response(verse=verse)):
-            result = dr._get_votd()
-        assert "<Him>" not in result
-        assert "&lt;Him&gt;" in result
+VERSE = "Be strong. - <i>Josh 1:9</i>"
 
 
 # ---------------------------------------------------------------------------
@@ -84,15 +57,13 @@ class TestSendDailyReminders:
         import index as dr
 
         user_a, user_b = 111, 222
-        req = _make_request("req1", user_b, "Pray for my family")
+        _seed([_make_request(1, user_b, "Pray for my family")], [(user_a, 1), (user_b, 1)])
 
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[user_a, user_b]),
-            patch("index.get_all_prayer_requests", return_value=[req]),
-            patch("index.get_user_groups", side_effect=lambda uid: {1}),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([user_a, user_b])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
         ):
             mock_bot = AsyncMock()
             mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
@@ -107,6 +78,7 @@ class TestSendDailyReminders:
         text_sent = user_a_calls[0].kwargs["text"]
         assert "Pray for my family" in text_sent
         assert "Daily Prayer Reminder" in text_sent
+        assert VERSE in text_sent
 
         assert summary["sent"] == 2
         assert summary["failed"] == 0
@@ -117,18 +89,14 @@ class TestSendDailyReminders:
         import index as dr
 
         user_a, user_b = 111, 222
-        req = _make_request("req1", user_b, "Secret request")
-
-        def groups_by_user(uid):
-            return {10} if uid == user_a else {20}  # different groups
+        # different groups
+        _seed([_make_request(1, user_b, "Secret request")], [(user_a, 10), (user_b, 20)])
 
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[user_a, user_b]),
-            patch("index.get_all_prayer_requests", return_value=[req]),
-            patch("index.get_user_groups", side_effect=groups_by_user),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([user_a, user_b])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
         ):
             mock_bot = AsyncMock()
             mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
@@ -152,10 +120,8 @@ class TestSendDailyReminders:
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[-100123456, 0]),
-            patch("index.get_all_prayer_requests", return_value=[]),
-            patch("index.get_user_groups", return_value=set()),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([-100123456, 0])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
         ):
             mock_bot = AsyncMock()
             mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
@@ -174,10 +140,8 @@ class TestSendDailyReminders:
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[111]),
-            patch("index.get_all_prayer_requests", return_value=[]),
-            patch("index.get_user_groups", return_value=set()),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([111])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
         ):
             mock_bot = AsyncMock()
             mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
@@ -189,6 +153,91 @@ class TestSendDailyReminders:
         assert summary["sent"] == 0
         assert summary["failed"] == 1
 
+    @pytest.mark.asyncio
+    async def test_blocked_users_are_skipped_on_later_runs(self):
+        import index as dr
+        from telegram.error import Forbidden
+
+        for user_id in (111, 222):
+            database.insert_prayer_request(_make_request(user_id, user_id, "Pray"))
+
+        async def send(chat_id, **kwargs):
+            if chat_id == 111:
+                raise Forbidden("Forbidden: bot was blocked by the user")
+
+        with (
+            patch("index.BOT_TOKEN", "fake-token"),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+        ):
+            mock_bot = AsyncMock()
+            mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+            mock_bot.__aexit__ = AsyncMock(return_value=False)
+            mock_bot.send_message = AsyncMock(side_effect=send)
+            with patch("index.Bot", return_value=mock_bot):
+                summary = await dr._send_daily_reminders()
+
+        assert summary["sent"] == 1
+        assert summary["unreachable"] == 1
+        assert database.get_delivery_status(111)["dead"] is True
+        assert database.get_all_user_ids() == [222]
+
+    @pytest.mark.asyncio
+    async def test_transient_errors_are_retried(self):
+        """NetworkError is retried with backoff; the user still gets the message."""
+        import index as dr
+        from telegram.error import NetworkError
+
+        with (
+            patch("index.BOT_TOKEN", "fake-token"),
+            patch("index.BROADCAST_BACKOFF", 0),
+            patch("index.init_db"),
+            patch("index.iter_all_user_ids", side_effect=_streamed([111])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+        ):
+            mock_bot = AsyncMock()
+            mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+            mock_bot.__aexit__ = AsyncMock(return_value=False)
+            mock_bot.send_message = AsyncMock(side_effect=[NetworkError("reset"), MagicMock()])
+            with patch("index.Bot", return_value=mock_bot):
+                summary = await dr._send_daily_reminders()
+
+        assert mock_bot.send_message.await_count == 2
+        assert summary["sent"] == 1
+        assert summary["failed"] == 0
+        assert summary["retried"] == 1
+
+    @pytest.mark.asyncio
+    async def test_broadcast_is_concurrent_and_reports_latency(self):
+        """Slow sends overlap, and the summary carries throughput and percentiles."""
+        import asyncio
+        import index as dr
+
+        user_ids = list(range(1, 41))
+
+        async def slow_send(**kwargs):
+            await asyncio.sleep(0.05)
+
+        with (
+            patch("index.BOT_TOKEN", "fake-token"),
+            patch("index.BROADCAST_RATE", 1000.0),
+            patch("index.init_db"),
+            patch("index.iter_all_user_ids", side_effect=_streamed(user_ids)),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+        ):
+            mock_bot = AsyncMock()
+            mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+            mock_bot.__aexit__ = AsyncMock(return_value=False)
+            mock_bot.send_message = AsyncMock(side_effect=slow_send)
+            with patch("index.Bot", return_value=mock_bot):
+                summary = await dr._send_daily_reminders()
+
+        assert summary["sent"] == 40
+        # Sequential sends would take 40 * 50 ms = 2 s.
+        assert summary["duration_s"] < 1
+        assert summary["throughput_per_s"] > 0
+        assert summary["latency_ms"]["p50"] >= 50
+        assert summary["latency_ms"]["p50"] <= summary["latency_ms"]["p95"] <= summary["latency_ms"]["p99"]
+
     @pytest.mark.asyncio
     async def test_raises_without_bot_token(self):
         import index as dr
@@ -199,6 +248,223 @@ class TestSendDailyReminders:
                     await dr._send_daily_reminders()
 
 
+# ---------------------------------------------------------------------------
+# Stored digests
+# ---------------------------------------------------------------------------
+
+class TestStoredDigests:
+    @pytest.mark.asyncio
+    async def test_fresh_digests_are_sent_without_rendering(self):
+        import index as dr
+        from digest import refresh_daily_digests
+
+        _seed([_make_request(1, 222, "Pray for rain")], [(111, 1), (222, 1)])
+        database.mark_joined(111, 1)
+        assert refresh_daily_digests() == 2
+
+        with (
+            patch("index.BOT_TOKEN", "fake-token"),
+            patch("index.init_db"),
+            patch("index.iter_all_user_ids", side_effect=_streamed([111, 222])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+            patch("digest.VisibilityIndex", side_effect=AssertionError("rendered at send time")),
+        ):
+            mock_bot = AsyncMock()
+            mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+            mock_bot.__aexit__ = AsyncMock(return_value=False)
+            with patch("index.Bot", return_value=mock_bot):
+                summary = await dr._send_daily_reminders()
+
+        texts = {c.kwargs["chat_id"]: c.kwargs["text"] for c in mock_bot.send_message.call_args_list}
+        assert "Pray for rain" in texts[111]
+        assert "no prayer requests" in texts[222]
+        assert summary["sent"] == 2
+        assert summary["digests_refreshed"] == 0
+
+    @pytest.mark.asyncio
+    async def test_split_digest_is_sent_as_several_messages(self):
+        import index as dr
+
+        _seed([_make_request(i + 1, 222, "y" * 1000) for i in range(10)], [(111, 1), (222, 1)])
+
+        with (
+            patch("index.BOT_TOKEN", "fake-token"),
+            patch("index.init_db"),
+            patch("index.iter_all_user_ids", side_effect=_streamed([111, 222])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+        ):
+            mock_bot = AsyncMock()
+            mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+            mock_bot.__aexit__ = AsyncMock(return_value=False)
+            with patch("index.Bot", return_value=mock_bot):
+                summary = await dr._send_daily_reminders()
+
+        user_a_calls = [c for c in mock_bot.send_message.call_args_list if c.kwargs["chat_id"] == 111]
+        assert len(user_a_calls) == 3
+        assert summary["sent"] == 2
+        assert summary["distinct_digests"] == 2
+
+
+# ---------------------------------------------------------------------------
+# Checkpointed / sharded runs
+# ---------------------------------------------------------------------------
+
+async def _run_reminder(user_ids, send=None, **kwargs):
+    """Run _send_daily_reminders with no requests; return (summary, chat ids sent to)."""
+    import index as dr
+
+    with (
+        patch("index.BOT_TOKEN", "fake-token"),
+        patch("index.iter_all_user_ids", side_effect=_streamed(user_ids)),
+        patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+    ):
+        mock_bot = AsyncMock()
+        mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+        mock_bot.__aexit__ = AsyncMock(return_value=False)
+        if send is not None:
+            mock_bot.send_message = AsyncMock(side_effect=send)
+        with patch("index.Bot", return_value=mock_bot):
+            summary = await dr._send_daily_reminders(**kwargs)
+
+    sent_to = [c.kwargs["chat_id"] for c in mock_bot.send_message.call_args_list]
+    return summary, sent_to
+
+
+class TestCheckpointedRuns:
+    @pytest.mark.asyncio
+    async def test_batches_resume_from_last_delivered_user(self):
+        user_ids = [5, 1, 4, 2, 3]
+
+        first, first_sent = await _run_reminder(user_ids, batch=2)
+        second, second_sent = await _run_reminder(user_ids, batch=2)
+        third, third_sent = await _run_reminder(user_ids, batch=2)
+
+        assert sorted(first_sent) == [1, 2]
+        assert sorted(second_sent) == [3, 4]
+        assert third_sent == [5]
+        assert first["progress"]["remaining"] == 3
+        assert first["progress"]["completed"] is False
+        assert third["progress"]["remaining"] == 0
+        assert third["progress"]["completed"] is True
+
+    @pytest.mark.asyncio
+    async def test_completed_run_is_not_repeated_the_same_day(self):
+        await _run_reminder([1, 2])
+        summary, sent_to = await _run_reminder([1, 2])
+
+        assert sent_to == []
+        assert summary["sent"] == 0
+        assert summary["progress"]["completed"] is True
+
+    @pytest.mark.asyncio
+    async def test_shards_split_recipients(self):
+        user_ids = list(range(1, 11))
+
+        _, shard0 = await _run_reminder(user_ids, shard=0, shards=2)
+        _, shard1 = await _run_reminder(user_ids, shard=1, shards=2)
+
+        assert sorted(shard0) == [2, 4, 6, 8, 10]
+        assert sorted(shard1) == [1, 3, 5, 7, 9]
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_records_totals(self):
+        import index as dr
+
+        await _run_reminder([1, 2, 3], batch=2)
+        await _run_reminder([1, 2, 3], batch=2)
+
+        checkpoint = database.get_reminder_checkpoint(dr._today_run_key(), 0, 1)
+        assert checkpoint == {"last_user_id": 3, "sent": 3, "failed": 0, "completed": True}
+
+    @pytest.mark.asyncio
+    async def test_transient_failures_are_sent_again_by_the_next_invocation(self):
+        import index as dr
+        from telegram.error import NetworkError
+
+        down = {2}
+
+        async def send(chat_id, **kwargs):
+            if chat_id in down:
+                raise NetworkError("Connection reset")
+
+        with patch("index.BROADCAST_BACKOFF", 0):
+            first, _ = await _run_reminder([1, 2, 3], send=send)
+            down.clear()
+            second, second_sent = await _run_reminder([1, 2, 3], send=send)
+            third, third_sent = await _run_reminder([1, 2, 3], send=send)
+
+        assert first["failed"] == 1
+        assert first["progress"]["retry_pending"] == 1
+        assert first["progress"]["completed"] is False
+        assert second_sent == [2]
+        assert second["progress"] == {**second["progress"], "retry_pending": 0, "completed": True}
+        assert third_sent == []
+        checkpoint = database.get_reminder_checkpoint(dr._today_run_key(), 0, 1)
+        assert checkpoint == {"last_user_id": 3, "sent": 3, "failed": 1, "completed": True}
+        assert database.get_reminder_retries(dr._today_run_key(), 0, 1) == []
+
+
+# ---------------------------------------------------------------------------
+# Hourly delivery buckets
+# ---------------------------------------------------------------------------
+
+async def _run_at(hour, **kwargs):
+    """Run _send_daily_reminders as if invoked at ``hour`` UTC; return chat ids sent to."""
+    import index as dr
+    from datetime import datetime, timezone
+
+    with (
+        patch("index.BOT_TOKEN", "fake-token"),
+        patch("index.BROADCAST_RATE", 10000.0),
+        patch("index._utc_now", return_value=datetime(2024, 1, 1, hour, tzinfo=timezone.utc)),
+        patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
+    ):
+        mock_bot = AsyncMock()
+        mock_bot.__aenter__ = AsyncMock(return_value=mock_bot)
+        mock_bot.__aexit__ = AsyncMock(return_value=False)
+        with patch("index.Bot", return_value=mock_bot):
+            await dr._send_daily_reminders(**kwargs)
+
+    return [c.kwargs["chat_id"] for c in mock_bot.send_message.call_args_list]
+
+
+class TestHourlyBuckets:
+    @pytest.mark.asyncio
+    async def test_peak_sends_drop_with_bucket_count(self):
+        import random
+
+        rng = random.Random(14)
+        users = list(range(1, 241))
+        buckets = 8
+        # Preferred local hours across time zones; 1 in 10 users keeps the default.
+        local_hours = [7, 8, 9, 12, 18, 20, 21, 22]
+        offsets = [-5, 0, 8]
+        for i, user_id in enumerate(users):
+            database.save_user_group_membership(user_id, user_id % 12)
+            database.insert_prayer_request(_make_request(user_id, user_id, f"Request {user_id}"))
+            if user_id % 10:
+                database.save_reminder_preference(user_id, local_hours[i % buckets], rng.choice(offsets))
+
+        sends_per_hour = {hour: await _run_at(hour, hourly=True) for hour in range(24)}
+        daily_peak = len(await _run_at(1))
+
+        delivered = [uid for sent in sends_per_hour.values() for uid in sent]
+        hourly_peak = max(len(sent) for sent in sends_per_hour.values())
+        assert sorted(delivered) == users  # everyone exactly once per day
+        assert daily_peak == len(users)
+        assert hourly_peak <= 2 * len(users) / buckets
+        assert daily_peak / hourly_peak >= buckets / 2
+
+    @pytest.mark.asyncio
+    async def test_hourly_run_is_checkpointed_per_hour(self):
+        database.save_user_group_membership(1, 1)
+        database.insert_prayer_request(_make_request(1, 1, "One"))
+
+        assert await _run_at(1, hourly=True) == [1]
+        assert await _run_at(1, hourly=True) == []
+        assert await _run_at(2, hourly=True) == []
+
+
 # ---------------------------------------------------------------------------
 # HTTP endpoint tests
 # ---------------------------------------------------------------------------
@@ -210,10 +476,8 @@ class TestDailyReminderEndpoint:
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[111]),
-            patch("index.get_all_prayer_requests", return_value=[]),
-            patch("index.get_user_groups", return_value=set()),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([111])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
             patch.dict(os.environ, {"CRON_SECRET": ""}),
             patch("index.CRON_SECRET", ""),
         ):
@@ -256,9 +520,8 @@ class TestDailyReminderEndpoint:
         with (
             patch("index.BOT_TOKEN", "fake-token"),
             patch("index.init_db"),
-            patch("index.get_all_user_ids", return_value=[]),
-            patch("index.get_all_prayer_requests", return_value=[]),
-            patch("index.http_requests.get", return_value=_mock_votd_response()),
+            patch("index.iter_all_user_ids", side_effect=_streamed([])),
+            patch("index.votd_provider.get", new=AsyncMock(return_value=VERSE)),
             patch("index.CRON_SECRET", "mysecret"),
         ):
             mock_bot = AsyncMock()
@@ -300,3 +563,46 @@ class TestDailyReminderEndpoint:
         call_kwargs = mock_bot.send_message.call_args.kwargs
         assert call_kwargs["chat_id"] == 99999
         assert "DB error" in call_kwargs["text"]
+
+    @pytest.mark.asyncio
+    async def test_rejects_invalid_shard(self):
+        import index as dr
+
+        with patch("index.CRON_SECRET", ""):
+            async with AsyncClient(
+                transport=ASGITransport(app=dr.app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/daily_reminder?shard=2&shards=2")
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_mode(self):
+        import index as dr
+
+        with patch("index.CRON_SECRET", ""):
+            async with AsyncClient(
+                transport=ASGITransport(app=dr.app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/daily_reminder?mode=weekly")
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_prefetch_warms_votd_without_sending(self):
+        import index as dr
+
+        with (
+            patch("index.CRON_SECRET", ""),
+            patch("index.votd_provider.prefetch", new=AsyncMock(return_value=True)) as mock_prefetch,
+            patch("index._send_daily_reminders", new=AsyncMock()) as mock_send,
+        ):
+            async with AsyncClient(
+                transport=ASGITransport(app=dr.app), base_url="http://test"
+            ) as client:
+                response = await client.get("/api/daily_reminder?prefetch=true")
+
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok", "votd_cached": True, "digests_refreshed": 0}
+        mock_prefetch.assert_awaited_once()
+        mock_send.assert_not_awaited()
@@ -0,0 +1,520 @@
+"""Tests for the SQLite helpers in database.py."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import database
+from state import PrayerRequest
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _add_request(req_id, user_id, text="Pray", is_anonymous=False):
+    database.insert_prayer_request(PrayerRequest(
+        id=req_id,
+        user_id=user_id,
+        username=f"user_{user_id}",
+        text=text,
+        is_anonymous=is_anonymous,
+    ))
+
+
+# ---------------------------------------------------------------------------
+# get_visible_request_page
+# ---------------------------------------------------------------------------
+
+class TestGetVisibleRequests:
+    def test_only_shared_group_requests_are_visible(self, db):
+        viewer, friend, stranger = 1, 2, 3
+        database.save_user_group_membership(viewer, 10)
+        database.save_user_group_membership(friend, 10)
+        database.save_user_group_membership(stranger, 20)
+        _add_request(1, friend)
+        _add_request(2, stranger)
+
+        visible = database.get_visible_request_page(viewer, 10).items
+
+        assert [v.request.id for v in visible] == [1]
+        assert visible[0].group_id == 10
+        assert database.get_adjacent_visible_group(viewer) == 10
+        assert database.get_visible_request_page(viewer, 20).items == []
+
+    def test_own_requests_are_excluded(self, db):
+        database.save_user_group_membership(1, 10)
+        _add_request(1, 1)
+
+        assert database.get_visible_request_page(1, 10).items == []
+        assert database.get_adjacent_visible_group(1) is None
+
+    def test_lowest_shared_group_is_chosen_once(self, db):
+        viewer, friend = 1, 2
+        for gid in (30, 10, 20):
+            database.save_user_group_membership(viewer, gid)
+            database.save_user_group_membership(friend, gid)
+        _add_request(1, friend)
+
+        listed = {gid: [v.request.id for v in database.get_visible_request_page(viewer, gid).items]
+                  for gid in (10, 20, 30)}
+
+        assert listed == {10: [1], 20: [], 30: []}
+
+    def test_prayed_flag_is_per_viewer(self, db):
+        viewer, other, friend = 1, 2, 3
+        for uid in (viewer, other, friend):
+            database.save_user_group_membership(uid, 10)
+        _add_request(1, friend)
+        _add_request(2, friend)
+        database.mark_prayed(viewer, 1)
+        database.mark_prayed(other, 2)
+
+        prayed = {v.request.id: v.prayed for v in database.get_visible_request_page(viewer, 10).items}
+
+        assert prayed == {1: True, 2: False}
+
+
+# ---------------------------------------------------------------------------
+# get_prayed_request_ids
+# ---------------------------------------------------------------------------
+
+class TestPrayedLookup:
+    def test_returns_only_prayed_candidates(self, db):
+        for req_id in (1, 2, 3):
+            _add_request(req_id, 2)
+        database.mark_prayed(1, 1)
+        database.mark_prayed(1, 3)
+        database.mark_prayed(4, 2)
+
+        assert database.get_prayed_request_ids(1, [1, 2, 3, 99]) == {1, 3}
+        assert database.get_prayed_request_ids(1, [2]) == set()
+        assert database.get_prayed_request_ids(1, []) == set()
+
+    def test_lookup_probes_the_primary_key(self, db):
+        with database.connections.reader() as conn:
+            plan = " ".join(row[3] for row in conn.execute("""
+                EXPLAIN QUERY PLAN
+                SELECT p.request_id FROM json_each(?) ids
+                CROSS JOIN Prayed_Users p ON p.user_id = ? AND p.request_id = ids.value
+            """, ("[1, 2]", 1)))
+
+        assert "sqlite_autoindex_Prayed_Users_1 (request_id=? AND user_id=?)" in plan
+
+
+# ---------------------------------------------------------------------------
+# ConnectionManager
+# ---------------------------------------------------------------------------
+
+class TestConnectionManager:
+    def test_reader_connection_is_reused(self, db):
+        with database.connections.reader() as first:
+            pass
+        with database.connections.reader() as second:
+            pass
+        assert first is second
+
+    def test_reader_is_closed_when_its_thread_exits(self, db):
+        import sqlite3
+        import threading
+
+        opened = []
+
+        def read():
+            with database.connections.reader() as conn:
+                opened.append(conn)
+
+        before = len(database.connections._readers)
+        threads = [threading.Thread(target=read) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(opened)) == 5
+        assert len(database.connections._readers) == before
+        with pytest.raises(sqlite3.ProgrammingError):
+            opened[0].execute("SELECT 1")
+
+    def test_database_uses_wal_journal(self, db):
+        with database.connections.reader() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_failed_write_is_rolled_back(self, db):
+        with pytest.raises(RuntimeError):
+            with database.connections.writer() as conn:
+                conn.execute("INSERT INTO Group_Membership (user_id, group_id) VALUES (1, 10)")
+                raise RuntimeError("boom")
+
+        assert database.get_user_groups(1) == set()
+
+    def test_nested_writes_commit_once(self, db):
+        with database.connections.writer():
+            database.save_user_group_membership(1, 10)
+            database.save_group_title(10, "Choir")
+
+        assert database.get_user_groups(1) == {10}
+        assert database.get_group_title(10) == "Choir"
+
+
+# ---------------------------------------------------------------------------
+# Migrations
+# ---------------------------------------------------------------------------
+
+class TestMigrations:
+    def test_fresh_database_reaches_latest_version(self, db):
+        with database.connections.reader() as conn:
+            assert database._schema_version(conn) == len(database.MIGRATIONS)
+
+    def test_legacy_database_is_upgraded_in_place(self, tmp_path, monkeypatch):
+        import sqlite3
+
+        path = str(tmp_path / "legacy.db")
+        legacy = sqlite3.connect(path)
+        database._migration_base_schema(legacy)
+        legacy_id = "0b3f7c2e-5d41-4a8e-9f6a-2c1d7e8b9a10"
+        legacy.execute("INSERT INTO Prayer_Requests VALUES (?, 2, 'user_2', 'Pray', 0)", (legacy_id,))
+        legacy.execute("INSERT INTO Joined_Users VALUES (?, 1)", (legacy_id,))
+        legacy.execute("INSERT INTO Prayed_Users VALUES (?, 3)", (legacy_id,))
+        legacy.commit()
+        legacy.close()
+
+        monkeypatch.setattr(database, "_db_path", lambda: path)
+        try:
+            assert database.migrate() == len(database.MIGRATIONS)
+            with database.connections.reader() as conn:
+                indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+            assert {"idx_group_membership_group", "idx_joined_users_user", "idx_prayer_requests_user"} <= indexes
+            request_id = database.resolve_request_ref(legacy_id)
+            assert request_id == 1
+            assert database.get_request_by_rid(request_id).text == "Pray"
+            assert database.get_joined_users(request_id) == {1}
+            with database.connections.reader() as conn:
+                assert conn.execute("SELECT request_id FROM Prayed_Users WHERE user_id = 3").fetchone()[0] == 1
+            # New requests get the next integer id.
+            assert database.insert_prayer_request(PrayerRequest(None, 2, "user_2", "Again", False)) == 2
+        finally:
+            database.close_connections()
+
+    def test_init_db_runs_migrations_once_per_process(self, db, monkeypatch):
+        calls = []
+        monkeypatch.setattr(database, "migrate", lambda: calls.append(1))
+
+        database.init_db()
+
+        assert calls == []
+
+    def test_lookups_use_secondary_indexes(self, db):
+        with database.connections.reader() as conn:
+            plan = " ".join(
+                row[3] for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT user_id FROM Group_Membership WHERE group_id = ?", (1,)
+                )
+            )
+        assert "idx_group_membership_group" in plan
+
+
+# ---------------------------------------------------------------------------
+# Processed_Updates
+# ---------------------------------------------------------------------------
+
+class TestRequestRefs:
+    def test_short_ids_round_trip(self):
+        from state import decode_request_id, encode_request_id
+
+        for request_id in (1, 35, 36, 123456789):
+            assert decode_request_id(encode_request_id(request_id)) == request_id
+        assert encode_request_id(123456789) == "21i3v9"
+        assert decode_request_id("0b3f7c2e-5d41-4a8e-9f6a-2c1d7e8b9a10") is None
+
+    def test_ids_are_not_reused_after_delete(self, db):
+        _add_request(None, 2)
+        database.delete_request_by_id(1)
+        _add_request(None, 2)
+
+        assert database.resolve_request_ref("1") == 1
+        assert database.get_request_by_rid(1) is None
+        assert database.get_request_by_rid(2) is not None
+
+
+class TestRequestPreviews:
+    def test_list_queries_load_only_a_preview(self, db):
+        from state import PREVIEW_LENGTH, RequestPreview
+
+        database.save_user_group_membership(1, 10)
+        database.save_user_group_membership(2, 10)
+        _add_request(1, 2, text="x" * 500)
+        database.mark_joined(1, 1)
+
+        visible = database.get_visible_request_page(1, 10).items[0].request
+        (joined, mine), = database.get_my_requests_page(1).items
+
+        for preview in (visible, mine):
+            assert isinstance(preview, RequestPreview)
+            assert preview.preview == "x" * PREVIEW_LENGTH
+        assert joined and database.get_request_by_rid(1).text == "x" * 500
+
+    def test_rows_are_slotted(self):
+        from state import RequestPreview
+
+        for row in (PrayerRequest(1, 2, "a", "b", False), RequestPreview(1, 2, "a", "b", False)):
+            assert not hasattr(row, "__dict__")
+
+
+class TestStreaming:
+    def test_requests_stream_in_id_order_across_batches(self, db):
+        for i in range(1, 6):
+            _add_request(i, 10 + i, text=f"Pray {i}")
+
+        streamed = list(database.iter_all_prayer_requests(batch=2))
+
+        assert [r.id for r in streamed] == [1, 2, 3, 4, 5]
+        assert streamed == database.get_all_prayer_requests()
+
+    def test_user_ids_are_ascending_and_skip_dead_users(self, db):
+        for i, user_id in enumerate((30, 10, 20, 40), start=1):
+            _add_request(i, user_id)
+        database.record_delivery_outcomes([], [(20, True, "blocked")])
+        database.save_reminder_preference(40, 12, 0)
+
+        assert list(database.iter_all_user_ids(batch=1)) == [10, 30, 40]
+        assert list(database.iter_all_user_ids(utc_hour=12, batch=1)) == [40]
+
+    def test_stream_connection_closes_when_discarded(self, db, monkeypatch):
+        import sqlite3
+
+        opened = []
+        stream_connection = database.connections.stream_connection
+
+        def tracking():
+            conn = stream_connection()
+            opened.append(conn)
+            return conn
+
+        monkeypatch.setattr(database.connections, "stream_connection", tracking)
+        _add_request(1, 2)
+        _add_request(2, 3)
+
+        rows = database.iter_all_prayer_requests(batch=1)
+        next(rows)
+        rows.close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            opened[0].execute("SELECT 1")
+
+
+class TestMaintenance:
+    def test_deleting_a_request_removes_its_marks(self, db):
+        _add_request(1, 2)
+        database.mark_joined(1, 1)
+        database.mark_prayed(3, 1)
+
+        database.delete_request_by_id(1)
+
+        with database.connections.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM Joined_Users").fetchone()[0] == 0
+            assert conn.execute("SELECT COUNT(*) FROM Prayed_Users").fetchone()[0] == 0
+
+    def test_purges_orphans_and_switches_to_incremental_vacuum(self, db):
+        import sqlite3
+
+        _add_request(1, 2)
+        database.mark_joined(1, 1)
+        raw = sqlite3.connect(db, isolation_level=None)
+        raw.execute("PRAGMA auto_vacuum = NONE")
+        raw.execute("VACUUM")
+        raw.execute("INSERT INTO Joined_Users VALUES (99, 1)")
+        raw.executemany("INSERT INTO Prayed_Users VALUES (99, ?)", [(uid,) for uid in range(2000)])
+        raw.close()
+
+        first = database.run_maintenance()
+        second = database.run_maintenance()
+
+        assert first["orphans_purged"] == 2001
+        assert first["converted_to_incremental"] and not second["converted_to_incremental"]
+        assert second["orphans_purged"] == 0 and second["free_pages"] == 0
+        assert database.get_joined_users(1) == {1}
+        with database.connections.reader() as conn:
+            assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+class TestProcessedUpdates:
+    def test_record_update_id_detects_duplicates(self, db):
+        assert database.record_update_id(1, ttl=60) is True
+        assert database.record_update_id(1, ttl=60) is False
+
+    def test_expired_update_id_is_recorded_again(self, db, monkeypatch):
+        database.record_update_id(1, ttl=60)
+        monkeypatch.setattr(database.time, "time", lambda: 10 ** 10)
+        assert database.record_update_id(1, ttl=60) is True
+
+    def test_forget_and_prune(self, db, monkeypatch):
+        database.record_update_id(1, ttl=60)
+        database.record_update_id(2, ttl=60)
+        database.forget_update_id(1)
+        assert database.record_update_id(1, ttl=60) is True
+
+        monkeypatch.setattr(database.time, "time", lambda: 10 ** 10)
+        database.prune_processed_updates(ttl=60)
+        with database.connections.reader() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM Processed_Updates").fetchone()[0] == 0
+
+
+# ---------------------------------------------------------------------------
+# Reminder_Preferences
+# ---------------------------------------------------------------------------
+
+class TestReminderPreferences:
+    def test_defaults_until_saved(self, db):
+        assert database.get_reminder_preference(1) == (
+            database.DEFAULT_REMINDER_HOUR, database.DEFAULT_REMINDER_OFFSET
+        )
+        database.save_reminder_preference(1, 21, -5)
+        assert database.get_reminder_preference(1) == (21, -5)
+
+    def test_reminder_user_ids_by_utc_hour(self, db):
+        for user_id in (1, 2, 3):
+            _add_request(user_id, user_id)
+        database.save_reminder_preference(1, 21, 8)   # 13:00 UTC
+        database.save_reminder_preference(2, 2, 5)    # 21:00 UTC the day before
+
+        assert database.get_reminder_user_ids(13) == [1]
+        assert database.get_reminder_user_ids(21) == [2]
+        assert database.get_reminder_user_ids(database.DEFAULT_REMINDER_UTC_HOUR) == [3]
+
+
+# ---------------------------------------------------------------------------
+# Delivery_Status
+# ---------------------------------------------------------------------------
+
+class TestDeliveryStatus:
+    def test_dead_recipients_are_excluded_until_revived(self, db):
+        for user_id in (1, 2):
+            _add_request(user_id, user_id)
+
+        database.record_delivery_outcomes([2], [(1, True, "Forbidden: bot was blocked by the user")])
+
+        assert database.get_all_user_ids() == [2]
+        assert database.get_reminder_user_ids(database.DEFAULT_REMINDER_UTC_HOUR) == [2]
+        assert database.revive_recipient(1) is True
+        assert database.revive_recipient(1) is False
+        assert sorted(database.get_all_user_ids()) == [1, 2]
+
+    def test_transient_failures_are_counted_and_reset(self, db):
+        database.record_delivery_outcomes([], [(1, False, "Timed out")])
+        database.record_delivery_outcomes([], [(1, False, "Timed out")])
+        assert database.get_delivery_status(1) == {
+            "dead": False, "transient_failures": 2, "last_error": "Timed out",
+        }
+
+        database.record_delivery_outcomes([1], [])
+        assert database.get_delivery_status(1)["transient_failures"] == 0
+        assert database.revive_recipient(1) is False
+
+
+# ---------------------------------------------------------------------------
+# save_group_activity
+# ---------------------------------------------------------------------------
+
+class TestSaveGroupActivity:
+    def test_writes_new_memberships_and_changed_titles(self, db):
+        database.save_user_group_membership(1, 10)
+        database.save_group_title(10, "Old")
+        version = database.get_visibility_version(1)
+
+        database.save_group_activity([(1, 10), (2, 10), (2, 20)], [(10, "New"), (20, "Other")])
+
+        assert database.get_group_users(10) == {1, 2}
+        assert database.get_user_groups(2) == {10, 20}
+        assert database.get_group_title(10) == "New"
+        assert database.get_visibility_version(1) != version
+        assert {uid for uid, _ in database.get_stale_daily_digests([1, 2])} == {1, 2}
+
+    def test_known_facts_leave_versions_alone(self, db):
+        database.save_group_activity([(1, 10)], [(10, "Same")])
+        version = database.get_visibility_version(1)
+
+        database.save_group_activity([(1, 10)], [(10, "Same")])
+
+        assert database.get_visibility_version(1) == version
+
+
+# ---------------------------------------------------------------------------
+# Keyset pagination
+# ---------------------------------------------------------------------------
+
+class TestKeysetPagination:
+    def _seed_group(self, viewer=1, group_id=10, requests=11):
+        database.save_user_group_membership(viewer, group_id)
+        for user_id, name in ((2, "bob"), (3, "Alice")):
+            database.save_user_group_membership(user_id, group_id)
+        for i in range(requests):
+            database.insert_prayer_request(PrayerRequest(
+                id=i + 1, user_id=2 + i % 2, username=["bob", "Alice"][i % 2],
+                text=f"Pray {i}", is_anonymous=i == 0,
+            ))
+
+    def _walk(self, viewer, group_id, limit):
+        pages = [database.get_visible_request_page(viewer, group_id, limit=limit)]
+        while pages[-1].has_next:
+            pages.append(database.get_visible_request_page(viewer, group_id, after=pages[-1].end, limit=limit))
+        return pages
+
+    def test_pages_follow_list_order_and_stay_bounded(self, db):
+        self._seed_group()
+
+        pages = self._walk(1, 10, limit=4)
+        ids = [v.request.id for page in pages for v in page.items]
+
+        assert [len(page.items) for page in pages] == [4, 4, 3]
+        assert ids == [2, 4, 6, 8, 10, 3, 5, 7, 9, 11, 1]
+        assert not pages[0].has_prev and pages[1].has_prev
+
+        back = database.get_visible_request_page(1, 10, before=pages[2].start, limit=4)
+        assert [v.request.id for v in back.items] == [v.request.id for v in pages[1].items]
+        last = database.get_visible_request_page(1, 10, before=0, limit=4)
+        assert [v.request.id for v in last.items] == ids[-4:]
+        assert not last.has_next
+
+    def test_request_is_listed_only_under_lowest_shared_group(self, db):
+        self._seed_group(requests=2)
+        database.save_user_group_membership(1, 5)
+        database.save_user_group_membership(3, 5)
+
+        assert database.get_adjacent_visible_group(1) == 5
+        assert database.get_adjacent_visible_group(1, 5) == 10
+        assert database.get_adjacent_visible_group(1, 10) is None
+        assert database.get_adjacent_visible_group(1, 10, forward=False) == 5
+        assert [v.request.id for v in database.get_visible_request_page(1, 5).items] == [2]
+        assert [v.request.id for v in database.get_visible_request_page(1, 10).items] == [1]
+        assert database.get_visible_request_page(4, 10).items == []  # not a member
+
+    def test_deleted_cursor_restarts_the_group(self, db):
+        self._seed_group(requests=6)
+        first = database.get_visible_request_page(1, 10, limit=3)
+        database.delete_request_by_id(first.items[-1].request.id)
+
+        page = database.get_visible_request_page(1, 10, after=first.end, limit=3)
+
+        assert [v.request.id for v in page.items] == [2, 4, 3]
+
+    def test_my_requests_pages_own_then_joined(self, db):
+        for i in range(3):
+            _add_request(10 + i, 1)
+            _add_request(20 + i, 2)
+        database.mark_joined(1, 21)
+        database.mark_joined(1, 20)
+
+        first = database.get_my_requests_page(1, limit=4)
+        second = database.get_my_requests_page(1, after=first.end, limit=4)
+
+        assert [(joined, r.id) for joined, r in first.items] == [
+            (False, 10), (False, 11), (False, 12), (True, 20),
+        ]
+        assert first.end == (1, 20)  # keyed on the request id, not a Joined_Users rowid
+        assert [r.id for _, r in second.items] == [21]
+        assert first.has_next and not second.has_next and second.has_prev
+        previous = database.get_my_requests_page(1, before=second.start, limit=4)
+        assert [r.id for _, r in previous.items] == [r.id for _, r in first.items]
@@ -0,0 +1,197 @@
+"""Tests for the rate-limited outbound sender."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from delivery import LatencyHistogram, OutboundSender, TokenBucket, is_permanent_error
+
+
+# ---------------------------------------------------------------------------
+# TokenBucket
+# ---------------------------------------------------------------------------
+
+class TestTokenBucket:
+    @pytest.mark.asyncio
+    async def test_burst_then_rate_limited(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        # Two tokens are available immediately, the next two take 1/50 s each.
+        assert time.monotonic() - start >= 0.035
+
+
+# ---------------------------------------------------------------------------
+# LatencyHistogram
+# ---------------------------------------------------------------------------
+
+class TestLatencyHistogram:
+    def test_percentiles_are_within_one_bucket(self):
+        histogram = LatencyHistogram()
+        buckets = len(histogram._counts)
+        values = [i / 1000 for i in range(1, 1001)]
+        for value in values * 100:
+            histogram.record(value)
+
+        assert len(histogram._counts) == buckets
+        assert histogram.count == 100000
+        assert histogram.max == 1.0
+        for fraction, exact in ((0.5, 0.5), (0.95, 0.95), (0.99, 0.99)):
+            assert exact <= histogram.percentile(fraction) <= exact * 1.05
+
+    def test_empty_and_out_of_range(self):
+        histogram = LatencyHistogram(largest=1.0)
+        assert histogram.percentile(0.5) == 0.0
+
+        histogram.record(0.0)
+        histogram.record(30.0)
+
+        assert histogram.percentile(0.5) == pytest.approx(0.001)
+        assert histogram.percentile(1.0) == 30.0
+
+
+# ---------------------------------------------------------------------------
+# OutboundSender
+# ---------------------------------------------------------------------------
+
+class TestErrorClassification:
+    def test_blocked_and_missing_chats_are_permanent(self):
+        assert is_permanent_error(Forbidden("Forbidden: bot was blocked by the user"))
+        assert is_permanent_error(BadRequest("Chat not found"))
+        assert is_permanent_error(Forbidden("Forbidden: user is deactivated"))
+
+    def test_other_errors_are_not_permanent(self):
+        assert not is_permanent_error(BadRequest("Message is too long"))
+        assert not is_permanent_error(TimedOut())
+        assert not is_permanent_error(Exception("boom"))
+
+
+class TestOutboundSender:
+    @pytest.mark.asyncio
+    async def test_send_passes_chat_id_and_kwargs(self):
+        method = AsyncMock(return_value="ok")
+        sender = OutboundSender()
+
+        result = await sender.send(method, 42, text="hi")
+
+        assert result == "ok"
+        method.assert_awaited_once_with(chat_id=42, text="hi")
+        assert sender.stats()["sent"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_honored(self):
+        method = AsyncMock(side_effect=[RetryAfter(0), "ok"])
+        sender = OutboundSender()
+
+        assert await sender.send(method, 1, text="hi") == "ok"
+        assert method.await_count == 2
+        assert sender.stats()["retried"] == 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        method = AsyncMock(side_effect=RetryAfter(0))
+        sender = OutboundSender(max_retries=1)
+
+        with pytest.raises(RetryAfter):
+            await sender.send(method, 1, text="hi")
+        assert method.await_count == 2
+        assert sender.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_transient_network_errors_are_retried(self):
+        method = AsyncMock(side_effect=[TimedOut(), NetworkError("reset"), "ok"])
+        sender = OutboundSender(backoff_base=0)
+
+        assert await sender.send(method, 1, text="hi") == "ok"
+        assert method.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_bad_request_is_not_retried(self):
+        method = AsyncMock(side_effect=BadRequest("Chat not found"))
+        sender = OutboundSender(backoff_base=0)
+
+        with pytest.raises(BadRequest):
+            await sender.send(method, 1, text="hi")
+        assert method.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_other_errors_are_not_retried(self):
+        method = AsyncMock(side_effect=Exception("Forbidden"))
+        sender = OutboundSender()
+
+        with pytest.raises(Exception, match="Forbidden"):
+            await sender.send(method, 1, text="hi")
+        assert method.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self):
+        active = 0
+        peak = 0
+
+        async def method(chat_id, text):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+        sender = OutboundSender(rate=1000, max_concurrency=3)
+        await asyncio.gather(*(sender.send(method, chat, text="hi") for chat in range(10)))
+
+        assert peak == 3
+
+    @pytest.mark.asyncio
+    async def test_submit_runs_in_background_and_drains(self):
+        release = asyncio.Event()
+        delivered = []
+
+        async def method(chat_id, text):
+            await release.wait()
+            delivered.append(chat_id)
+
+        sender = OutboundSender()
+        sender.submit(method, 1, text="hi")
+        sender.submit(method, 2, text="hi")
+        assert delivered == []
+        assert sender.stats()["pending"] == 2
+
+        release.set()
+        assert await sender.drain(timeout=1)
+        assert sorted(delivered) == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_submit_logs_failures(self, capsys):
+        sender = OutboundSender()
+        sender.submit(AsyncMock(side_effect=Exception("Forbidden")), 7, text="hi")
+
+        assert await sender.drain(timeout=1)
+        assert "Failed to deliver to 7" in capsys.readouterr().out
+
+    @pytest.mark.asyncio
+    async def test_collect_gathers_deliveries_submitted_in_its_block(self):
+        release = asyncio.Event()
+
+        async def method(chat_id, text):
+            await release.wait()
+
+        sender = OutboundSender()
+        outside = sender.submit(method, 1, text="hi")
+        with sender.collect() as deliveries:
+            async def handler():
+                sender.submit(method, 2, text="hi")
+            await handler()
+            await asyncio.create_task(handler())
+
+        assert len(deliveries) == 2 and outside not in deliveries
+        assert not await sender.wait(deliveries, timeout=0.01)
+        release.set()
+        assert await sender.wait(deliveries, timeout=1)
+        assert await sender.drain(timeout=1)
@@ -0,0 +1,159 @@
+"""Tests for daily digest rendering and materialization."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+import database
+import digest
+from state import PrayerRequest
+from visibility import VisibilityIndex
+
+VERSE = "Be strong. - <i>Josh 1:9</i>"
+
+
+def _make_request(req_id, user_id, text):
+    return PrayerRequest(id=req_id, user_id=user_id, username=f"user_{user_id}", text=text, is_anonymous=False)
+
+
+def _lines(user_id):
+    return json.loads(database.get_daily_digests([user_id])[user_id][1])
+
+
+class TestDigestBuilder:
+    def test_identical_visibility_builds_once(self):
+        requests = [_make_request(1, 9, "A & B"), _make_request(2, 9, "C")]
+        memberships = [(1, 10), (2, 10), (3, 10), (9, 10), (4, 20)]
+        builder = digest.DigestBuilder(VisibilityIndex(requests, memberships))
+
+        with patch("digest.html.escape", wraps=digest.html.escape) as mock_escape:
+            lines = [builder.lines_for(uid) for uid in (1, 2, 3, 4)]
+
+        assert lines[0] is lines[1] is lines[2]
+        assert builder.distinct_digests == 2
+        assert mock_escape.call_count == 2  # once per request, not per recipient
+        assert lines[0] == ["• A &amp; B", "• C"]
+        assert lines[3] == []
+
+
+class TestDigestRenderer:
+    def test_empty_digest(self):
+        messages = digest.DigestRenderer(VERSE).render(0, "[]")
+
+        assert len(messages) == 1
+        assert "no prayer requests" in messages[0]
+        assert VERSE in messages[0]
+
+    def test_same_body_renders_once(self):
+        renderer = digest.DigestRenderer(VERSE)
+        body = json.dumps(["• one"])
+
+        assert renderer.render(1, body) is renderer.render(1, body)
+        assert renderer.distinct_digests == 1
+
+    def test_render_cache_is_bounded(self):
+        renderer = digest.DigestRenderer(VERSE, cache_size=2)
+        bodies = [json.dumps([f"• {i}"]) for i in range(5)]
+
+        for body in bodies:
+            renderer.render(1, body)
+
+        assert len(renderer._messages) == 2
+        assert renderer.render(1, bodies[-1]) is renderer.render(1, bodies[-1])
+
+    def test_long_digest_is_split_under_message_limit(self):
+        lines = [f"• Request {i} " + "x" * 200 for i in range(60)]
+        messages = digest.DigestRenderer(VERSE).render(len(lines), json.dumps(lines))
+
+        assert len(messages) > 1
+        assert all(len(m) <= digest.MESSAGE_LIMIT for m in messages)
+        assert "Daily Prayer Reminder" in messages[0]
+        assert "/request_list" in messages[-1]
+        combined = "\n".join(messages)
+        assert all(f"Request {i} " in combined for i in range(60))
+
+    def test_oversized_request_is_truncated_on_entity_boundary(self):
+        line = "• " + "&amp;" * 1000
+        truncated = digest.truncate_html(line, 100)
+
+        assert len(truncated) <= 100
+        assert truncated.endswith("&amp;…")
+
+
+class TestDailyDigestMaintenance:
+    def test_insert_marks_group_peers_stale(self, db):
+        database.save_user_group_membership(1, 10)
+        database.save_user_group_membership(2, 10)
+        database.save_user_group_membership(3, 20)
+        database.insert_prayer_request(_make_request(9, 3, "elsewhere"))
+        digest.refresh_daily_digests()
+        assert database.get_stale_daily_digests() == []
+
+        database.insert_prayer_request(_make_request(1, 2, "Exams"))
+
+        stale = {uid for uid, _ in database.get_stale_daily_digests()}
+        assert stale == {2}  # user 1 is not a recipient until they join or post
+        database.mark_joined(1, 1)
+        assert digest.refresh_daily_digests() == 2
+        assert _lines(1) == ["• Exams"]
+        assert _lines(2) == []
+        assert _lines(3) == []
+
+    def test_delete_and_membership_changes_rerender(self, db):
+        database.save_user_group_membership(1, 10)
+        database.save_user_group_membership(2, 10)
+        database.insert_prayer_request(_make_request(1, 1, "One"))
+        database.insert_prayer_request(_make_request(2, 2, "Two"))
+        digest.refresh_daily_digests()
+        assert _lines(1) == ["• Two"]
+
+        database.delete_request_by_id(2)
+        digest.refresh_daily_digests()
+        assert _lines(1) == []
+
+        database.save_user_group_membership(3, 30)
+        database.insert_prayer_request(_make_request(3, 3, "Three"))
+        database.save_user_group_membership(1, 30)
+        digest.refresh_daily_digests()
+        assert _lines(1) == ["• Three"]
+
+    def test_refresh_in_batches_loads_only_shared_groups(self, db):
+        for user_id, group_id in ((1, 10), (2, 10), (3, 10), (4, 20), (5, 20)):
+            database.save_user_group_membership(user_id, group_id)
+        for req_id, user_id in ((1, 1), (2, 2), (3, 3), (4, 4), (5, 5)):
+            database.insert_prayer_request(_make_request(req_id, user_id, f"R{req_id}"))
+        loaded = []
+        load = database.get_prayer_requests_by_users
+
+        def tracking(user_ids):
+            loaded.append(sorted(user_ids))
+            return load(user_ids)
+
+        with patch("digest.get_prayer_requests_by_users", side_effect=tracking):
+            assert digest.refresh_daily_digests(batch=2) == 5
+
+        assert loaded == [[1, 2, 3], [1, 2, 3, 4, 5], [4, 5]]
+        assert _lines(1) == ["• R2", "• R3"]
+        assert _lines(3) == ["• R1", "• R2"]
+        assert _lines(5) == ["• R4"]
+        assert database.get_stale_daily_digests() == []
+
+    def test_change_during_refresh_keeps_digest_stale(self, db):
+        database.save_user_group_membership(1, 10)
+        database.save_user_group_membership(2, 10)
+        database.insert_prayer_request(_make_request(1, 1, "One"))
+        database.insert_prayer_request(_make_request(2, 2, "Two"))
+
+        stale = database.get_stale_daily_digests()
+        database.insert_prayer_request(_make_request(3, 2, "Three"))
+        database.save_daily_digests([(uid, version, 0, []) for uid, version in stale])
+
+        assert {uid for uid, _ in database.get_stale_daily_digests()} == {1, 2}
+        assert database.get_daily_digests([1, 2]) == {}
+        digest.refresh_daily_digests()
+        assert _lines(1) == ["• Two", "• Three"]
@@ -0,0 +1,336 @@
+"""Tests for the per-chat update dispatcher."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from dispatch import QueueFull, UpdateDeduplicator, UpdateDispatcher, UpdateQueue, update_shard_key
+
+
+# ---------------------------------------------------------------------------
+# update_shard_key
+# ---------------------------------------------------------------------------
+
+class TestUpdateShardKey:
+    def test_uses_chat_id(self):
+        update = MagicMock()
+        update.effective_chat.id = -100
+        assert update_shard_key(update) == -100
+
+    def test_falls_back_to_user(self):
+        update = MagicMock()
+        update.effective_chat = None
+        update.effective_user.id = 7
+        assert update_shard_key(update) == ("user", 7)
+
+    def test_none_without_chat_or_user(self):
+        update = MagicMock()
+        update.effective_chat = None
+        update.effective_user = None
+        assert update_shard_key(update) is None
+
+
+# ---------------------------------------------------------------------------
+# UpdateDispatcher
+# ---------------------------------------------------------------------------
+
+class TestUpdateDispatcher:
+    @pytest.mark.asyncio
+    async def test_same_chat_runs_in_order(self):
+        dispatcher = UpdateDispatcher(max_in_flight=4)
+        events = []
+
+        async def handle(name, delay):
+            events.append(f"start {name}")
+            await asyncio.sleep(delay)
+            events.append(f"end {name}")
+
+        await asyncio.gather(
+            dispatcher.run(1, lambda: handle("a", 0.02)),
+            dispatcher.run(1, lambda: handle("b", 0)),
+        )
+
+        assert events == ["start a", "end a", "start b", "end b"]
+
+    @pytest.mark.asyncio
+    async def test_different_chats_run_in_parallel(self):
+        dispatcher = UpdateDispatcher(max_in_flight=4)
+        slow_started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow():
+            slow_started.set()
+            await release.wait()
+
+        async def fast():
+            await slow_started.wait()
+            release.set()
+            return "fast"
+
+        results = await asyncio.wait_for(
+            asyncio.gather(dispatcher.run(1, slow), dispatcher.run(2, fast)),
+            timeout=1,
+        )
+
+        assert results[1] == "fast"
+
+    @pytest.mark.asyncio
+    async def test_in_flight_cap_is_respected(self):
+        dispatcher = UpdateDispatcher(max_in_flight=2)
+        peak = 0
+
+        async def handle():
+            nonlocal peak
+            peak = max(peak, dispatcher.in_flight)
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(dispatcher.run(chat, handle) for chat in range(6)))
+
+        assert peak == 2
+        stats = dispatcher.stats()
+        assert stats["processed"] == 6
+        assert stats["in_flight"] == 0
+        assert stats["queue_depth"] == 0
+        assert stats["active_shards"] == 0
+        assert stats["max_wait_ms"] > 0
+
+    @pytest.mark.asyncio
+    async def test_failure_releases_shard(self):
+        dispatcher = UpdateDispatcher(max_in_flight=1)
+
+        async def boom():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await dispatcher.run(1, boom)
+
+        assert dispatcher.stats()["active_shards"] == 0
+        assert dispatcher.stats()["in_flight"] == 0
+
+    def test_rejects_non_positive_cap(self):
+        with pytest.raises(ValueError):
+            UpdateDispatcher(max_in_flight=0)
+
+
+# ---------------------------------------------------------------------------
+# UpdateQueue
+# ---------------------------------------------------------------------------
+
+def _update(update_id, chat_id):
+    update = MagicMock()
+    update.update_id = update_id
+    update.effective_chat.id = chat_id
+    return update
+
+
+class TestUpdateQueue:
+    @pytest.mark.asyncio
+    async def test_drain_processes_accepted_updates_in_chat_order(self):
+        handled = []
+
+        async def handler(update):
+            await asyncio.sleep(0)
+            handled.append(update.update_id)
+
+        queue = UpdateQueue(handler, UpdateDispatcher(max_in_flight=4), maxsize=10, workers=3)
+        queue.start()
+        for update_id in range(5):
+            queue.submit(_update(update_id, chat_id=1))
+
+        assert await queue.drain(timeout=1)
+        assert handled == [0, 1, 2, 3, 4]
+        assert not queue.running
+
+    @pytest.mark.asyncio
+    async def test_burst_from_one_chat_does_not_hold_up_another(self):
+        handled = []
+
+        async def handler(update):
+            await asyncio.sleep(0.02)
+            handled.append((update.effective_chat.id, update.update_id))
+
+        queue = UpdateQueue(handler, UpdateDispatcher(max_in_flight=8), maxsize=50, workers=8)
+        queue.start()
+        for update_id in range(20):
+            queue.submit(_update(update_id, chat_id=1))
+        queue.submit(_update(99, chat_id=2))
+
+        assert await queue.drain(timeout=2)
+        # Chat 2 finishes alongside chat 1's first update, not after its burst.
+        assert handled.index((2, 99)) <= 1
+        assert [u for chat, u in handled if chat == 1] == list(range(20))
+        assert queue.stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_parked_updates_count_towards_maxsize(self):
+        release = asyncio.Event()
+
+        async def handler(update):
+            await release.wait()
+
+        queue = UpdateQueue(handler, UpdateDispatcher(), maxsize=2, workers=3)
+        queue.start()
+        for update_id in range(3):
+            queue.submit(_update(update_id, chat_id=1))
+            await asyncio.sleep(0)  # a worker takes it and parks it behind the first
+
+        with pytest.raises(QueueFull):
+            queue.submit(_update(3, chat_id=2))
+
+        release.set()
+        assert await queue.drain(timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects_updates(self):
+        release = asyncio.Event()
+
+        async def handler(update):
+            await release.wait()
+
+        queue = UpdateQueue(handler, UpdateDispatcher(), maxsize=1, workers=1)
+        queue.start()
+        queue.submit(_update(1, chat_id=1))
+        await asyncio.sleep(0)  # worker picks up the first update
+        queue.submit(_update(2, chat_id=1))
+
+        with pytest.raises(QueueFull):
+            queue.submit(_update(3, chat_id=1))
+
+        release.set()
+        assert await queue.drain(timeout=1)
+        assert queue.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_stopped_queue_rejects_updates(self):
+        queue = UpdateQueue(AsyncMock(), UpdateDispatcher())
+        with pytest.raises(QueueFull):
+            queue.submit(_update(1, chat_id=1))
+
+    @pytest.mark.asyncio
+    async def test_handler_failure_does_not_stop_worker(self):
+        handled = []
+
+        async def handler(update):
+            if update.update_id == 1:
+                raise RuntimeError("boom")
+            handled.append(update.update_id)
+
+        queue = UpdateQueue(handler, UpdateDispatcher(), workers=1)
+        queue.start()
+        queue.submit(_update(1, chat_id=1))
+        queue.submit(_update(2, chat_id=1))
+
+        assert await queue.drain(timeout=1)
+        assert handled == [2]
+        assert queue.stats()["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_drain_times_out_and_stops_workers(self):
+        async def handler(update):
+            await asyncio.sleep(10)
+
+        queue = UpdateQueue(handler, UpdateDispatcher(), workers=1)
+        queue.start()
+        queue.submit(_update(1, chat_id=1))
+
+        assert await queue.drain(timeout=0.05) is False
+        assert not queue.running
+
+
+# ---------------------------------------------------------------------------
+# UpdateDeduplicator
+# ---------------------------------------------------------------------------
+
+class _FakeStore:
+    def __init__(self):
+        self.ids = set()
+        self.pruned = 0
+
+    def record_update_id(self, update_id, ttl):
+        if update_id in self.ids:
+            return False
+        self.ids.add(update_id)
+        return True
+
+    def forget_update_id(self, update_id):
+        self.ids.discard(update_id)
+
+    def prune_processed_updates(self, ttl):
+        self.pruned += 1
+
+
+class TestUpdateDeduplicator:
+    @pytest.mark.asyncio
+    async def test_second_delivery_is_duplicate(self):
+        dedup = UpdateDeduplicator()
+        assert await dedup.check_and_add(1) is False
+        assert await dedup.check_and_add(1) is True
+        assert await dedup.check_and_add(2) is False
+        assert dedup.stats()["duplicates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_oldest_ids_are_evicted_beyond_maxsize(self):
+        dedup = UpdateDeduplicator(maxsize=2)
+        for update_id in (1, 2, 3):
+            await dedup.check_and_add(update_id)
+        assert await dedup.check_and_add(1) is False
+        assert await dedup.check_and_add(3) is True
+
+    @pytest.mark.asyncio
+    async def test_ids_expire_after_ttl(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr("dispatch.time.monotonic", lambda: clock[0])
+        dedup = UpdateDeduplicator(ttl=10)
+        await dedup.check_and_add(1)
+        clock[0] += 11
+        assert await dedup.check_and_add(1) is False
+
+    @pytest.mark.asyncio
+    async def test_forget_allows_redelivery(self):
+        store = _FakeStore()
+        dedup = UpdateDeduplicator(store=store)
+        await dedup.check_and_add(1)
+        await dedup.forget(1)
+        assert await dedup.check_and_add(1) is False
+
+    @pytest.mark.asyncio
+    async def test_persisted_ids_survive_a_restart(self):
+        store = _FakeStore()
+        await UpdateDeduplicator(store=store).check_and_add(1)
+        restarted = UpdateDeduplicator(store=store)
+        assert await restarted.check_and_add(1) is True
+
+    @pytest.mark.asyncio
+    async def test_store_is_pruned_periodically(self):
+        store = _FakeStore()
+        dedup = UpdateDeduplicator(store=store)
+        for update_id in range(UpdateDeduplicator.PRUNE_EVERY):
+            await dedup.check_and_add(update_id)
+        assert store.pruned == 1
+
+    @pytest.mark.asyncio
+    async def test_store_calls_run_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        threads = []
+
+        class Store(_FakeStore):
+            def record_update_id(self, update_id, ttl):
+                threads.append(threading.get_ident())
+                return super().record_update_id(update_id, ttl)
+
+            def forget_update_id(self, update_id):
+                threads.append(threading.get_ident())
+                super().forget_update_id(update_id)
+
+        dedup = UpdateDeduplicator(store=Store())
+        await dedup.check_and_add(1)
+        await dedup.forget(1)
+
+        assert len(threads) == 2
+        assert loop_thread not in threads
@@ -0,0 +1,58 @@
+"""Tests for the /api/export endpoint."""
+import sys
+import os
+import json
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+
+import database
+from state import PrayerRequest
+
+_spec = importlib.util.spec_from_file_location(
+    "export_index",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "export", "index.py"),
+)
+export = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(export)
+
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+async def _get(url, headers=None):
+    async with AsyncClient(transport=ASGITransport(app=export.app), base_url="http://test") as client:
+        return await client.get(url, headers=headers or {})
+
+
+@pytest.mark.asyncio
+async def test_streams_requests_as_ndjson(monkeypatch):
+    monkeypatch.setattr(database, "STREAM_BATCH", 2)
+    for i in range(5):
+        database.insert_prayer_request(PrayerRequest(None, 10 + i % 2, f"user_{i}", f"Pray {i}", i == 0))
+
+    with patch.object(export, "CRON_SECRET", "s3cret"):
+        assert (await _get("/api/export")).status_code == 401
+        response = await _get("/api/export?table=requests", {"Authorization": "Bearer s3cret"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [1, 2, 3, 4, 5]
+    assert rows[0] == {"id": 1, "user_id": 10, "username": "user_0", "text": "Pray 0", "is_anonymous": True}
+
+    with patch.object(export, "CRON_SECRET", ""):
+        users = await _get("/api/export?table=users")
+    assert users.text.splitlines() == ['{"user_id": 10}', '{"user_id": 11}']
+
+
+@pytest.mark.asyncio
+async def test_rejects_unknown_table():
+    with patch.object(export, "CRON_SECRET", ""):
+        response = await _get("/api/export?table=secrets")
+
+    assert response.status_code == 400
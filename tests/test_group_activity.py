@@ -0,0 +1,148 @@
+"""Tests for the write-coalescing group activity buffer."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+
+import pytest
+
+import storage
+from group_activity import GroupActivityBuffer
+
+
+class _FakeStore:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.threads = []
+        self.fail = fail
+
+    def save_group_activity(self, memberships, titles):
+        self.threads.append(threading.current_thread())
+        if self.fail:
+            raise RuntimeError("database is locked")
+        self.calls.append((sorted(memberships), sorted(titles)))
+
+
+class TestGroupActivityBuffer:
+    @pytest.mark.asyncio
+    async def test_repeat_sightings_are_skipped(self):
+        store = _FakeStore()
+        buffer = GroupActivityBuffer(store, flush_size=100, flush_interval=60)
+
+        for _ in range(50):
+            await buffer.record(-1, "Cell group", 1, 99)
+        await buffer.flush()
+
+        assert store.calls == [([(1, -1), (99, -1)], [(-1, "Cell group")])]
+        assert buffer.stats()["skipped"] == 49 * 3
+
+    @pytest.mark.asyncio
+    async def test_flushes_in_one_batch_when_full(self):
+        store = _FakeStore()
+        buffer = GroupActivityBuffer(store, flush_size=4, flush_interval=60)
+
+        await buffer.record(-1, "A", 1)   # membership + title = 2 pending
+        assert store.calls == []
+        await buffer.record(-1, "A", 2)   # 3 pending
+        await buffer.record(-1, "A", 3)   # 4 pending -> flush
+
+        assert store.calls == [([(1, -1), (2, -1), (3, -1)], [(-1, "A")])]
+        assert buffer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_title_change_is_written_again(self):
+        store = _FakeStore()
+        buffer = GroupActivityBuffer(store, flush_size=100, flush_interval=60)
+
+        await buffer.record(-1, "Old", 1)
+        await buffer.flush()
+        await buffer.record(-1, "New", 1)
+        await buffer.flush()
+
+        assert store.calls[-1] == ([], [(-1, "New")])
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_is_retried_on_next_sighting(self):
+        store = _FakeStore(fail=True)
+        buffer = GroupActivityBuffer(store, flush_size=100, flush_interval=60)
+
+        await buffer.record(-1, "A", 1)
+        assert await buffer.flush() == 0
+        store.fail = False
+        await buffer.record(-1, "A", 1)
+        assert await buffer.flush() == 2
+
+    @pytest.mark.asyncio
+    async def test_seen_cache_is_bounded(self):
+        buffer = GroupActivityBuffer(_FakeStore(), seen_size=3, flush_size=100, flush_interval=60)
+
+        for user_id in range(10):
+            await buffer.record(-1, "A", user_id)
+
+        assert buffer.stats()["seen_members"] == 3
+
+    @pytest.mark.asyncio
+    async def test_periodic_flush_and_stop(self):
+        store = _FakeStore()
+        buffer = GroupActivityBuffer(store, flush_size=100, flush_interval=0.05)
+        buffer.start()
+
+        await buffer.record(-1, "A", 1)
+        await asyncio.sleep(0.12)
+        assert len(store.calls) == 1
+
+        await buffer.record(-2, "B", 1)
+        await buffer.stop()
+        assert len(store.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_flush_runs_off_the_event_loop(self):
+        store = _FakeStore()
+        buffer = GroupActivityBuffer(store, flush_size=2, flush_interval=60)
+
+        await buffer.record(-1, "A", 1)
+
+        assert store.threads and threading.current_thread() not in store.threads
+
+    @pytest.mark.asyncio
+    async def test_default_store_is_the_current_backend(self):
+        buffer = GroupActivityBuffer(flush_size=100, flush_interval=60)
+        await buffer.record(-1, "A", 1)
+
+        memory = storage.MemoryStorage()
+        previous = storage.set_storage(memory)
+        try:
+            await buffer.flush()
+        finally:
+            storage.set_storage(previous)
+
+        assert memory.get_user_groups(1) == {-1}
+        assert memory.get_group_title(-1) == "A"
+
+    @pytest.mark.asyncio
+    async def test_flush_waits_for_a_flush_in_progress(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        class SlowStore(_FakeStore):
+            def save_group_activity(self, memberships, titles):
+                started.set()
+                release.wait(1)
+                super().save_group_activity(memberships, titles)
+
+        store = SlowStore()
+        buffer = GroupActivityBuffer(store, flush_size=100, flush_interval=60)
+        await buffer.record(-1, "A", 1)
+        first = asyncio.create_task(buffer.flush())
+        await asyncio.to_thread(started.wait, 1)
+
+        second = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.01)
+        assert not second.done()
+        release.set()
+
+        assert await first == 2 and await second == 0
+        assert store.calls == [([(1, -1)], [(-1, "A")])]
@@ -0,0 +1,46 @@
+"""Tests for the /api/maintenance endpoint."""
+import sys
+import os
+import importlib.util
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient, ASGITransport
+
+
+_spec = importlib.util.spec_from_file_location(
+    "maintenance_index",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api", "maintenance", "index.py"),
+)
+maintenance = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(maintenance)
+
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+async def _get(url, headers=None):
+    async with AsyncClient(transport=ASGITransport(app=maintenance.app), base_url="http://test") as client:
+        return await client.get(url, headers=headers or {})
+
+
+@pytest.mark.asyncio
+async def test_requires_cron_secret():
+    with patch.object(maintenance, "CRON_SECRET", "s3cret"):
+        assert (await _get("/api/maintenance")).status_code == 401
+        response = await _get("/api/maintenance", {"Authorization": "Bearer s3cret"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ok"
+    assert body["orphans_purged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rejects_negative_page_budget():
+    with patch.object(maintenance, "CRON_SECRET", ""):
+        response = await _get("/api/maintenance?pages=-1")
+
+    assert response.status_code == 400
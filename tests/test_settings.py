@@ -0,0 +1,76 @@
+"""Tests for the /reminder_time command."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import database
+from handle_settings import _parse_hour, _parse_offset, reminder_time_command
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+class TestParsing:
+    @pytest.mark.parametrize("raw, hour", [("21", 21), ("21:00", 21), ("0", 0), ("7:0", 7)])
+    def test_whole_hours_are_accepted(self, raw, hour):
+        assert _parse_hour(raw) == hour
+
+    @pytest.mark.parametrize("raw", ["21:30", "24", "-1", "nine"])
+    def test_other_hours_are_rejected(self, raw):
+        with pytest.raises(ValueError):
+            _parse_hour(raw)
+
+    @pytest.mark.parametrize("raw, offset", [("+8", 8), ("-5", -5), ("UTC+8", 8), ("utc", 0), ("+5:00", 5)])
+    def test_whole_hour_offsets_are_accepted(self, raw, offset):
+        assert _parse_offset(raw) == offset
+
+    @pytest.mark.parametrize("raw", ["+5:30", "+5:45", "+15", "east"])
+    def test_other_offsets_are_rejected(self, raw):
+        with pytest.raises(ValueError):
+            _parse_offset(raw)
+
+
+# ---------------------------------------------------------------------------
+# reminder_time_command
+# ---------------------------------------------------------------------------
+
+def _update(user_id=1):
+    update = MagicMock()
+    update.effective_chat.type = "private"
+    update.effective_user.id = user_id
+    update.message.reply_text = AsyncMock()
+    return update
+
+
+class TestReminderTimeCommand:
+    @pytest.mark.asyncio
+    async def test_half_hour_offset_is_rejected_without_saving(self):
+        update = _update()
+        await reminder_time_command(update, MagicMock(args=["21", "+5:30"]))
+
+        reply = update.message.reply_text.await_args.args[0]
+        assert "hourly slots" in reply
+        assert database.get_reminder_preference(1) == database.get_reminder_preference(2)
+
+    @pytest.mark.asyncio
+    async def test_minutes_are_not_silently_dropped(self):
+        update = _update()
+        await reminder_time_command(update, MagicMock(args=["21:30", "+8"]))
+
+        assert "on the hour" in update.message.reply_text.await_args.args[0]
+        assert database.get_reminder_preference(1) == database.get_reminder_preference(2)
+
+    @pytest.mark.asyncio
+    async def test_whole_hour_is_saved(self):
+        update = _update()
+        await reminder_time_command(update, MagicMock(args=["21", "UTC+8"]))
+
+        assert database.get_reminder_preference(1) == (21, 8)
+        assert "21:00 (UTC+8)" in update.message.reply_text.await_args.args[0]
@@ -0,0 +1,173 @@
+"""The in-memory backend must behave like the SQLite one."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sqlite3
+import threading
+
+import pytest
+
+import storage
+from state import PrayerRequest
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request):
+    if request.param == "memory":
+        return storage.MemoryStorage()
+    request.getfixturevalue("db")
+    return storage.SqliteStorage()
+
+
+def _seed_group(store, viewer=1, group_id=10, requests=11):
+    for user_id in (viewer, 2, 3):
+        store.save_user_group_membership(user_id, group_id)
+    for i in range(requests):
+        store.insert_prayer_request(PrayerRequest(
+            None, 2 + i % 2, ["bob", "Alice"][i % 2], f"Pray {i}", i == 0,
+        ))
+
+
+def _ids(page):
+    return [v.request.id for v in page.items]
+
+
+def test_visible_pages_follow_list_order(store):
+    _seed_group(store)
+    store.mark_prayed(1, 4)
+
+    pages = [store.get_visible_request_page(1, 10, limit=4)]
+    while pages[-1].has_next:
+        pages.append(store.get_visible_request_page(1, 10, after=pages[-1].end, limit=4))
+
+    assert [_ids(page) for page in pages] == [[2, 4, 6, 8], [10, 3, 5, 7], [9, 11, 1]]
+    assert [v.prayed for v in pages[0].items] == [False, True, False, False]
+    assert _ids(store.get_visible_request_page(1, 10, before=pages[2].start, limit=4)) == _ids(pages[1])
+    last = store.get_visible_request_page(1, 10, before=0, limit=4)
+    assert _ids(last) == [7, 9, 11, 1] and not last.has_next
+
+
+def test_lowest_shared_group_and_adjacent_groups(store):
+    _seed_group(store, requests=2)
+    store.save_user_group_membership(1, 5)
+    store.save_user_group_membership(3, 5)
+
+    assert store.get_adjacent_visible_group(1) == 5
+    assert store.get_adjacent_visible_group(1, 5) == 10
+    assert store.get_adjacent_visible_group(1, 10) is None
+    assert store.get_adjacent_visible_group(1, 10, forward=False) == 5
+    assert _ids(store.get_visible_request_page(1, 5)) == [2]
+    assert _ids(store.get_visible_request_page(1, 10)) == [1]
+    assert store.get_visible_request_page(4, 10).items == []
+
+
+def test_delete_cascades_and_bumps_version(store):
+    _seed_group(store, requests=2)
+    store.mark_joined(1, 2)
+    store.mark_prayed(1, 2)
+    version = store.get_visibility_version(1)
+
+    store.delete_request_by_id(2)
+
+    assert store.get_visibility_version(1) != version
+    assert store.get_request_by_rid(2) is None
+    assert store.get_joined_users(2) == set()
+    assert store.get_prayed_request_ids(1, [1, 2]) == set()
+    assert store.resolve_request_ref("1") == 1
+
+
+def test_marks_on_a_missing_request_are_rejected(store):
+    _seed_group(store, requests=1)
+    version = store.get_visibility_version(1)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        store.mark_prayed(1, 99)
+    with pytest.raises(sqlite3.IntegrityError):
+        store.mark_joined(1, 99)
+
+    assert store.get_visibility_version(1) == version
+    assert store.get_prayed_request_ids(1, [99]) == set()
+
+
+def test_my_requests_pages_own_then_joined(store):
+    for user_id in (1, 2):
+        store.save_user_group_membership(user_id, 10)
+    for i in range(3):
+        store.insert_prayer_request(PrayerRequest(10 + i, 1, "me", f"Own {i}", False))
+        store.insert_prayer_request(PrayerRequest(20 + i, 2, "bob", f"Other {i}", False))
+    store.mark_joined(1, 21)
+    store.mark_joined(1, 20)
+    store.unmark_joined(1, 22)
+
+    first = store.get_my_requests_page(1, limit=4)
+    second = store.get_my_requests_page(1, after=first.end, limit=4)
+
+    assert [(joined, r.id) for joined, r in first.items] == [(False, 10), (False, 11), (False, 12), (True, 20)]
+    assert [r.id for _, r in second.items] == [21]
+    assert not second.has_next and second.has_prev
+    assert store.get_user_groups(1) == {10} and store.get_group_users(10) == {1, 2}
+
+
+def test_group_activity_and_titles(store):
+    store.save_group_activity([(1, 10), (2, 10)], [(10, "Youth")])
+    version = store.get_visibility_version(1)
+    store.save_group_title(10, "Youth")
+
+    assert store.get_visibility_version(1) == version
+    assert store.get_group_title(10) == "Youth"
+    assert store.get_group_title(11) == "Group 11"
+    assert store.get_group_users(10) == {1, 2}
+
+
+def test_memory_reads_are_safe_during_concurrent_writes():
+    store = storage.MemoryStorage()
+    _seed_group(store, requests=50)
+    errors = []
+    done = threading.Event()
+
+    def read():
+        try:
+            while not done.is_set():
+                store.get_visible_request_page(1, 10, limit=4)
+                store.get_adjacent_visible_group(1)
+                store.get_my_requests_page(2, limit=4)
+                store.get_prayed_request_ids(1, range(1, 60))
+        except Exception as exc:
+            errors.append(exc)
+
+    readers = [threading.Thread(target=read) for _ in range(3)]
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # interleave the threads as often as possible
+    for thread in readers:
+        thread.start()
+    try:
+        for i in range(2000):
+            store.save_user_group_membership(100 + i, 10)
+            store.insert_prayer_request(PrayerRequest(None, 100 + i, f"u{i}", "Pray", False))
+            store.mark_prayed(1, i + 1)
+    finally:
+        done.set()
+        for thread in readers:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+
+
+def test_handlers_render_from_the_swapped_backend(monkeypatch):
+    import handle_prayer
+    from visibility import VisibilityCache
+
+    memory = storage.MemoryStorage()
+    monkeypatch.setattr(storage, "_storage", memory)
+    monkeypatch.setattr(handle_prayer, "visibility_cache", VisibilityCache())
+    _seed_group(memory, requests=3)
+    memory.save_group_title(10, "Youth")
+
+    text, keyboard = handle_prayer._render_page(1, None)
+
+    assert text == "<b>-- Youth --</b>"
+    assert [row[0].callback_data for row in keyboard.inline_keyboard] == ["public_view_2", "public_view_3", "public_view_1"]
+    assert handle_prayer._lookup_request("3").text == "Pray 2"
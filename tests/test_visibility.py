@@ -0,0 +1,155 @@
+"""Tests for the bulk visibility index and the per-viewer visibility cache."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+
+import pytest
+
+from state import PrayerRequest
+from visibility import VisibilityCache, VisibilityIndex, iter_bits
+
+
+def _make_request(req_id, user_id):
+    return PrayerRequest(
+        id=req_id,
+        user_id=user_id,
+        username=f"user_{user_id}",
+        text=f"Request {req_id}",
+        is_anonymous=False,
+    )
+
+
+def _visible_ids(index, user_id):
+    return [index.requests[position].id for position in iter_bits(index.visible_bits(user_id))]
+
+
+class TestVisibilityIndex:
+    def test_shared_group_requests_are_visible(self):
+        requests = [_make_request(1, 2), _make_request(2, 3)]
+        index = VisibilityIndex(requests, [(1, 10), (2, 10), (3, 20)])
+
+        assert _visible_ids(index, 1) == [1]
+
+    def test_own_requests_are_hidden(self):
+        requests = [_make_request(1, 1), _make_request(2, 2)]
+        index = VisibilityIndex(requests, [(1, 10), (2, 10)])
+
+        assert _visible_ids(index, 1) == [2]
+        assert _visible_ids(index, 2) == [1]
+
+    def test_users_without_groups_see_nothing(self):
+        index = VisibilityIndex([_make_request(1, 2)], [(2, 10)])
+
+        assert _visible_ids(index, 99) == []
+
+    def test_matches_pairwise_group_intersection(self):
+        rng = random.Random(7)
+        users = list(range(1, 60))
+        memberships = {(uid, gid) for uid in users for gid in rng.sample(range(15), 2)}
+        requests = [_make_request(i + 1, rng.choice(users)) for i in range(120)]
+        groups = {}
+        for uid, gid in memberships:
+            groups.setdefault(uid, set()).add(gid)
+
+        index = VisibilityIndex(requests, memberships)
+
+        for uid in users:
+            expected = [
+                r.id for r in requests
+                if r.user_id != uid and groups.get(uid, set()) & groups.get(r.user_id, set())
+            ]
+            assert _visible_ids(index, uid) == expected
+
+
+class TestVisibilityCache:
+    def test_hit_until_version_changes(self):
+        cache = VisibilityCache(maxsize=4)
+        cache.put(1, (0, 0), "listing")
+
+        assert cache.get(1, (0, 0)) == "listing"
+        assert cache.get(1, (1, 0)) is None
+        assert cache.get(1, (0, 0)) is None  # the stale entry was dropped
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 2
+
+    def test_least_recently_used_viewer_is_evicted(self):
+        cache = VisibilityCache(maxsize=2)
+        cache.put(1, 0, "a")
+        cache.put(2, 0, "b")
+        cache.get(1, 0)
+        cache.put(3, 0, "c")
+
+        assert cache.get(2, 0) is None
+        assert cache.get(1, 0) == "a"
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["size"] == 2
+
+
+class TestViewerListingInvalidation:
+    @pytest.fixture
+    def db(self, db, monkeypatch):
+        import database
+        import handle_prayer
+
+        monkeypatch.setattr(handle_prayer, "visibility_cache", VisibilityCache())
+        return database, handle_prayer
+
+    def _button_texts(self, handle_prayer, user_id):
+        _, keyboard = handle_prayer._render_page(user_id, None)
+        return [row[0].text for row in keyboard.inline_keyboard]
+
+    def test_writes_invalidate_only_affected_viewers(self, db):
+        database, handle_prayer = db
+        for user_id in (1, 2, 3):
+            database.save_user_group_membership(user_id, 10)
+        database.insert_prayer_request(_make_request(1, 3))
+
+        assert self._button_texts(handle_prayer, 1) == ["user_3: Request 1"]
+        self._button_texts(handle_prayer, 2)
+        self._button_texts(handle_prayer, 1)
+        assert handle_prayer.visibility_cache.stats()["hits"] == 1
+
+        database.mark_prayed(1, 1)
+        assert self._button_texts(handle_prayer, 1) == ["user_3: Request 1 ✔️"]
+        self._button_texts(handle_prayer, 2)  # user 2's entry is still valid
+        assert handle_prayer.visibility_cache.stats()["hits"] == 2
+
+        database.insert_prayer_request(_make_request(2, 3))
+        assert len(self._button_texts(handle_prayer, 2)) == 2
+
+        database.save_group_title(10, "Cell group")
+        misses = handle_prayer.visibility_cache.stats()["misses"]
+        database.save_group_title(10, "Cell group")  # unchanged title keeps the cache
+        message_text, _ = handle_prayer._render_page(2, None)
+        assert "Cell group" in message_text
+        assert handle_prayer.visibility_cache.stats()["misses"] == misses + 1
+
+    def test_pages_link_across_groups(self, db, monkeypatch):
+        database, handle_prayer = db
+        monkeypatch.setattr(handle_prayer, "PAGE_SIZE", 2)
+        for group_id in (-1001234567890, -1009876543210):
+            database.save_user_group_membership(1, group_id)
+            database.save_user_group_membership(-group_id % 1000, group_id)
+        for i in range(3):
+            database.insert_prayer_request(_make_request(i + 1, 890))
+        database.insert_prayer_request(_make_request(40, 210))
+
+        # Groups are listed in ascending id order: -1009876543210 first.
+        _, keyboard = handle_prayer._render_page(1, None)
+        assert keyboard.inline_keyboard[0][0].text == "user_210: Request 40"
+        assert keyboard.inline_keyboard[0][0].callback_data == "public_view_14"
+        nav = keyboard.inline_keyboard[-1]
+        assert [(b.text, b.callback_data) for b in nav] == [("Next ▶️", "plist_-1001234567890_s_0")]
+
+        _, keyboard = handle_prayer._render_page(1, nav[0].callback_data)
+        assert [row[0].text for row in keyboard.inline_keyboard[:-1]] == ["user_890: Request 1", "user_890: Request 2"]
+        nav = keyboard.inline_keyboard[-1]
+        assert [b.callback_data for b in nav] == ["plist_-1009876543210_e_0", "plist_-1001234567890_a_2"]
+        assert all(len(b.callback_data.encode()) <= 64 for row in keyboard.inline_keyboard for b in row)
+
+        _, keyboard = handle_prayer._render_page(1, nav[1].callback_data)
+        assert keyboard.inline_keyboard[0][0].text == "user_890: Request 3"
+        assert [b.text for b in keyboard.inline_keyboard[-1]] == ["◀️ Prev"]
@@ -0,0 +1,144 @@
+"""Tests for the cached Verse-of-the-Day provider, against a local fake server."""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from votd import FALLBACK_VERSE, VotdProvider
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class _FakeVotdServer:
+    """Serves a configurable OurManna-style response and counts requests."""
+
+    def __init__(self):
+        self.status = 200
+        self.payload = {"verse": {"details": {"text": "Be strong.", "reference": "Josh 1:9"}}}
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests += 1
+                body = json.dumps(fake.payload).encode()
+                self.send_response(fake.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/votd"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    fake = _FakeVotdServer()
+    yield fake
+    fake.close()
+
+
+pytestmark = pytest.mark.usefixtures("db")
+
+
+TODAY = date(2026, 1, 2)
+
+
+# ---------------------------------------------------------------------------
+# VotdProvider
+# ---------------------------------------------------------------------------
+
+class TestVotdProvider:
+    @pytest.mark.asyncio
+    async def test_returns_formatted_verse(self, server):
+        result = await VotdProvider(url=server.url).get(TODAY)
+
+        assert result == "Be strong. - <i>Josh 1:9</i>"
+
+    @pytest.mark.asyncio
+    async def test_fetches_once_per_date(self, server):
+        provider = VotdProvider(url=server.url)
+
+        await provider.get(TODAY)
+        await provider.get(TODAY)
+
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_cache_survives_new_provider(self, server):
+        await VotdProvider(url=server.url).get(TODAY)
+        server.payload = {"verse": {"details": {"text": "Other verse.", "reference": "Ps 1:1"}}}
+
+        result = await VotdProvider(url=server.url).get(TODAY)
+
+        assert "Be strong." in result
+        assert server.requests == 1
+
+    @pytest.mark.asyncio
+    async def test_new_date_fetches_again(self, server):
+        provider = VotdProvider(url=server.url)
+        await provider.get(TODAY)
+        server.payload = {"verse": {"details": {"text": "Other verse.", "reference": "Ps 1:1"}}}
+
+        result = await provider.get(date(2026, 1, 3))
+
+        assert "Other verse." in result
+        assert server.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_last_good_verse(self, server):
+        await VotdProvider(url=server.url).get(TODAY)
+        server.status = 500
+
+        result = await VotdProvider(url=server.url).get(date(2026, 1, 3))
+
+        assert "Be strong." in result
+
+    @pytest.mark.asyncio
+    async def test_hard_coded_fallback_without_cache(self, server):
+        server.status = 500
+
+        assert await VotdProvider(url=server.url).get(TODAY) == FALLBACK_VERSE
+
+    @pytest.mark.asyncio
+    async def test_fallback_on_empty_verse(self, server):
+        server.payload = {"verse": {"details": {"text": "", "reference": ""}}}
+
+        assert await VotdProvider(url=server.url).get(TODAY) == FALLBACK_VERSE
+
+    @pytest.mark.asyncio
+    async def test_html_special_chars_are_escaped(self, server):
+        server.payload = {"verse": {"details": {"text": "Trust <Him> & 'believe'.", "reference": "Prov 3:5"}}}
+
+        result = await VotdProvider(url=server.url).get(TODAY)
+
+        assert "<Him>" not in result
+        assert "&lt;Him&gt;" in result
+
+    @pytest.mark.asyncio
+    async def test_prefetch_reports_whether_verse_was_cached(self, server):
+        assert await VotdProvider(url=server.url).prefetch(TODAY) is True
+
+        server.status = 500
+        assert await VotdProvider(url=server.url).prefetch(date(2026, 1, 3)) is False
@@ -0,0 +1,101 @@
+# visibility.py
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Hashable, Iterable, Optional
+
+from state import PrayerRequest
+
+
+def iter_bits(bits: int):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class VisibilityIndex:
+    """Which requests each user can see, computed in bulk.
+
+    Requests are numbered by position and sets of requests are stored as
+    integer bitsets, so the user×group incidence times the group×request
+    incidence becomes a handful of bitwise ORs per user instead of a
+    users×requests loop. A request is visible to a user when its owner shares
+    at least one group with them and they are not the owner.
+    """
+
+    def __init__(self, requests: Iterable[PrayerRequest], memberships: Iterable[tuple[int, int]]):
+        self.requests = list(requests)
+
+        owned = defaultdict(int)
+        for position, req in enumerate(self.requests):
+            owned[req.user_id] |= 1 << position
+
+        user_groups = defaultdict(list)
+        group_requests = defaultdict(int)
+        for user_id, group_id in memberships:
+            user_groups[user_id].append(group_id)
+            if user_id in owned:
+                group_requests[group_id] |= owned[user_id]
+
+        self._owned = dict(owned)
+        self._user_groups = dict(user_groups)
+        self._group_requests = dict(group_requests)
+
+    def visible_bits(self, user_id: int) -> int:
+        bits = 0
+        for group_id in self._user_groups.get(user_id, ()):
+            bits |= self._group_requests.get(group_id, 0)
+        return bits & ~self._owned.get(user_id, 0)
+
+
+class VisibilityCache:
+    """LRU cache of per-viewer request listings, validated by version.
+
+    Each entry is stored with the version it was built from (see
+    ``database.get_visibility_version``); a lookup with a different version
+    is a miss and drops the entry. The least recently used viewer is evicted
+    beyond ``maxsize`` entries. Safe to use from the database threads.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[Hashable, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, viewer_id: int, version: Hashable) -> Optional[Any]:
+        with self._lock:
+            cached = self._entries.get(viewer_id)
+            if cached is None or cached[0] != version:
+                if cached is not None:
+                    del self._entries[viewer_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(viewer_id)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, viewer_id: int, version: Hashable, value: Any):
+        with self._lock:
+            self._entries[viewer_id] = (version, value)
+            self._entries.move_to_end(viewer_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
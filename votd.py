@@ -0,0 +1,78 @@
+# votd.py
+import asyncio
+import html
+from datetime import date, datetime, timezone
+from typing import Optional
+
+import httpx
+
+from async_database import run
+from database import get_cached_votd, get_latest_votd, save_cached_votd
+
+VOTD_URL = "https://beta.ourmanna.com/api/v1/get?format=json&order=daily"
+FALLBACK_VERSE = "Stay faithful and trust in the Lord today!"
+
+
+def format_votd(data: dict) -> str:
+    """Render an OurManna response as HTML; raises ValueError without verse text."""
+    details = data.get("verse", {}).get("details", {})
+    verse = str(details.get("text", "")).strip()
+    reference = str(details.get("reference", "")).strip()
+
+    if not verse:
+        raise ValueError("VOTD response did not include verse text")
+
+    # Escape dynamic text because message is sent with ParseMode.HTML.
+    safe_verse = html.escape(verse)
+    safe_reference = html.escape(reference) if reference else "Unknown Reference"
+    return f"{safe_verse} - <i>{safe_reference}</i>"
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class VotdProvider:
+    """Verse of the Day, fetched asynchronously and cached per calendar date.
+
+    Lookups check the in-memory cache, then the Votd_Cache table (on the
+    database threads), and only then the network. When the fetch fails the last good cached verse is
+    used, and only without one the hard-coded fallback.
+    """
+
+    def __init__(self, url: str = VOTD_URL, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self._memory: dict[str, str] = {}
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self) -> str:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(self.url, headers={"accept": "application/json"})
+            response.raise_for_status()
+            return format_votd(response.json())
+
+    async def get(self, day: Optional[date] = None) -> str:
+        day_key = (day or _utc_today()).isoformat()
+        verse = self._memory.get(day_key)
+        if verse is not None:
+            return verse
+
+        # One fetch per date even if several sends ask at once.
+        async with self._lock:
+            verse = self._memory.get(day_key) or await run(get_cached_votd, day_key)
+            if verse is None:
+                try:
+                    verse = await self._fetch()
+                except Exception as exc:
+                    print(f"Failed to fetch VOTD: {exc}")
+                    return await run(get_latest_votd) or FALLBACK_VERSE
+                await run(save_cached_votd, day_key, verse)
+            self._memory = {day_key: verse}
+            return verse
+
+    async def prefetch(self, day: Optional[date] = None) -> bool:
+        """Warm the cache ahead of the reminder; True if a real verse is cached."""
+        day_key = (day or _utc_today()).isoformat()
+        await self.get(day)
+        return day_key in self._memory